@@ -0,0 +1,362 @@
+"""Run many KayLang scripts in parallel, each in its own worker process.
+
+    python3 batch.py scripts/*.kay
+    python3 batch.py --jobs 8 --timeout 10 --json results.json "jobs/**/*.kay"
+    find jobs -name "*.kay" | python3 batch.py --list -
+
+Scripts are given as paths or glob patterns (** matches any folders) and run
+in a pool of worker processes. Every script gets a fresh Data store,
+interpreter and optimiser, so nothing one script defines is seen by another.
+What each one prints is collected separately. The summary is written as
+JSON, to stdout or to --json FILE. It has one record per script, in the
+order given:
+
+    {"script": "jobs/a.kay", "status": "ok", "error": null,
+     "seconds": 0.012, "worker": 4242, "output": ["3", "hello"]}
+
+status is ok, error (the program raised an error), timeout, memory (the
+worker's memory limit was reached) or crashed (the worker process died).
+With --output-dir, each script's output goes to a file instead, named in
+the record's "output_file", which keeps the summary small for scripts that
+print a lot.
+
+Options:
+
+    --jobs N          worker processes (default: one per CPU)
+    --timeout S       seconds a script may run before it is stopped (default
+                      60, 0: no limit)
+    --max-memory MB   address space each worker may use (default 1024, 0: no
+                      limit); not enforced on Windows
+    --max-scripts N   scripts a worker runs before it is replaced by a fresh
+                      process, to contain leaks (default 100, 0: never;
+                      needs Python 3.11)
+    --output-dir DIR  write each script's output to a file in DIR
+    --json FILE       where the summary goes (default -, stdout)
+    --list FILE       read script paths, one per line, from FILE (- for stdin)
+    --load FILE       start every script from the variables in a snapshot
+    --engine NAME, --no-optimize, --cache, --memo-size N  as for kaylang.py
+
+The exit status is 0 when every script succeeded, 1 when any failed and 2
+for a usage error or when no scripts were found.
+"""
+
+import argparse
+import glob
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from kaylang import ENGINES, load_engine, run_file
+from data import Data
+from output import Output
+import functions
+
+# Scripts handed to the pool ahead of the ones running, per worker: enough
+# to keep every worker busy without queueing thousands of tasks up front
+QUEUED_PER_WORKER = 2
+
+STATUSES = ("ok", "error", "timeout", "memory", "crashed")
+
+# Settings of this worker process, given to start_worker by the pool
+worker_config = None
+worker_engine = None
+
+
+class ScriptTimeout(BaseException):
+    """Raised in a worker when a script runs past its deadline
+
+    A BaseException, like KeyboardInterrupt, so that the engines' own
+    except Exception clauses cannot swallow it.
+    """
+
+
+class Deadline:
+    """Stops the script running in this process once seconds have passed
+
+    A timer thread interrupts the main thread, whose SIGINT handler raises
+    ScriptTimeout while the deadline is active; an interrupt arriving after
+    the script has finished is ignored. The timeout is noticed between
+    Python operations, so a single long native call, such as a huge integer
+    power, runs to the end first.
+    """
+
+    active = None  # the Deadline the running script is under
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expired = False
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def __enter__(self):
+        if self.seconds:
+            Deadline.active = self
+            self.timer = threading.Timer(self.seconds, self.expire)
+            self.timer.daemon = True
+            self.timer.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            Deadline.active = None
+        return False
+
+    def expire(self):
+        with self.lock:
+            if self.timer is not None:
+                self.expired = True
+                import _thread
+                _thread.interrupt_main()
+
+    @staticmethod
+    def on_interrupt(signum, frame):
+        deadline = Deadline.active
+        if deadline is not None and deadline.expired:
+            raise ScriptTimeout()
+        # Otherwise a stray or terminal interrupt: the parent process
+        # decides whether the batch stops
+
+
+def start_worker(config):
+    """Set up a new worker process, once, before it runs any script"""
+    global worker_config, worker_engine
+    worker_config = config
+    worker_engine = load_engine(config["engine"])
+    functions.MEMO_SIZE = config["memo_size"]
+    functions.allow_deep_recursion()
+    signal.signal(signal.SIGINT, Deadline.on_interrupt)
+    limit_memory(config["max_memory"])
+
+
+def limit_memory(megabytes):
+    if not megabytes:
+        return
+    try:
+        import resource
+    except ImportError:
+        return  # Windows: no limit
+    limit = megabytes * 1024 * 1024
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def run_script(index, path):
+    """Run one script in a worker and return its result record"""
+    config = worker_config
+    record = {"script": path, "status": "ok", "error": None}
+
+    if config["output_dir"] is not None:
+        output_file = os.path.join(config["output_dir"], f"{index}_{os.path.basename(path)}.out")
+        record["output_file"] = output_file
+        output = Output(output_file)
+    else:
+        lines = []
+        output = Output(lines)
+
+    optimizer = None
+    if config["optimize"]:
+        from optimizer import Optimizer
+        optimizer = Optimizer()
+    program_cache = None
+    if config["cache"]:
+        from cache import ProgramCache
+        program_cache = ProgramCache()
+
+    start = time.perf_counter()
+    try:
+        with Deadline(config["timeout"]):
+            interpreter = worker_engine(None, Data(), output)
+            if config["snapshot"] is not None:
+                import snapshot
+                snapshot.load(config["snapshot"], interpreter.data)
+            run_file(path, interpreter, program_cache, optimizer)
+    except ScriptTimeout:
+        record["status"] = "timeout"
+        record["error"] = f"Stopped after {config['timeout']:g} seconds"
+    except MemoryError:
+        record["status"] = "memory"
+        record["error"] = f"Out of memory (limit {config['max_memory']} MB)"
+    except OSError as e:
+        record["status"] = "error"
+        record["error"] = f"Cannot open '{e.filename or path}': {e.strerror}"
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+    finally:
+        output.close()
+    record["seconds"] = round(time.perf_counter() - start, 6)
+    record["worker"] = os.getpid()
+    if config["output_dir"] is None:
+        record["output"] = lines
+    return record
+
+
+def find_scripts(patterns):
+    """Expand paths and glob patterns; returns (scripts, patterns matching nothing)"""
+    scripts = []
+    seen = set()
+    unmatched = []
+    for pattern in patterns:
+        if any(char in pattern for char in "*?["):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        else:
+            matches = [pattern] if os.path.isfile(pattern) else []
+        if not matches:
+            unmatched.append(pattern)
+        for path in matches:
+            if path not in seen and os.path.isfile(path):
+                seen.add(path)
+                scripts.append(path)
+    return scripts, unmatched
+
+
+def run_batch(scripts, config, jobs=None, max_scripts=100):
+    """Run scripts in worker processes; returns their records in script order
+
+    A worker that dies takes the scripts it and the other workers were
+    running with it: those are reported as crashed and a fresh pool runs
+    the rest.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    pool_options = {"max_workers": jobs, "initializer": start_worker, "initargs": (config,)}
+    if max_scripts and sys.version_info >= (3, 11):
+        pool_options["max_tasks_per_child"] = max_scripts
+
+    records = [None] * len(scripts)
+    waiting = list(reversed(range(len(scripts))))  # popped from the end, in order
+    while waiting:
+        pool = ProcessPoolExecutor(**pool_options)
+        running = {}  # future -> script index
+        try:
+            while waiting or running:
+                while waiting and len(running) < jobs * QUEUED_PER_WORKER:
+                    index = waiting[-1]
+                    running[pool.submit(run_script, index, scripts[index])] = index
+                    waiting.pop()
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    try:
+                        records[index] = future.result()
+                    except BrokenProcessPool:
+                        records[index] = crashed(scripts[index], config)
+        except BrokenProcessPool:
+            # Raised by submit: the scripts still waiting get a fresh pool
+            for index in running.values():
+                records[index] = crashed(scripts[index], config)
+        finally:
+            for future in running:
+                future.cancel()
+            pool.shutdown(wait=True)
+    return records
+
+
+def crashed(path, config):
+    record = {"script": path, "status": "crashed", "error": "Worker process exited unexpectedly",
+              "seconds": None, "worker": None}
+    if config["output_dir"] is None:
+        record["output"] = []
+    return record
+
+
+def summarise(records, config, seconds):
+    counts = dict.fromkeys(STATUSES, 0)
+    for record in records:
+        counts[record["status"]] += 1
+    return {
+        "engine": config["engine"],
+        "scripts": len(records),
+        "counts": counts,
+        "seconds": round(seconds, 3),
+        "results": records,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="batch.py", description="Run many KayLang scripts in parallel worker processes.")
+    parser.add_argument("scripts", nargs="*", help="script paths or glob patterns")
+    parser.add_argument("--list", metavar="FILE", help="read script paths from FILE, one per line (- for stdin)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds per script, 0 for no limit")
+    parser.add_argument("--max-memory", type=int, default=1024, metavar="MB",
+                        help="address space per worker, 0 for no limit")
+    parser.add_argument("--max-scripts", type=int, default=100, metavar="N",
+                        help="scripts a worker runs before it is replaced, 0 for never")
+    parser.add_argument("--output-dir", metavar="DIR", help="write each script's output to a file in DIR")
+    parser.add_argument("--json", default="-", metavar="FILE", help="where to write the summary (default: stdout)")
+    parser.add_argument("--load", metavar="FILE", help="start every script from this snapshot")
+    parser.add_argument("--engine", default="tree", choices=list(ENGINES))
+    parser.add_argument("--no-optimize", action="store_true")
+    parser.add_argument("--cache", action="store_true", help="keep parsed scripts in __kaycache__")
+    parser.add_argument("--memo-size", type=int, default=functions.MEMO_SIZE, metavar="N")
+    options = parser.parse_args(argv)
+
+    if options.jobs is not None and options.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if options.timeout < 0 or options.max_memory < 0 or options.max_scripts < 0 or options.memo_size < 0:
+        parser.error("--timeout, --max-memory, --max-scripts and --memo-size cannot be negative")
+
+    patterns = list(options.scripts)
+    if options.list is not None:
+        try:
+            if options.list == "-":
+                patterns += [line.strip() for line in sys.stdin if line.strip()]
+            else:
+                with open(options.list, "r") as f:
+                    patterns += [line.strip() for line in f if line.strip()]
+        except OSError as e:
+            print(f"batch: cannot read '{options.list}': {e.strerror}", file=sys.stderr)
+            return 2
+
+    scripts, unmatched = find_scripts(patterns)
+    for pattern in unmatched:
+        print(f"batch: no scripts match '{pattern}'", file=sys.stderr)
+    if not scripts:
+        print("batch: no scripts to run", file=sys.stderr)
+        return 2
+
+    if options.output_dir is not None:
+        os.makedirs(options.output_dir, exist_ok=True)
+
+    config = {
+        "engine": options.engine,
+        "optimize": not options.no_optimize,
+        "cache": options.cache,
+        "memo_size": options.memo_size,
+        "timeout": options.timeout,
+        "max_memory": options.max_memory,
+        "output_dir": options.output_dir,
+        "snapshot": options.load,
+    }
+    start = time.perf_counter()
+    try:
+        records = run_batch(scripts, config, options.jobs, options.max_scripts)
+    except KeyboardInterrupt:
+        return 130
+    summary = summarise(records, config, time.perf_counter() - start)
+
+    if options.json == "-":
+        json.dump(summary, sys.stdout, indent=1)
+        sys.stdout.write("\n")
+    else:
+        with open(options.json, "w") as f:
+            json.dump(summary, f, indent=1)
+
+    counts = ", ".join(f"{count} {status}" for status, count in summary["counts"].items() if count)
+    print(f"batch: {len(scripts)} scripts in {summary['seconds']:g}s: {counts}", file=sys.stderr)
+    return 0 if summary["counts"]["ok"] == len(scripts) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Cold-start benchmark for the kaylang.py command-line runner.
+
+Starts a fresh Python process per run and measures the time from launch until
+the program's first line of output arrives, i.e. until the first statement
+has run, and until the process exits. A bare Python process printing a line
+is measured the same way as the floor no runner can beat. The report ends
+with a pass/fail against --target, the start-up budget in milliseconds for
+the -c case, and the exit status is 1 when the target is missed.
+
+    python3 benchmarks/cold_start.py --runs 30 --target 45
+"""
+
+import argparse
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+KAYLANG = os.path.join(HERE, "..", "kaylang.py")
+SCRIPT = os.path.join(HERE, "..", "Examples", "stage1.txt")
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of samples"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def measure(command, runs):
+    """Milliseconds to first output line and to exit, one list each"""
+    first_line, finished = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        process.stdout.readline()
+        first_line.append((time.perf_counter() - start) * 1000)
+        process.stdout.read()
+        process.wait()
+        finished.append((time.perf_counter() - start) * 1000)
+        if process.returncode != 0:
+            raise Exception(f"{' '.join(command)} exited with status {process.returncode}")
+    return first_line, finished
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--runs", type=int, default=20, help="processes started per case")
+    arg_parser.add_argument("--target", type=float, default=45.0, help="budget in ms to the first statement with -c")
+    args = arg_parser.parse_args(argv)
+
+    if os.environ.get("PYTHONDONTWRITEBYTECODE"):
+        # Every run would recompile each module from source
+        print("Warning: PYTHONDONTWRITEBYTECODE is set, so these times include compiling every module\n")
+
+    python = sys.executable
+    cases = [
+        ("python3 -c print(1)", [python, "-c", "print(1)"]),
+        ("kaylang -c", [python, KAYLANG, "-c", "print 1"]),
+        ("kaylang --engine closure -c", [python, KAYLANG, "--engine", "closure", "-c", "print 1"]),
+        ("kaylang --engine vm -c", [python, KAYLANG, "--engine", "vm", "-c", "print 1"]),
+        ("kaylang script", [python, KAYLANG, SCRIPT]),
+    ]
+
+    print(f"{'case':<30} {'first line ms':>20} {'exit ms':>20}")
+    print(f"{'':<30} {'median / p95':>20} {'median / p95':>20}")
+    medians = {}
+    for name, command in cases:
+        first_line, finished = measure(command, args.runs)
+        medians[name] = statistics.median(first_line)
+        print(
+            f"{name:<30} {statistics.median(first_line):9.1f} / {percentile(first_line, 0.95):8.1f} "
+            f"{statistics.median(finished):9.1f} / {percentile(finished, 0.95):8.1f}"
+        )
+
+    startup = medians["kaylang -c"]
+    overhead = startup - medians["python3 -c print(1)"]
+    verdict = "PASS" if startup <= args.target else "FAIL"
+    print(f"\nStart-up to first statement: {startup:.1f} ms ({overhead:.1f} ms over bare Python), target {args.target:.0f} ms: {verdict}")
+    return 0 if verdict == "PASS" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
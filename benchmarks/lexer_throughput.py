@@ -0,0 +1,250 @@
+"""Lexer throughput benchmark.
+
+Compares lexer.Lexer (the compiled-regex scanner) with CharLexer, the
+character-at-a-time scanner it replaced, on a generated KayLang script and
+reports MB/s for each.
+
+    python3 benchmarks/lexer_throughput.py --size 4 --repeat 5
+"""
+
+import argparse
+import os
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lexer import Lexer
+from tokens import Token, Integer, Operation, Float, Declaration, Variable, Boolean, BooleanValue, String, Keyword
+
+
+
+class CharLexer:
+
+    digits = "0123456789"
+    operations = "+-*/()=<>!;{}[],.:"
+    stopwords = [" ", "\n", "\t", "\r"]
+
+    letters =  string.ascii_letters + "_"
+    declarations = ["let", "print"]
+    boolean_ops = ["and", "or", "not"]
+    boolean_vals = ["true", "false"]
+    keywords = ["if", "else", "while", "input", "delete"]  # Added "delete" here
+
+
+    def __init__(self, text):
+        self.text = text 
+        self.index = 0 
+        self.tokens = []
+        self.char = self.text[self.index]
+        self.token = None 
+        
+    def tokenize(self):
+        while self.index < len(self.text):
+            if self.char in CharLexer.digits:
+                self.token = self.extract_number()
+
+            elif self.char in CharLexer.operations:
+                # Handle multi-character operators
+                if self.char == "=" and self.peek() == "=":
+                    self.token = Operation("==")
+                    self.move()
+                    self.move()
+                elif self.char == "!" and self.peek() == "=":
+                    self.token = Operation("!=")
+                    self.move()
+                    self.move()
+                elif self.char == "<" and self.peek() == "=":
+                    self.token = Operation("<=")
+                    self.move()
+                    self.move()
+                elif self.char == ">" and self.peek() == "=":
+                    self.token = Operation(">=")
+                    self.move()
+                    self.move()
+                elif self.char in "{}":
+                    self.token = Token("brace", self.char)
+                    self.move()
+                elif self.char == "[":
+                    self.token = Token("lbracket", self.char)
+                    self.move()
+                elif self.char == "]":
+                    self.token = Token("rbracket", self.char)
+                    self.move()
+                elif self.char == ",":
+                    self.token = Token("comma", self.char)
+                    self.move()
+                elif self.char == ":":
+                    self.token = Token("colon", self.char)
+                    self.move()
+                else:
+                    self.token = Operation(self.char)
+                    self.move()
+
+            elif self.char in CharLexer.stopwords:
+                self.move()
+                continue
+
+            elif self.char == '#':
+                # ✅ Skip comments
+                while self.char != '\n' and self.index < len(self.text):
+                    self.move()
+                self.move()  # also skip the newline
+                continue
+
+            elif self.char == '"':
+                self.token = self.extract_string()
+
+            elif self.char in CharLexer.letters:
+                word = self.extract_word()
+
+                if word in CharLexer.declarations:
+                    self.token = Declaration(word)
+                elif word in CharLexer.boolean_ops:
+                    self.token = Boolean(word)
+                elif word in CharLexer.boolean_vals:
+                    self.token = BooleanValue(word == "true")
+                elif word in CharLexer.keywords:
+                    self.token = Keyword(word)
+                else:
+                    self.token = Variable(word)
+
+            else:
+                raise Exception(f"Unknown character: {self.char}")
+
+            self.tokens.append(self.token)
+
+        return self.tokens
+
+    def extract_string(self):
+        string_val = ""
+        self.move()  # skip opening quote
+
+        while self.char != '"' and self.index < len(self.text):
+            if self.char == '\\':  # escape sequence start
+                self.move()
+                if self.char == 'n':
+                    string_val += '\n'
+                elif self.char == 't':
+                    string_val += '\t'
+                elif self.char == '"':
+                    string_val += '"'
+                else:
+                    raise Exception(f"Unknown escape sequence \\{self.char}")
+                self.move()
+            else:
+                string_val += self.char
+                self.move()
+
+        if self.char != '"':
+            raise Exception("Unterminated string literal")
+
+        self.move()  # skip closing quote
+
+        return String(string_val)
+
+    
+    def peek(self):
+        # Look at the next character without moving
+        peek_index = self.index + 1
+        if peek_index < len(self.text):
+            return self.text[peek_index]
+        return None
+
+    def extract_number(self):
+        start = self.index
+        isFloat = False
+        number = ""
+
+        while self.index < len(self.text) and (self.char in CharLexer.digits or self.char == "."):
+            if self.char == ".":
+                isFloat = True
+            number += self.char
+            self.move()
+
+        # Decode once here so the evaluator never re-parses the text
+        try:
+            return Integer(int(number)) if not isFloat else Float(float(number))
+        except ValueError:
+            line, column = self.position(start)
+            raise Exception(f"Invalid number literal '{number}' at line {line}, column {column}")
+
+    def position(self, index):
+        # 1-based line and column of a text index, for error messages
+        line = self.text.count("\n", 0, index) + 1
+        column = index - (self.text.rfind("\n", 0, index) + 1) + 1
+        return line, column
+    
+    def extract_word(self):
+        word = ""
+        while self.char in CharLexer.letters and self.index < len(self.text):
+            word += self.char 
+            self.move()
+
+        return word 
+
+    def move(self):
+        self.index += 1 
+        if self.index < len(self.text):
+            self.char = self.text[self.index]
+
+
+SAMPLE = """# generated workload
+total = 0;
+count = 0;
+items = [1, 2.5, 3, "four", true];
+table = {name: "kay", size: 10};
+while (count < 100) {
+    total = total + count * 2 - (count / 4);
+    if (total >= 1000 and not false) {
+        print "large\\tvalue";
+    } else {
+        items.push(count);
+    }
+    count = count + 1;
+}
+delete table["size"];
+print items[0] != table["name"];
+"""
+
+
+def generate(size_mb):
+    """Repeat the sample until the script is at least size_mb megabytes"""
+    copies = max(1, int(size_mb * 1024 * 1024 / len(SAMPLE)) + 1)
+    return SAMPLE * copies
+
+
+def measure(lexer_class, text, repeat):
+    """Best-of-repeat wall time for tokenizing text"""
+    best = None
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(lexer_class(text).tokenize())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--size", type=float, default=2.0, help="script size in MB")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per lexer, best is reported")
+    args = arg_parser.parse_args(argv)
+
+    text = generate(args.size)
+    megabytes = len(text.encode("utf-8")) / (1024 * 1024)
+    print(f"Script: {megabytes:.2f} MB")
+
+    results = {}
+    for name, lexer_class in (("CharLexer", CharLexer), ("Lexer", Lexer)):
+        elapsed, count = measure(lexer_class, text, args.repeat)
+        results[name] = elapsed
+        print(f"{name:<10} {elapsed:8.3f}s {megabytes / elapsed:8.2f} MB/s  {count} tokens")
+
+    print(f"Speedup: {results['CharLexer'] / results['Lexer']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""KayLang workload benchmark suite.
+
+Runs each program in benchmarks/workloads, plus a large generated script, on
+the chosen engines and reports lex, parse and execute times separately as the
+median and 95th percentile over the repetitions. Parse time includes the
+optimiser pass unless --no-optimize is given. Each workload also gets one
+extra, untimed run under tracemalloc for its peak memory, and an ops/sec
+figure from the "# ops: N" header on its first line (the number of loop
+iterations it performs). Program output is discarded.
+
+A final table repeats the memory run for each workload with compact numeric
+lists (see numeric.py) switched off, to show what the array storage saves.
+
+    python3 benchmarks/suite.py --engine tree --engine vm --repeat 5
+    python3 benchmarks/suite.py --save baseline.json
+    python3 benchmarks/suite.py --baseline baseline.json
+
+With --baseline, each median is compared with the saved one and changes
+beyond --threshold percent are flagged.
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import math
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from lexer import Lexer
+from myparser import Parser
+from interpreter import Interpreter
+from compiler import ClosureInterpreter
+from vm import VMInterpreter
+from data import Data
+from resolver import Resolver
+from optimizer import Optimizer
+import numeric
+import functions
+from kaylang import execute_statements
+from lexer_throughput import SAMPLE, generate
+
+ENGINES = {
+    "tree": Interpreter,
+    "closure": ClosureInterpreter,
+    "vm": VMInterpreter,
+}
+
+PHASES = ("lex", "parse", "execute")
+OPS_HEADER = re.compile(r"#\s*ops:\s*(\d+)")
+WORKLOAD_DIR = os.path.join(HERE, "workloads")
+
+
+def load_workloads(generated_mb):
+    """Map workload name to (source, ops) for every .kay file and the generated script"""
+    workloads = {}
+    for path in sorted(glob.glob(os.path.join(WORKLOAD_DIR, "*.kay"))):
+        with open(path, "r") as f:
+            source = f.read()
+        match = OPS_HEADER.match(source)
+        workloads[os.path.splitext(os.path.basename(path))[0]] = (source, int(match.group(1)) if match else None)
+    if generated_mb > 0:
+        source = generate(generated_mb)
+        # Each copy of the sample runs its while loop 100 times
+        workloads["generated"] = (source, source.count(SAMPLE) * 100)
+    return workloads
+
+
+def run_once(source, engine, optimize):
+    """Lex, parse and execute source once; returns the time of each phase"""
+    start = time.perf_counter()
+    tokens = Lexer(source).tokenize()
+    lexed = time.perf_counter()
+    statements = Parser(tokens).parse()
+    if optimize:
+        statements = Optimizer().optimize(statements)
+    parsed = time.perf_counter()
+
+    interpreter = engine(None, Data())
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        # Same steps as the shell: resolve everything, then run and echo
+        # each statement
+        Resolver(interpreter.data).resolve(statements)
+        execute_statements(statements, interpreter)
+    executed = time.perf_counter()
+    return {"lex": lexed - start, "parse": parsed - lexed, "execute": executed - parsed}
+
+
+def peak_memory(source, engine, optimize):
+    """Peak bytes allocated while running source once"""
+    tracemalloc.start()
+    try:
+        run_once(source, engine, optimize)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of samples"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def benchmark(source, ops, engine, repeat, optimize):
+    times = {phase: [] for phase in PHASES}
+    for _ in range(repeat):
+        for phase, elapsed in run_once(source, engine, optimize).items():
+            times[phase].append(elapsed)
+
+    result = {
+        phase: {"median": statistics.median(samples), "p95": percentile(samples, 0.95)}
+        for phase, samples in times.items()
+    }
+    result["peak_memory"] = peak_memory(source, engine, optimize)
+    execute = result["execute"]["median"]
+    result["ops_per_sec"] = ops / execute if ops and execute else None
+    return result
+
+
+def list_storage_savings(workloads, engine, optimize):
+    """Peak memory of each workload with and without compact numeric lists"""
+    print(f"\nCompact numeric lists ({engine} engine):")
+    print(f"{'workload':<18} {'compact KB':>11} {'plain KB':>11} {'saved':>7}")
+    savings = {}
+    for name, (source, _) in workloads.items():
+        compact = peak_memory(source, ENGINES[engine], optimize)
+        numeric.COMPACT = False
+        try:
+            plain = peak_memory(source, ENGINES[engine], optimize)
+        finally:
+            numeric.COMPACT = True
+        saved = (plain - compact) / plain * 100 if plain else 0.0
+        savings[name] = {"compact": compact, "plain": plain}
+        print(f"{name:<18} {compact / 1024:11.0f} {plain / 1024:11.0f} {saved:6.1f}%")
+    return savings
+
+
+def compare(results, baseline, threshold):
+    """Print how each median moved against a saved baseline"""
+    print(f"\nAgainst baseline ({baseline.get('created', 'unknown date')}):")
+    for name, engines in results.items():
+        for engine, result in engines.items():
+            old = baseline.get("results", {}).get(name, {}).get(engine)
+            if old is None:
+                print(f"  {name:<18} {engine:<8} not in baseline")
+                continue
+            changes = []
+            for phase in PHASES:
+                before = old[phase]["median"]
+                after = result[phase]["median"]
+                change = (after - before) / before * 100 if before else 0.0
+                flag = ""
+                if change > threshold:
+                    flag = " slower"
+                elif change < -threshold:
+                    flag = " faster"
+                changes.append(f"{phase} {change:+6.1f}%{flag}")
+            print(f"  {name:<18} {engine:<8} " + "  ".join(changes))
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--engine", action="append", choices=sorted(ENGINES), help="engine to run, may be repeated (default: all)")
+    arg_parser.add_argument("--workload", action="append", help="workload to run, may be repeated (default: all)")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="timed runs per workload and engine")
+    arg_parser.add_argument("--generated-size", type=float, default=0.25, help="size of the generated script in MB, 0 to skip it")
+    arg_parser.add_argument("--no-optimize", action="store_true", help="run programs exactly as parsed")
+    arg_parser.add_argument("--save", help="write the results as JSON to this file")
+    arg_parser.add_argument("--baseline", help="compare against results saved with --save")
+    arg_parser.add_argument("--threshold", type=float, default=5.0, help="percent change flagged when comparing")
+    args = arg_parser.parse_args(argv)
+
+    functions.allow_deep_recursion()
+    engines = args.engine or list(ENGINES)
+    workloads = load_workloads(args.generated_size)
+    if args.workload:
+        unknown = set(args.workload) - set(workloads)
+        if unknown:
+            arg_parser.error(f"unknown workload: {', '.join(sorted(unknown))}")
+        workloads = {name: workloads[name] for name in args.workload}
+
+    print(f"{'workload':<18} {'engine':<8} {'lex ms':>15} {'parse ms':>15} {'execute ms':>15} {'peak KB':>9} {'ops/sec':>10}")
+    print(f"{'':<18} {'':<8} {'median / p95':>15} {'median / p95':>15} {'median / p95':>15}")
+    results = {}
+    for name, (source, ops) in workloads.items():
+        for engine in engines:
+            result = benchmark(source, ops, ENGINES[engine], args.repeat, not args.no_optimize)
+            results.setdefault(name, {})[engine] = result
+            columns = " ".join(
+                f"{result[phase]['median'] * 1000:7.1f}/{result[phase]['p95'] * 1000:7.1f}" for phase in PHASES
+            )
+            ops_text = f"{result['ops_per_sec']:10.0f}" if result["ops_per_sec"] else f"{'-':>10}"
+            print(f"{name:<18} {engine:<8} {columns} {result['peak_memory'] / 1024:9.0f} {ops_text}")
+
+    savings = list_storage_savings(workloads, engines[0], not args.no_optimize)
+
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "optimize": not args.no_optimize,
+        "results": results,
+        "list_storage": savings,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            compare(results, json.load(f), args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+"""Bytecode compiler for the stack virtual machine in vm.py.
+
+A program compiles to a CodeObject: a flat list of (opcode, arg) pairs plus
+a constant pool that the args index into. Variables are addressed by their
+slot in the Data store the program is compiled against. Control flow is expressed
+with absolute jump targets, so while loops are backward jumps rather than
+Python-level recursion.
+"""
+
+from tokens import Token, Variable
+from nodes import Literal, BinOp, Logical, Unary, If, While, For, Call, FunctionDef, Return, IndexAccess, MethodCall, ListLiteral, DictLiteral, Assign, Delete, Print, Deep
+from data import Data
+from functions import make_function
+import deep
+import runtime
+
+# Opcodes, roughly ordered by how often loop bodies execute them; the VM
+# tests them in this order.
+LOAD_GLOBAL = 0       # push the global in slot arg
+LOAD_CONST = 1        # push consts[arg]
+BINARY_OP = 2         # pop b, pop a, push a <BINARY_OP_NAMES[arg]> b
+STORE_GLOBAL = 3      # pop value into the global in slot arg
+POP_JUMP_IF_TRUE = 4  # pop value, jump to arg if truthy
+JUMP_IF_FALSE = 5     # pop value, jump to arg if falsy
+JUMP = 6              # jump to arg
+INDEX_GET = 7         # pop key, pop container, push container[key]
+INDEX_SET = 8         # pop key, pop container, pop value; container[key] = value
+UNARY_OP = 9          # pop a, push <UNARY_OP_NAMES[arg]> a
+CALL_METHOD = 10      # arg = (consts index of name, argc); pop args and object, push result
+PRINT = 11            # pop value and print it
+POP_TOP = 12          # discard top of stack
+DUP_TOP = 13          # push a second reference to top of stack
+BUILD_LIST = 14       # pop arg values, push them as a list
+BUILD_DICT = 15       # pop arg key/value pairs, push them as a dict
+INDEX_DELETE = 16     # pop key, pop container, delete container[key]
+RAISE = 17            # raise Exception(consts[arg])
+JUMP_IF_FALSE_OR_POP = 18  # jump to arg keeping top of stack if falsy, else pop it
+JUMP_IF_TRUE_OR_POP = 19   # jump to arg keeping top of stack if truthy, else pop it
+NORMALISE = 20        # turn a whole float on top of the stack into an int
+GET_ITER = 21         # pop a collection, push an iterator over what a for loop visits
+FOR_ITER = 22         # push the iterator's next item, or pop the iterator and jump to arg when it is done
+CALL_NATIVE = 23      # arg = (consts index of function, argc); pop args, push function(*args)
+LOAD_LOCAL = 24       # push the local in frame index arg
+STORE_LOCAL = 25      # pop value into the local in frame index arg
+CALL_FUNCTION = 26    # pop arg args and the function below them, run it in a new frame, push its result
+RETURN_VALUE = 27     # pop the result and return it from the running function
+MAKE_FUNCTION = 28    # push a Function for the FunctionDef consts[arg]
+
+OPCODE_NAMES = {
+    LOAD_GLOBAL: "LOAD_GLOBAL",
+    LOAD_CONST: "LOAD_CONST",
+    BINARY_OP: "BINARY_OP",
+    STORE_GLOBAL: "STORE_GLOBAL",
+    POP_JUMP_IF_TRUE: "POP_JUMP_IF_TRUE",
+    JUMP_IF_FALSE: "JUMP_IF_FALSE",
+    JUMP: "JUMP",
+    INDEX_GET: "INDEX_GET",
+    INDEX_SET: "INDEX_SET",
+    UNARY_OP: "UNARY_OP",
+    CALL_METHOD: "CALL_METHOD",
+    PRINT: "PRINT",
+    POP_TOP: "POP_TOP",
+    DUP_TOP: "DUP_TOP",
+    BUILD_LIST: "BUILD_LIST",
+    BUILD_DICT: "BUILD_DICT",
+    INDEX_DELETE: "INDEX_DELETE",
+    RAISE: "RAISE",
+    JUMP_IF_FALSE_OR_POP: "JUMP_IF_FALSE_OR_POP",
+    JUMP_IF_TRUE_OR_POP: "JUMP_IF_TRUE_OR_POP",
+    NORMALISE: "NORMALISE",
+    GET_ITER: "GET_ITER",
+    FOR_ITER: "FOR_ITER",
+    CALL_NATIVE: "CALL_NATIVE",
+    LOAD_LOCAL: "LOAD_LOCAL",
+    STORE_LOCAL: "STORE_LOCAL",
+    CALL_FUNCTION: "CALL_FUNCTION",
+    RETURN_VALUE: "RETURN_VALUE",
+    MAKE_FUNCTION: "MAKE_FUNCTION",
+}
+
+JUMP_OPCODES = (POP_JUMP_IF_TRUE, JUMP_IF_FALSE, JUMP, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP, FOR_ITER)
+
+BINARY_OP_NAMES = list(runtime.BINARY_OPS)
+UNARY_OP_NAMES = list(runtime.UNARY_OPS)
+
+
+class CodeObject:
+    """A compiled program: instructions plus the pools their args index"""
+
+    def __init__(self, instructions, consts, names, local_names=()):
+        self.instructions = instructions  # list of (opcode, arg) tuples
+        self.consts = consts
+        self.names = names  # slot -> variable name, for the disassembler
+        self.local_names = local_names  # frame index -> local name, for a function body
+
+    def __len__(self):
+        return len(self.instructions)
+
+
+class BytecodeCompiler:
+
+    def __init__(self, base, scope=None):
+        self.data = base  # Data store whose slots the globals compile to
+        self.scope = scope  # local name -> frame index when compiling a function body
+        self.instructions = []
+        self.consts = []
+        self.const_index = {}
+
+    def compile(self, tree):
+        """Compile a statement or a list of statements, leaving its result on the stack"""
+        self.compile_statement(tree, keep=True)
+        return CodeObject(self.instructions, self.consts, self.data.names)
+
+    def compile_function(self, function):
+        """Compile a function's body; falling off its end returns None"""
+        self.compile_block(function.body, keep=False)
+        self.emit(LOAD_CONST, self.add_const(None))
+        self.emit(RETURN_VALUE)
+        return CodeObject(self.instructions, self.consts, self.data.names, list(function.locals))
+
+    def emit_load(self, name):
+        if self.scope is not None and name in self.scope:
+            self.emit(LOAD_LOCAL, self.scope[name])
+        else:
+            self.emit(LOAD_GLOBAL, self.add_name(name))
+
+    def emit_store(self, name):
+        if self.scope is not None and name in self.scope:
+            self.emit(STORE_LOCAL, self.scope[name])
+        else:
+            self.emit(STORE_GLOBAL, self.add_name(name))
+
+    def emit(self, opcode, arg=None):
+        self.instructions.append((opcode, arg))
+        return len(self.instructions) - 1
+
+    def patch(self, position, target):
+        # Point a previously emitted jump at target
+        self.instructions[position] = (self.instructions[position][0], target)
+
+    def add_const(self, value):
+        # Keyed by type too so 1, 1.0 and true stay distinct constants
+        key = (type(value), value)
+        if key not in self.const_index:
+            self.const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return self.const_index[key]
+
+    def add_name(self, name):
+        return self.data.slot(name)
+
+    def compile_block(self, statements, keep):
+        if not statements:
+            if keep:
+                self.emit(LOAD_CONST, self.add_const(None))
+            return
+        last = len(statements) - 1
+        for i, stmt in enumerate(statements):
+            self.compile_statement(stmt, keep and i == last)
+
+    def compile_statement(self, stmt, keep):
+        """Compile a statement; when keep is set its result stays on the stack"""
+        if isinstance(stmt, list):
+            self.compile_block(stmt, keep)
+
+        elif isinstance(stmt, Print):
+            self.compile_expression(stmt.expr)
+            self.emit(PRINT)
+            if keep:
+                self.emit(LOAD_CONST, self.add_const(None))
+
+        elif isinstance(stmt, Assign):
+            self.compile_assign(stmt, keep)
+
+        elif isinstance(stmt, If):
+            self.compile_expression(stmt.condition)
+            jump_to_else = self.emit(JUMP_IF_FALSE)
+            self.compile_block(stmt.then_block, keep)
+            if stmt.else_block or keep:
+                jump_to_end = self.emit(JUMP)
+                self.patch(jump_to_else, len(self.instructions))
+                self.compile_block(stmt.else_block or [], keep)
+                self.patch(jump_to_end, len(self.instructions))
+            else:
+                self.patch(jump_to_else, len(self.instructions))
+
+        elif isinstance(stmt, While):
+            # The condition sits after the body so each iteration costs a
+            # single conditional backward jump.
+            jump_to_condition = self.emit(JUMP)
+            body_start = len(self.instructions)
+            self.compile_block(stmt.body, keep=False)
+            self.patch(jump_to_condition, len(self.instructions))
+            self.compile_expression(stmt.condition)
+            self.emit(POP_JUMP_IF_TRUE, body_start)
+            if keep:
+                self.emit(LOAD_CONST, self.add_const(None))
+
+        elif isinstance(stmt, For):
+            # The iterator stays on the stack for the whole loop
+            self.compile_expression(stmt.iterable)
+            self.emit(GET_ITER)
+            loop_start = self.emit(FOR_ITER)
+            self.emit_store(stmt.variable.val)
+            self.compile_block(stmt.body, keep=False)
+            self.emit(JUMP, loop_start)
+            self.patch(loop_start, len(self.instructions))
+            if keep:
+                self.emit(LOAD_CONST, self.add_const(None))
+
+        elif isinstance(stmt, FunctionDef):
+            self.emit(MAKE_FUNCTION, self.add_const(stmt))
+            self.emit(STORE_GLOBAL, self.add_name(stmt.name))
+            if keep:
+                self.emit(LOAD_CONST, self.add_const(None))
+
+        elif isinstance(stmt, Return):
+            self.compile_expression(stmt.value)
+            self.emit(RETURN_VALUE)
+
+        elif isinstance(stmt, Delete):
+            target = stmt.target
+            if isinstance(target, IndexAccess):
+                self.compile_expression(target.container)
+                self.compile_expression(target.key)
+                self.emit(INDEX_DELETE)
+            else:
+                self.emit(RAISE, self.add_const("Delete target must be an indexable expression"))
+            if keep:
+                self.emit(LOAD_CONST, self.add_const(None))
+
+        else:
+            self.compile_expression(stmt)
+            if not keep:
+                self.emit(POP_TOP)
+
+    def compile_assign(self, node, keep):
+        target = node.target
+        # Right-hand side runs first, as in Interpreter.eval_assign
+        self.compile_expression(node.value)
+        if keep:
+            self.emit(DUP_TOP)
+
+        if isinstance(target, Variable):
+            self.emit_store(target.val)
+        elif isinstance(target, IndexAccess):
+            self.compile_expression(target.container)
+            self.compile_expression(target.key)
+            self.emit(INDEX_SET)
+        else:
+            self.emit(RAISE, self.add_const("Left operand of '=' must be a variable or indexable expression"))
+
+    def compile_expression(self, node):
+        """Compile an expression that pushes exactly one value"""
+        if isinstance(node, Literal):
+            self.emit(LOAD_CONST, self.add_const(node.value))
+
+        elif isinstance(node, Variable):
+            self.emit_load(node.val)
+
+        elif isinstance(node, BinOp):
+            self.compile_expression(node.left)
+            self.compile_expression(node.right)
+            self.emit_operation(node)
+
+        elif isinstance(node, Logical):
+            # Short-circuit: the left value stays on the stack as the result
+            # when it decides it, otherwise it is replaced by the right one
+            self.compile_expression(node.left)
+            jump_to_end = self.emit_operation(node)
+            if jump_to_end is None:
+                return
+            self.compile_expression(node.right)
+            self.patch(jump_to_end, len(self.instructions))
+            self.emit(NORMALISE)
+
+        elif isinstance(node, Unary):
+            self.compile_expression(node.operand)
+            self.emit_operation(node)
+
+        elif isinstance(node, IndexAccess):
+            self.compile_expression(node.container)
+            self.compile_expression(node.key)
+            self.emit_operation(node)
+
+        elif isinstance(node, MethodCall):
+            self.compile_expression(node.obj)
+            for arg in node.args:
+                self.compile_expression(arg)
+            self.emit_operation(node)
+
+        elif isinstance(node, Call):
+            if node.function is None:
+                self.emit_load(node.name)
+            for arg in node.args:
+                self.compile_expression(arg)
+            self.emit_operation(node)
+
+        elif isinstance(node, ListLiteral):
+            for el in node.elements:
+                self.compile_expression(el)
+            self.emit_operation(node)
+
+        elif isinstance(node, DictLiteral):
+            for key_expr, val_expr in node.pairs:
+                self.compile_expression(key_expr)
+                self.compile_expression(val_expr)
+            self.emit_operation(node)
+
+        elif isinstance(node, Deep):
+            self.compile_deep(node)
+
+        elif isinstance(node, Token):
+            # Literal tokens already hold the native value decoded by the lexer
+            self.emit(LOAD_CONST, self.add_const(node.val))
+
+        elif node is None or not hasattr(node, "_fields"):
+            self.emit(LOAD_CONST, self.add_const(node))
+
+        else:
+            # Statements used where a value is expected, e.g. the tail of an if branch
+            self.compile_statement(node, keep=True)
+
+
+    def emit_operation(self, node):
+        """Emit what node does once its operands are on the stack
+
+        For and/or this is the conditional jump past the right operand,
+        whose position is returned.
+        """
+        cls = node.__class__
+        if cls is BinOp:
+            op = node.op.lower()
+            if op in runtime.BINARY_OPS:
+                self.emit(BINARY_OP, BINARY_OP_NAMES.index(op))
+            else:
+                self.emit(RAISE, self.add_const(f"Unknown binary operator: {op}"))
+        elif cls is Logical:
+            if node.op == "and":
+                return self.emit(JUMP_IF_FALSE_OR_POP)
+            if node.op == "or":
+                return self.emit(JUMP_IF_TRUE_OR_POP)
+            self.emit(RAISE, self.add_const(f"Unknown logical operator: {node.op}"))
+        elif cls is Unary:
+            op = node.op.lower()
+            if op in runtime.UNARY_OPS:
+                self.emit(UNARY_OP, UNARY_OP_NAMES.index(op))
+            else:
+                self.emit(RAISE, self.add_const(f"Unknown unary operator: {op}"))
+        elif cls is IndexAccess:
+            self.emit(INDEX_GET)
+        elif cls is MethodCall:
+            self.emit(CALL_METHOD, (self.add_const(node.method), len(node.args)))
+        elif cls is Call:
+            if node.function is None:
+                self.emit(CALL_FUNCTION, len(node.args))
+            else:
+                self.emit(CALL_NATIVE, (self.add_const(node.function), len(node.args)))
+        elif cls is ListLiteral:
+            self.emit(BUILD_LIST, len(node.elements))
+        else:
+            self.emit(BUILD_DICT, len(node.pairs))
+        return None
+
+    def compile_deep(self, node):
+        """compile_expression for a Deep node, with a work stack in place of recursion"""
+        work = [(deep.VISIT, node.expr)]
+        while work:
+            action, expr = work.pop()
+            if action == deep.VISIT:
+                if expr.__class__ not in deep.BRANCHES:
+                    self.compile_expression(expr)
+                    continue
+                if expr.__class__ is Call and expr.function is None:
+                    self.emit_load(expr.name)
+                work.append((deep.APPLY, expr))
+                work.extend((deep.VISIT, operand) for operand in reversed(deep.operands(expr)))
+            elif action == deep.APPLY:
+                jump_to_end = self.emit_operation(expr)
+                if jump_to_end is not None:
+                    # and/or: the right operand, then the end of the jump
+                    work.append((deep.NORMALISE, jump_to_end))
+                    work.append((deep.VISIT, expr.right))
+            else:
+                self.patch(expr, len(self.instructions))
+                self.emit(NORMALISE)
+
+
+def compile_program(tree, base=None):
+    """Compile parsed statements into a CodeObject against a Data store"""
+    return BytecodeCompiler(base if base is not None else Data()).compile(tree)
+
+
+def format_arg(code, opcode, arg):
+    if opcode in (LOAD_CONST, RAISE):
+        return f"{arg} ({code.consts[arg]!r})"
+    if opcode in (LOAD_GLOBAL, STORE_GLOBAL):
+        return f"{arg} ({code.names[arg]})"
+    if opcode in (LOAD_LOCAL, STORE_LOCAL):
+        return f"{arg} ({code.local_names[arg]})"
+    if opcode == MAKE_FUNCTION:
+        return f"{arg} (fn {code.consts[arg].name})"
+    if opcode == BINARY_OP:
+        return f"{arg} ({BINARY_OP_NAMES[arg]})"
+    if opcode == UNARY_OP:
+        return f"{arg} ({UNARY_OP_NAMES[arg]})"
+    if opcode == CALL_METHOD:
+        name_index, argc = arg
+        return f"{name_index} ({code.consts[name_index]}, {argc} args)"
+    if opcode == CALL_NATIVE:
+        function_index, argc = arg
+        return f"{function_index} ({code.consts[function_index].__name__.rstrip('_')}, {argc} args)"
+    if opcode in JUMP_OPCODES:
+        return f"to {arg}"
+    if arg is None:
+        return ""
+    return str(arg)
+
+
+def disassemble(code, base=None):
+    """Render a CodeObject as readable text, one instruction per line
+
+    With the Data store it was compiled against, the body of every function
+    it defines is listed after it.
+    """
+    targets = {arg for opcode, arg in code.instructions if opcode in JUMP_OPCODES}
+    lines = []
+    for offset, (opcode, arg) in enumerate(code.instructions):
+        marker = ">>" if offset in targets else "  "
+        text = f"{marker} {offset:4d} {OPCODE_NAMES[opcode]:<18} {format_arg(code, opcode, arg)}"
+        lines.append(text.rstrip())
+    if base is not None:
+        for opcode, arg in code.instructions:
+            if opcode == MAKE_FUNCTION:
+                function = make_function(code.consts[arg])
+                body = BytecodeCompiler(base, function.locals).compile_function(function)
+                lines.append(f"\nfn {function.name}({', '.join(function.params)}):")
+                lines.append(disassemble(body))
+    return "\n".join(lines)
@@ -0,0 +1,115 @@
+"""On-disk cache of parsed programs for the shell's run command.
+
+Like Python's __pycache__, each script gets a file in a __kaycache__
+directory next to it. The file starts with a header holding the interpreter
+version and the SHA-256 of the script source; the parsed statements follow
+as a pickle. A header mismatch, a truncated file or any unpickling error is
+treated as a miss, and the entry is rewritten after the next parse.
+"""
+
+import gc
+import hashlib
+import os
+import pickle
+import sys
+
+MAGIC = b"KAYC"
+DIGEST_SIZE = 32
+HEADER_SIZE = len(MAGIC) + 2 * DIGEST_SIZE
+
+# Modules whose source decides what a parse produces; editing any of them
+# changes the interpreter version and so invalidates every cache entry.
+PARSER_MODULES = ("lexer.py", "myparser.py", "natives.py", "nodes.py", "tokens.py")
+
+_version = None
+
+
+def interpreter_version():
+    """Digest of the Python version, pickle protocol and parser sources"""
+    global _version
+    if _version is None:
+        digest = hashlib.sha256()
+        digest.update(sys.version.encode())
+        digest.update(str(pickle.HIGHEST_PROTOCOL).encode())
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in PARSER_MODULES:
+            with open(os.path.join(here, name), "rb") as f:
+                digest.update(f.read())
+        _version = digest.digest()
+    return _version
+
+
+def source_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file's text, read in chunks so large scripts stay out of memory"""
+    digest = hashlib.sha256()
+    with open(path, "r") as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            digest.update(chunk.encode("utf-8"))
+    return digest.digest()
+
+
+class HashingReader:
+    """File wrapper that hashes exactly the text the lexer reads through it"""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        chunk = self.f.read(size)
+        self.digest.update(chunk.encode("utf-8"))
+        return chunk
+
+
+class ProgramCache:
+
+    def __init__(self, directory_name="__kaycache__"):
+        self.directory_name = directory_name
+
+    def cache_path(self, path):
+        folder, name = os.path.split(os.path.abspath(path))
+        return os.path.join(folder, self.directory_name, name + ".kayc")
+
+    def header(self, key):
+        return MAGIC + interpreter_version() + key
+
+    def load(self, path, key):
+        """Return the cached statements for path, or None on any kind of miss"""
+        try:
+            with open(self.cache_path(path), "rb") as f:
+                if f.read(HEADER_SIZE) != self.header(key):
+                    return None
+                # The tree is acyclic, so collector passes triggered by the
+                # burst of allocations would only cost time
+                gc_was_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    return pickle.load(f)
+                finally:
+                    if gc_was_enabled:
+                        gc.enable()
+        except Exception:
+            # Missing, stale, truncated or corrupt: all just mean re-parse
+            return None
+
+    def store(self, path, key, statements):
+        """Write statements for path; failures leave the cache untouched"""
+        import tempfile  # only needed on a miss, so kept out of start-up
+
+        target = self.cache_path(path)
+        temp_path = None
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.header(key))
+                pickle.dump(statements, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.chmod(temp_path, 0o644)  # mkstemp creates files private to the owner
+            # Readers see either the old entry or the complete new one
+            os.replace(temp_path, target)
+            return True
+        except Exception:
+            # Read-only directories, very deep trees, full disks: run uncached
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
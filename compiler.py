@@ -0,0 +1,536 @@
+from tokens import Token, Integer, Float, BooleanValue, String, Variable
+from nodes import Literal, BinOp, Logical, Unary, If, While, For, Call, FunctionDef, Return, IndexAccess, MethodCall, ListLiteral, DictLiteral, Assign, Delete, Print, Deep
+from data import UNSET
+from resolver import Resolver
+from output import Output
+from numeric import NumericList
+from functions import Function, make_function, MISSING
+import deep
+import runtime
+
+# What a compiled statement in a function body returns once a return
+# statement has run; the returned value is in Compiler.returned
+RETURNING = object()
+
+
+class Compiler:
+    """Turns parsed statements into a tree of pre-bound Python closures.
+
+    The shape tests that Interpreter.evaluate repeats on every visit are done
+    once here; running the result is just a chain of closure calls.
+    """
+
+    def __init__(self, base, output=None):
+        self.data = base  # Data store; variables compile to its slots
+        self.output = output if output is not None else Output()
+        # While a function body is compiled, its local name -> frame index
+        self.scope = None
+        self.frames = []  # frame of each function call running, innermost last
+        self.returned = [None]  # value of the return statement that ran last
+
+    def compile(self, tree):
+        """Compile a statement, a list of statements or an expression"""
+        return self.compile_node(tree)
+
+    def compile_block(self, statements):
+        fns = tuple(self.compile_node(stmt) for stmt in statements)
+        if not fns:
+            return lambda: None
+        if len(fns) == 1:
+            return fns[0]
+
+        if self.scope is not None:
+            # In a function body, stop at a return and pass it outwards
+            def run_function_block():
+                for fn in fns:
+                    if fn() is RETURNING:
+                        return RETURNING
+                return None
+            return run_function_block
+
+        def run_block():
+            result = None
+            for fn in fns:
+                result = fn()
+            return result
+        return run_block
+
+    def compile_node(self, expr):
+        if expr is None:
+            return lambda: None
+        handler = Compiler.dispatch.get(expr.__class__)
+        if handler is not None:
+            return handler(self, expr)
+        if isinstance(expr, Token):
+            return self.compile_token(expr)
+
+        value = expr
+        return lambda: value
+
+    def compile_token(self, token):
+        if isinstance(token, Variable):
+            return self.compile_variable(token.val)
+        # Literal tokens already hold the native value decoded by the lexer
+        value = token.val
+        return lambda: value
+
+    def compile_literal(self, node):
+        value = node.value
+        return lambda: value
+
+    def compile_error(self, message):
+        def fail():
+            raise Exception(message)
+        return fail
+
+    def compile_variable(self, var_name):
+        if self.scope is not None and var_name in self.scope:
+            frames = self.frames
+            index = self.scope[var_name]
+
+            def load_local():
+                value = frames[-1][index]
+                if value is UNSET:
+                    raise Exception(f"Undefined variable: {var_name}")
+                return value
+            return load_local
+
+        # Bind the variable's slot now; the store's value list only ever grows
+        values = self.data.values
+        slot = self.data.slot(var_name)
+
+        def load():
+            value = values[slot]
+            if value is UNSET:
+                raise Exception(f"Undefined variable: {var_name}")
+            return value
+        return load
+
+    def compile_print(self, node):
+        value = self.compile_node(node.expr)
+
+        write = self.output.write
+
+        def run_print():
+            write(value())
+        return run_print
+
+    def compile_if(self, node):
+        cond = self.compile_node(node.condition)
+        then_block = self.compile_block(node.then_block)
+        else_block = self.compile_block(node.else_block) if node.else_block else None
+
+        if else_block is None:
+            def run_if():
+                if cond():
+                    return then_block()
+                return None
+        else:
+            def run_if():
+                if cond():
+                    return then_block()
+                return else_block()
+        return run_if
+
+    def compile_while(self, node):
+        cond = self.compile_node(node.condition)
+        stmts = tuple(self.compile_node(stmt) for stmt in node.body)
+
+        if self.scope is not None:
+            def run_function_while():
+                while cond():
+                    for stmt in stmts:
+                        if stmt() is RETURNING:
+                            return RETURNING
+                return None
+            return run_function_while
+
+        def run_while():
+            while cond():
+                for stmt in stmts:
+                    stmt()
+            return None
+        return run_while
+
+    def compile_for(self, node):
+        iterable = self.compile_node(node.iterable)
+        stmts = tuple(self.compile_node(stmt) for stmt in node.body)
+        iterate = runtime.iterate
+
+        if self.scope is not None:
+            frames = self.frames
+            # A loop variable in a function body is always one of its locals
+            index = self.scope[node.variable.val]
+
+            def run_function_for():
+                frame = frames[-1]
+                for item in iterate(iterable()):
+                    frame[index] = item
+                    for stmt in stmts:
+                        if stmt() is RETURNING:
+                            return RETURNING
+                return None
+            return run_function_for
+
+        values = self.data.values
+        slot = self.data.slot(node.variable.val)
+
+        def run_for():
+            for item in iterate(iterable()):
+                values[slot] = item
+                for stmt in stmts:
+                    stmt()
+            return None
+        return run_for
+
+    def compile_call(self, node):
+        function = node.function
+        fns = tuple(self.compile_node(arg) for arg in node.args)
+        if function is None:
+            return self.compile_function_call(node, fns)
+        if len(fns) == 1:
+            arg = fns[0]
+            return lambda: function(arg())
+        if len(fns) == 2:
+            first, second = fns
+            return lambda: function(first(), second())
+        return lambda: function(*[fn() for fn in fns])
+
+    def compile_function_call(self, node, fns):
+        callee = self.compile_callee(node.name)
+        call_function = self.call_function
+        return lambda: call_function(callee(), [fn() for fn in fns])
+
+    def compile_callee(self, name):
+        if self.scope is not None and name in self.scope:
+            return self.compile_variable(name)
+        values = self.data.values
+        slot = self.data.slot(name)
+
+        def callee():
+            value = values[slot]
+            if value is UNSET:
+                raise Exception(f"Undefined function: {name}")
+            return value
+        return callee
+
+    def call_function(self, function, args):
+        """Run a user-defined function in a new frame and return its result"""
+        if function.__class__ is not Function:
+            raise Exception(f"Cannot call {runtime.type_name(function)}")
+        memo = function.memo
+        if memo is not None:
+            key, result = memo.lookup(args)
+            if result is not MISSING:
+                return result
+
+        body = function.compiled.get(self)
+        if body is None:
+            body = self.compile_function(function)
+        frames = self.frames
+        frames.append(function.new_frame(args))
+        try:
+            result = self.returned[0] if body() is RETURNING else None
+        except RecursionError:
+            raise Exception(f"Maximum call depth exceeded in {function.name}()")
+        finally:
+            frames.pop()
+
+        if memo is not None:
+            memo.store(key, result)
+        return result
+
+    def compile_function(self, function):
+        """Compile a function's body against its locals, once per compiler"""
+        saved_scope = self.scope
+        self.scope = function.locals
+        try:
+            # An empty scope still marks the body as a function body
+            body = self.compile_block(function.body)
+        finally:
+            self.scope = saved_scope
+        function.compiled[self] = body
+        return body
+
+    def compile_function_def(self, node):
+        values = self.data.values
+        slot = self.data.slot(node.name)
+
+        def define():
+            values[slot] = make_function(node)
+            return None
+        return define
+
+    def compile_return(self, node):
+        value = self.compile_node(node.value)
+        returned = self.returned
+
+        def run_return():
+            returned[0] = value()
+            return RETURNING
+        return run_return
+
+    def compile_deep(self, node):
+        # Nested closures would recurse as deeply as the expression when
+        # run, so only its leaves and callees are compiled and deep.evaluate
+        # walks the rest
+        leaves = {}
+        callees = {}
+        for child in deep.walk(node.expr):
+            if child.__class__ not in deep.BRANCHES:
+                leaves[id(child)] = self.compile_node(child)
+            elif child.__class__ is Call and child.function is None:
+                callees[id(child)] = self.compile_callee(child.name)
+        expr = node.expr
+        evaluate = deep.evaluate
+        call_function = self.call_function
+
+        def leaf(child):
+            return leaves[id(child)]()
+
+        def call(child, args):
+            return call_function(callees[id(child)](), args)
+        return lambda: evaluate(expr, leaf, call)
+
+    def compile_list_literal(self, node):
+        fns = tuple(self.compile_node(el) for el in node.elements)
+        make_list = runtime.make_list
+        return lambda: make_list([fn() for fn in fns])
+
+    def compile_dict_literal(self, node):
+        compiled = tuple((self.compile_node(key_expr), self.compile_node(val_expr))
+                         for key_expr, val_expr in node.pairs)
+
+        def build_dict():
+            evaluated_dict = {}
+            for key_fn, val_fn in compiled:
+                key = key_fn()
+                val = val_fn()
+                if not isinstance(key, runtime.DICT_KEY):
+                    raise Exception(f"Invalid dictionary key type: {runtime.type_name(key)}")
+                evaluated_dict[key] = val
+            return evaluated_dict
+        return build_dict
+
+    def compile_index_access(self, node):
+        container = self.compile_node(node.container)
+        key = self.compile_node(node.key)
+        index_get = runtime.index_get
+
+        def run_index():
+            container_val = container()
+            index_val = key()
+            # Fast path for the common in-range list read
+            if index_val.__class__ is int:
+                cls = container_val.__class__
+                try:
+                    if cls is list:
+                        return container_val[index_val]
+                    if cls is NumericList:
+                        return container_val.items[index_val]
+                except IndexError:
+                    pass
+            return index_get(container_val, index_val)
+        return run_index
+
+    def compile_delete(self, node):
+        target = node.target
+        if not isinstance(target, IndexAccess):
+            return self.compile_error("Delete target must be an indexable expression")
+
+        container = self.compile_node(target.container)
+        key = self.compile_node(target.key)
+        index_delete = runtime.index_delete
+        return lambda: index_delete(container(), key())
+
+    def compile_method_call(self, node):
+        obj = self.compile_node(node.obj)
+        method_name = node.method
+        args = tuple(self.compile_node(arg) for arg in node.args)
+        call_method = runtime.call_method
+
+        # Pushing one number onto a compact list and popping the last item
+        # skip the generic method call while the storage allows it
+        if method_name == "push" and len(args) == 1:
+            arg = args[0]
+
+            def run_push():
+                obj_val = obj()
+                value = arg()
+                if obj_val.__class__ is NumericList and value.__class__ is obj_val.kind:
+                    try:
+                        obj_val.items.append(value)
+                        return obj_val
+                    except OverflowError:
+                        pass
+                return call_method(obj_val, method_name, [value])
+            return run_push
+
+        if method_name == "pop" and not args:
+            def run_pop():
+                obj_val = obj()
+                if obj_val.__class__ is NumericList and obj_val.items:
+                    return obj_val.items.pop()
+                return call_method(obj_val, method_name, [])
+            return run_pop
+
+        return lambda: call_method(obj(), method_name, [arg() for arg in args])
+
+    def compile_unary(self, node):
+        op = node.op.lower()
+        operand = self.compile_node(node.operand)
+        if op not in runtime.UNARY_OPS:
+            return self.compile_error(f"Unknown unary operator: {op}")
+        fn = runtime.UNARY_OPS[op]
+        return lambda: fn(operand())
+
+    def compile_binary(self, node):
+        op = node.op.lower()
+        left = self.compile_node(node.left)
+        right = self.compile_node(node.right)
+        if op not in runtime.BINARY_OPS:
+            return self.compile_error(f"Unknown binary operator: {op}")
+        fn = runtime.BINARY_OPS[op]
+
+        # int op int never needs the type checks or float normalisation,
+        # so the arithmetic operators get a direct fast path.
+        if op == "+":
+            def run_binary():
+                a = left()
+                b = right()
+                if a.__class__ is int and b.__class__ is int:
+                    return a + b
+                return fn(a, b)
+        elif op == "-":
+            def run_binary():
+                a = left()
+                b = right()
+                if a.__class__ is int and b.__class__ is int:
+                    return a - b
+                return fn(a, b)
+        elif op == "*":
+            def run_binary():
+                a = left()
+                b = right()
+                if a.__class__ is int and b.__class__ is int:
+                    return a * b
+                return fn(a, b)
+        else:
+            def run_binary():
+                return fn(left(), right())
+        return run_binary
+
+    def compile_logical(self, node):
+        left = self.compile_node(node.left)
+        right = self.compile_node(node.right)
+        normalise = runtime.normalise
+
+        # Short-circuit: the right operand only runs when it decides the result
+        if node.op == "and":
+            def run_logical():
+                value = left()
+                return normalise(right() if value else value)
+        elif node.op == "or":
+            def run_logical():
+                value = left()
+                return normalise(value if value else right())
+        else:
+            return self.compile_error(f"Unknown logical operator: {node.op}")
+        return run_logical
+
+    def compile_assign(self, node):
+        target = node.target
+        value = self.compile_node(node.value)
+
+        if isinstance(target, Variable):
+            if self.scope is not None and target.val in self.scope:
+                frames = self.frames
+                index = self.scope[target.val]
+
+                def assign_local():
+                    result = value()
+                    frames[-1][index] = result
+                    return result
+                return assign_local
+
+            values = self.data.values
+            slot = self.data.slot(target.val)
+
+            def assign():
+                result = value()
+                values[slot] = result
+                return result
+            return assign
+
+        if isinstance(target, IndexAccess):
+            container = self.compile_node(target.container)
+            key = self.compile_node(target.key)
+            index_set = runtime.index_set
+
+            def assign_index():
+                # Right-hand side runs first, as in Interpreter.eval_assign
+                result = value()
+                container_val = container()
+                key_val = key()
+                # Fast path for an in-range store that keeps a compact list compact
+                if container_val.__class__ is NumericList and key_val.__class__ is int \
+                        and result.__class__ is container_val.kind:
+                    try:
+                        container_val.items[key_val] = result
+                        return result
+                    except (IndexError, OverflowError):
+                        pass
+                return index_set(container_val, key_val, result)
+            return assign_index
+
+        return self.compile_error("Left operand of '=' must be a variable or indexable expression")
+
+
+# Node type -> compile method, so compile_node() does a single lookup per node
+Compiler.dispatch = {
+    list: Compiler.compile_block,
+    Integer: Compiler.compile_token,
+    Float: Compiler.compile_token,
+    BooleanValue: Compiler.compile_token,
+    String: Compiler.compile_token,
+    Variable: Compiler.compile_token,
+    Literal: Compiler.compile_literal,
+    Print: Compiler.compile_print,
+    If: Compiler.compile_if,
+    While: Compiler.compile_while,
+    For: Compiler.compile_for,
+    Call: Compiler.compile_call,
+    FunctionDef: Compiler.compile_function_def,
+    Return: Compiler.compile_return,
+    ListLiteral: Compiler.compile_list_literal,
+    DictLiteral: Compiler.compile_dict_literal,
+    IndexAccess: Compiler.compile_index_access,
+    Delete: Compiler.compile_delete,
+    MethodCall: Compiler.compile_method_call,
+    Unary: Compiler.compile_unary,
+    BinOp: Compiler.compile_binary,
+    Logical: Compiler.compile_logical,
+    Assign: Compiler.compile_assign,
+    Deep: Compiler.compile_deep,
+}
+
+
+class ClosureInterpreter:
+    """Drop-in replacement for Interpreter that runs compiled closures"""
+
+    def __init__(self, tree, base, output=None):
+        self.tree = tree
+        self.data = base
+        self.output = output if output is not None else Output()
+        self.compiler = Compiler(base, self.output)
+
+    def interpret(self, tree=None):
+        """Main interpretation entry point"""
+        if tree is None:
+            tree = self.tree
+        Resolver(self.data).resolve(tree)
+        return self.prepare(tree)()
+
+    def prepare(self, tree):
+        """A callable that runs tree, already resolved, each time it is called"""
+        return self.compiler.compile(tree)
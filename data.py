@@ -1,14 +1,40 @@
+class Unset:
+    """Marker held by a slot that has been resolved but not yet written"""
+
+    def __repr__(self):
+        return "<unset>"
+
+UNSET = Unset()
+
 class Data:
+    # Globals live in a flat list indexed by slot number. The resolver and
+    # the compilers ask for each name's slot once; running code then reads
+    # and writes values[slot] directly instead of hashing the name.
 
     def __init__(self):
-        self.variables = {}
+        self.slots = {}  # name -> slot index
+        self.names = []  # slot index -> name
+        self.values = []  # slot index -> value, UNSET until first written
+
+    def slot(self, name):
+        # Slot for a name, allocating one on first use
+        index = self.slots.get(name)
+        if index is None:
+            index = len(self.values)
+            self.slots[name] = index
+            self.names.append(name)
+            self.values.append(UNSET)
+        return index
 
     def read(self, id):
-        return self.variables[id]
-    
+        value = self.values[self.slots[id]]
+        if value is UNSET:
+            raise KeyError(id)
+        return value
+
     def read_all(self):
-        return self.variables
-    
+        return {name: value for name, value in zip(self.names, self.values) if value is not UNSET}
+
     def write(self, variable, expression):
         variable_name = variable
-        self.variables[variable_name] = expression
\ No newline at end of file
+        self.values[self.slot(variable_name)] = expression
@@ -0,0 +1,123 @@
+"""Evaluation of expressions too deeply nested for Python recursion.
+
+The parser wraps any expression more than nodes.DEEP_LIMIT levels deep, such
+as a generated sum of 100,000 terms, in a Deep node. The tree-walking
+interpreter and the closure compiler recurse through every other expression,
+which is fastest, but hand a Deep node's expression to evaluate() here: it
+visits the nodes with an explicit work stack and keeps their values on a
+value stack, so nesting depth costs memory rather than Python frames. The
+bytecode compiler emits the same order of operations, see
+BytecodeCompiler.compile_deep.
+"""
+
+from nodes import BinOp, Logical, Unary, Call, IndexAccess, MethodCall, ListLiteral, DictLiteral
+import runtime
+
+# Nodes with operands; anything else is a leaf the engine evaluates itself
+BRANCHES = (BinOp, Logical, Unary, Call, IndexAccess, MethodCall, ListLiteral, DictLiteral)
+
+VISIT = 0  # evaluate the node, leaving its value on the value stack
+APPLY = 1  # its operands are on the value stack: replace them with its value
+NORMALISE = 2  # the right operand of and/or is on the value stack
+
+
+def operands(node):
+    """The operand expressions of a branch node, in evaluation order"""
+    cls = node.__class__
+    if cls is BinOp:
+        return (node.left, node.right)
+    if cls is Logical:
+        return (node.left,)  # the right one only runs if it decides the result
+    if cls is Unary:
+        return (node.operand,)
+    if cls is IndexAccess:
+        return (node.container, node.key)
+    if cls is MethodCall:
+        return (node.obj, *node.args)
+    if cls is Call:
+        return node.args
+    if cls is ListLiteral:
+        return node.elements
+    return [expr for pair in node.pairs for expr in pair]
+
+
+def walk(expr):
+    """Every node in expr, parents before their operands, without recursion"""
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        yield node
+        if node.__class__ is Logical:
+            stack.append(node.right)
+            stack.append(node.left)
+        elif node.__class__ in BRANCHES:
+            stack.extend(reversed(operands(node)))
+
+
+def evaluate(expr, leaf, call):
+    """Value of expr, where leaf(node) evaluates a literal or variable and
+    call(node, args) runs a call of a user-defined function"""
+    values = []
+    push = values.append
+    pop = values.pop
+    work = [(VISIT, expr)]
+    while work:
+        action, node = work.pop()
+        cls = node.__class__
+
+        if action == VISIT:
+            if cls not in BRANCHES:
+                push(leaf(node))
+                continue
+            work.append((APPLY, node))
+            work.extend((VISIT, operand) for operand in reversed(operands(node)))
+
+        elif action == NORMALISE:
+            values[-1] = runtime.normalise(values[-1])
+
+        elif cls is BinOp:
+            right = pop()
+            values[-1] = runtime.binary_op(node.op.lower())(values[-1], right)
+
+        elif cls is Logical:
+            left = values[-1]
+            if node.op == "and":
+                decided = not left
+            elif node.op == "or":
+                decided = bool(left)
+            else:
+                raise Exception(f"Unknown logical operator: {node.op}")
+            if decided:
+                values[-1] = runtime.normalise(left)
+            else:
+                pop()
+                work.append((NORMALISE, node))
+                work.append((VISIT, node.right))
+
+        elif cls is Unary:
+            values[-1] = runtime.unary_op(node.op.lower())(values[-1])
+
+        elif cls is IndexAccess:
+            key = pop()
+            values[-1] = runtime.index_get(values[-1], key)
+
+        else:
+            # Calls and container literals: take their operands off the stack
+            count = len(operands(node))
+            args = values[len(values) - count:]
+            del values[len(values) - count:]
+            if cls is MethodCall:
+                push(runtime.call_method(args[0], node.method, args[1:]))
+            elif cls is Call:
+                push(node.function(*args) if node.function is not None else call(node, args))
+            elif cls is ListLiteral:
+                push(runtime.make_list(args))
+            else:
+                evaluated_dict = {}
+                for key, val in zip(args[::2], args[1::2]):
+                    if not isinstance(key, runtime.DICT_KEY):
+                        raise Exception(f"Invalid dictionary key type: {runtime.type_name(key)}")
+                    evaluated_dict[key] = val
+                push(evaluated_dict)
+
+    return values[0]
@@ -0,0 +1,155 @@
+"""User-defined functions and their memo caches.
+
+fn name(a, b) { ... return ...; } defines a function and stores it in the
+global name. Inside the body a and b, and every name the body assigns to
+(including for loop variables), are local: each call gets a fresh frame, a
+plain list with one entry per local in the order of Function.locals, so the
+engines read and write locals by index without copying any dictionaries.
+Every other name refers to the global of that name.
+
+memo fn name(...) keeps the results of past calls in an LRU cache keyed by
+the argument values, so a recursive function such as Fibonacci runs each
+distinct call once. memo(size) fn sets the number of results kept; 0 keeps
+every result. Calls with a list or dictionary argument are never cached,
+since its contents can change between calls.
+
+The engines each compile a function's body the first time they call it and
+keep the result in Function.compiled, keyed by the engine instance. The
+Functions one fn statement makes share that dict, so running the statement
+again, as every run of a compiled Program does, does not recompile the body.
+"""
+
+import sys
+from collections import OrderedDict
+
+from tokens import Variable
+from nodes import Assign, For, FunctionDef, Deep
+from data import UNSET
+
+MEMO_SIZE = 4096  # results kept by memo fn when no size is given
+
+MISSING = object()  # what Memo.lookup returns when nothing is cached
+
+# Python recursion limit the tree and closure engines run under, where every
+# KayLang call nests a few Python calls. From Python 3.11 those calls no
+# longer use the C stack, so the limit can be this high without a crash.
+RECURSION_LIMIT = 400000
+
+
+class Function:
+    __slots__ = ("name", "params", "body", "locals", "memo", "compiled")
+
+    def __init__(self, name, params, body, memo=None, compiled=None):
+        self.name = name
+        self.params = params  # parameter names, which are the first locals
+        self.body = body  # list of statements
+        self.locals = local_layout(params, body)  # local name -> frame index
+        self.memo = memo  # Memo, or None when calls are not cached
+        self.compiled = {} if compiled is None else compiled  # engine -> body compiled by that engine
+
+    def __repr__(self):
+        return f"<fn {self.name}>"
+
+    def __reduce__(self):
+        # Pickled without the compiled bodies, which belong to this process's engines
+        return Function, (self.name, self.params, self.body, self.memo)
+
+    __str__ = __repr__
+
+    def new_frame(self, args):
+        """Frame for a call with args, after checking their number"""
+        if len(args) != len(self.params):
+            count = len(self.params)
+            raise Exception(f"{self.name}() takes {count} argument{'s' if count != 1 else ''}, got {len(args)}")
+        return args + [UNSET] * (len(self.locals) - len(args))
+
+
+class Memo:
+    """LRU cache of one function's results, with hit and miss counts"""
+
+    def __init__(self, size):
+        self.size = size  # most results kept, 0 for no limit
+        self.results = OrderedDict()  # argument key -> result, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncacheable = 0  # calls with a list or dictionary argument
+
+    def lookup(self, args):
+        """(key, cached result) for a call, MISSING as the result when there is none"""
+        # The classes are part of the key so f(1), f(1.0) and f(true) stay apart
+        key = tuple(args) + tuple(arg.__class__ for arg in args)
+        try:
+            result = self.results[key]
+        except KeyError:
+            self.misses += 1
+            return key, MISSING
+        except TypeError:
+            self.uncacheable += 1
+            return None, MISSING
+        self.hits += 1
+        self.results.move_to_end(key)
+        return key, result
+
+    def store(self, key, result):
+        if key is None:
+            return
+        results = self.results
+        results[key] = result
+        if self.size and len(results) > self.size:
+            results.popitem(last=False)
+            self.evictions += 1
+
+    def report(self, name):
+        calls = self.hits + self.misses + self.uncacheable
+        rate = self.hits / calls * 100 if calls else 0.0
+        limit = self.size or "no limit"
+        line = (f"{name}: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), "
+                f"{len(self.results)} results kept (limit {limit}), {self.evictions} evicted")
+        if self.uncacheable:
+            line += f", {self.uncacheable} calls not cacheable"
+        return line
+
+
+def make_function(node):
+    """The Function a FunctionDef statement defines"""
+    memo = None
+    if node.memo:
+        memo = Memo(MEMO_SIZE if node.memo_size is None else node.memo_size)
+    return Function(node.name, node.params, node.body, memo, node.compiled)
+
+
+def local_layout(params, body):
+    """Map each local name to its frame index: the parameters, then names the body assigns"""
+    layout = {name: index for index, name in enumerate(params)}
+
+    def visit(node):
+        if isinstance(node, Assign) and isinstance(node.target, Variable):
+            layout.setdefault(node.target.val, len(layout))
+        elif isinstance(node, For):
+            layout.setdefault(node.variable.val, len(layout))
+        if isinstance(node, (list, tuple)):
+            for child in node:
+                visit(child)
+        # A Deep expression assigns nothing, and is too deep to recurse into
+        elif hasattr(node, "_fields") and not isinstance(node, (FunctionDef, Deep)):
+            for name in node._fields:
+                visit(getattr(node, name))
+
+    visit(body)
+    return layout
+
+
+def allow_deep_recursion():
+    """Raise Python's recursion limit, where that is safe, for recursive KayLang functions"""
+    if sys.version_info >= (3, 11) and sys.getrecursionlimit() < RECURSION_LIMIT:
+        sys.setrecursionlimit(RECURSION_LIMIT)
+
+
+def memo_report(data):
+    """One line of memo statistics for each memoised function in a Data store"""
+    return [
+        value.memo.report(name)
+        for name, value in data.read_all().items()
+        if isinstance(value, Function) and value.memo is not None
+    ]
@@ -0,0 +1,352 @@
+"""Run KayLang programs without the interactive shell.
+
+    python3 kaylang.py script.kay      run a script file
+    python3 kaylang.py -c "print 1"    run code given on the command line
+    python3 kaylang.py < script.kay    run code read from stdin (or pass -)
+
+Options, given before the script or -c:
+
+    --engine NAME    tree (default), closure or vm
+    --no-optimize    run statements exactly as parsed
+    --cache          keep parsed scripts in __kaycache__, as the shell's run does
+    --memo-size N    results each memo fn keeps when it gives no size (0: all)
+    --memo-stats     after the run, print each memo fn's hits and misses to stderr
+    --load FILE      start from the variables in a snapshot, see snapshot.py
+    --save FILE      after a successful run, snapshot every variable to FILE
+
+The exit status is 0 on success, 1 when the program raises an error and 2 for
+a usage error or a missing script.
+
+From Python, compile(source) parses a program once and returns a Program
+whose run(globals=..., output=...) runs it as often as needed, each time
+with fresh variables, and returns a Result with the value of the last
+statement, the variables and the printed lines:
+
+    rule = kaylang.compile("let total = price * quantity; total > 100")
+    rule.run({"price": 30, "quantity": 4}).value    # True
+
+Only the modules the chosen options need are imported, so a short script
+starts running as soon as possible; see benchmarks/cold_start.py.
+"""
+
+import sys
+
+from lexer import Lexer
+from myparser import Parser
+from nodes import Assign
+from resolver import Resolver
+import functions
+
+USAGE = ("usage: kaylang.py [--engine tree|closure|vm] [--no-optimize] [--cache] [--memo-size N] [--memo-stats]\n"
+         "                  [--load FILE] [--save FILE]\n"
+         "                  [script | -c code | -]")
+
+# Engine name -> (module, class), imported on first use
+ENGINES = {
+    "tree": ("interpreter", "Interpreter"),
+    "closure": ("compiler", "ClosureInterpreter"),
+    "vm": ("vm", "VMInterpreter"),
+}
+
+
+def execute_code(code, interpreter, optimizer=None):
+    tokenizer = Lexer(code)
+    tokens = tokenizer.tokenize()
+
+    parser = Parser(tokens)
+    statements = parser.parse()  # parse_statements returns list of statements
+    if optimizer is not None:
+        statements = optimizer.optimize(statements)
+    # Report undefined variables before any statement has run
+    Resolver(interpreter.data).resolve(statements)
+    execute_statements(statements, interpreter)
+
+def execute_file(f, interpreter, optimizer=None):
+    # Stream the file: each statement runs as soon as it has been parsed,
+    # while the rest of the file is still unread.
+    parser = Parser(Lexer(f).iter_tokens())
+    execute_statements(optimized(parser.iter_statements(), optimizer), interpreter)
+
+def run_file(filename, interpreter, program_cache=None, optimizer=None):
+    if program_cache is None:
+        with open(filename, "r") as f:
+            execute_file(f, interpreter, optimizer)
+        return
+
+    # The cache module is only loaded when a cache is in use
+    from cache import HashingReader, source_digest
+
+    statements = program_cache.load(filename, source_digest(filename))
+    if statements is not None:
+        if optimizer is not None:
+            statements = optimizer.optimize(statements)
+        Resolver(interpreter.data).resolve(statements)
+        execute_statements(statements, interpreter)
+        return
+
+    # Cache miss: run while parsing as usual, keeping the statements so a
+    # complete run can be stored under the hash of the text actually parsed.
+    # The cache holds statements as parsed, so it is shared whether or not
+    # the optimiser is on.
+    parsed = []
+    with open(filename, "r") as f:
+        reader = HashingReader(f)
+        parser = Parser(Lexer(reader).iter_tokens())
+        statements = collect(parser.iter_statements(), parsed)
+        execute_statements(optimized(statements, optimizer), interpreter)
+    program_cache.store(filename, reader.digest.digest(), parsed)
+
+def optimized(statements, optimizer):
+    if optimizer is None:
+        return statements
+    return (optimizer.optimize(stmt) for stmt in statements)
+
+def collect(statements, into):
+    for stmt in statements:
+        into.append(stmt)
+        yield stmt
+
+def execute_statements(statements, interpreter):
+    output = interpreter.output
+    try:
+        for stmt in statements:
+            interpreter.tree = stmt
+            result = interpreter.interpret()
+
+            # Skip printing for assignments (e.g. x = expr)
+            if isinstance(stmt, Assign):
+                continue
+
+            # Skip printing if result is None (e.g. print statements)
+            if result is None:
+                continue
+
+            output.write(result)
+    finally:
+        # At the end of the program or at an error: either way, show
+        # everything printed so far
+        output.flush()
+
+
+def load_engine(name):
+    module_name, class_name = ENGINES[name]
+    return getattr(__import__(module_name), class_name)
+
+
+def compile(source, engine="tree", optimize=True):
+    """Lex and parse source once; returns a Program to run any number of times"""
+    if engine not in ENGINES:
+        raise Exception(f"Unknown engine '{engine}'. Choose from: {', '.join(ENGINES)}")
+    statements = Parser(Lexer(source).tokenize()).parse()
+    if optimize:
+        from optimizer import Optimizer
+        statements = Optimizer().optimize(statements)
+    return Program(statements, engine)
+
+
+class Program:
+    """A parsed KayLang program, made by compile(), to run with run()
+
+    Runs never lex or parse, and once the program has run with a given set
+    of global names, or against the same Data store as the last run, the
+    closure and vm engines reuse the code they compiled for it, function
+    bodies included.
+    A Program runs one call at a time: give each thread its own.
+    """
+
+    def __init__(self, statements, engine="tree"):
+        from data import Data
+        from output import Output
+        self.statements = statements
+        self.engine = engine
+        # Runs given a dict of globals share this store, emptied each time,
+        # so code compiled against its slots stays valid
+        self.data = Data()
+        self.interpreter = load_engine(engine)(None, self.data, Output([]))
+        self.steps = None  # (statement, callable running it), made on the first run
+        self.resolved = set()  # frozensets of global names the program was checked with
+        # (Data store, engine, steps compiled against its slots) of the last
+        # run given a store: the engine refers to the store, so a weak map
+        # would never let go of it
+        self.store = None
+
+    def run(self, globals=None, output=None):
+        """Run the program and return a Result
+
+        globals is a dict of variables to start from (lists and dicts are
+        shared, not copied), or a data.Data store to run against and keep
+        what the program assigns in, as the shell does. Without globals the
+        program starts with no variables. What it prints goes to output, a
+        list or anything with a write(text) method, or by default is
+        collected in the Result. Errors are raised as exceptions once the
+        output printed so far has been written.
+        """
+        from data import Data, UNSET
+        if isinstance(globals, Data):
+            # Checked every time, as the store's variables change between
+            # runs; slots are never freed, so the compiled steps stay valid
+            Resolver(globals).resolve(self.statements)
+            if self.store is None or self.store[0] is not globals:
+                from output import Output
+                interpreter = load_engine(self.engine)(None, globals, Output([]))
+                steps = [(stmt, interpreter.prepare(stmt)) for stmt in self.statements]
+                self.store = (globals, interpreter, steps)
+            _, interpreter, steps = self.store
+            return run_steps(steps, interpreter, output)
+
+        data = self.data
+        data.values[:] = [UNSET] * len(data.values)
+        names = frozenset(globals) if globals else frozenset()
+        for name in names:
+            data.write(name, globals[name])
+        if names not in self.resolved:
+            # Which reads are certain to fail only depends on which names are set
+            Resolver(data).resolve(self.statements)
+            self.resolved.add(names)
+        if self.steps is None:
+            self.steps = [(stmt, self.interpreter.prepare(stmt)) for stmt in self.statements]
+        return run_steps(self.steps, self.interpreter, output)
+
+
+class Result:
+    """What one Program.run produced"""
+    __slots__ = ("value", "globals", "output")
+
+    def __init__(self, value, globals, output):
+        self.value = value  # of the last statement; None if it assigned or printed
+        self.globals = globals  # variable name -> value when the program finished
+        self.output = output  # printed lines, when run was not given an output
+
+    def __repr__(self):
+        return f"Result(value={self.value!r}, globals={self.globals!r}, output={self.output!r})"
+
+
+def run_steps(steps, interpreter, target):
+    output = interpreter.output
+    lines = [] if target is None else target
+    # The compiled engines keep the Output they were made with, so a run
+    # changes where it writes rather than replacing it
+    output.target = lines
+    value = None
+    try:
+        for stmt, step in steps:
+            value = step()
+            # Statement values are printed as the runner prints them
+            if isinstance(stmt, Assign):
+                value = None
+            elif value is not None:
+                output.write(value)
+    finally:
+        output.flush()
+    return Result(value, interpreter.data.read_all(), lines if target is None else None)
+
+
+def main(argv=None):
+    args = list(sys.argv[1:] if argv is None else argv)
+    engine = "tree"
+    optimize = True
+    use_cache = False
+    memo_stats = False
+    load_path = None
+    save_path = None
+    code = None
+    script = None
+
+    while args:
+        arg = args.pop(0)
+        if arg in ("-h", "--help"):
+            print(USAGE)
+            return 0
+        elif arg == "-c":
+            if not args:
+                print("kaylang: -c needs an argument", file=sys.stderr)
+                return 2
+            code = args.pop(0)
+            break
+        elif arg == "--engine" or arg.startswith("--engine="):
+            engine = arg[9:] if arg.startswith("--engine=") else (args.pop(0) if args else "")
+            if engine not in ENGINES:
+                print(f"kaylang: unknown engine '{engine}'. Choose from: {', '.join(ENGINES)}", file=sys.stderr)
+                return 2
+        elif arg == "--no-optimize":
+            optimize = False
+        elif arg == "--cache":
+            use_cache = True
+        elif arg == "--memo-size":
+            size = args.pop(0) if args else ""
+            if not size.isdigit():
+                print(f"kaylang: --memo-size needs a number of results, got '{size}'", file=sys.stderr)
+                return 2
+            functions.MEMO_SIZE = int(size)
+        elif arg == "--memo-stats":
+            memo_stats = True
+        elif arg in ("--load", "--save"):
+            if not args:
+                print(f"kaylang: {arg} needs a file name", file=sys.stderr)
+                return 2
+            if arg == "--load":
+                load_path = args.pop(0)
+            else:
+                save_path = args.pop(0)
+        elif arg == "-" or not arg.startswith("-"):
+            script = arg
+            break
+        else:
+            print(f"kaylang: unknown option '{arg}'\n{USAGE}", file=sys.stderr)
+            return 2
+
+    if script is not None and script != "-":
+        try:
+            open(script, "r").close()
+        except OSError as e:
+            print(f"kaylang: cannot open '{script}': {e.strerror}", file=sys.stderr)
+            return 2
+
+    from data import Data
+    functions.allow_deep_recursion()
+    interpreter = load_engine(engine)(None, Data())
+    optimizer = None
+    if optimize:
+        from optimizer import Optimizer
+        optimizer = Optimizer()
+    if load_path is not None:
+        import snapshot
+        try:
+            snapshot.load(load_path, interpreter.data)
+        except OSError as e:
+            print(f"kaylang: cannot open '{load_path}': {e.strerror}", file=sys.stderr)
+            return 2
+        except Exception as e:
+            print(f"kaylang: {e}", file=sys.stderr)
+            return 2
+
+    try:
+        if code is not None:
+            execute_code(code, interpreter, optimizer)
+        elif script is None or script == "-":
+            execute_file(sys.stdin, interpreter, optimizer)
+        else:
+            program_cache = None
+            if use_cache:
+                from cache import ProgramCache
+                program_cache = ProgramCache()
+            run_file(script, interpreter, program_cache, optimizer)
+        if save_path is not None:
+            import snapshot
+            snapshot.save(interpreter.data, save_path)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        sys.stdout.flush()  # keep the program's own output ahead of the error
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if memo_stats:
+            sys.stdout.flush()
+            for line in functions.memo_report(interpreter.data) or ["No memoised functions"]:
+                print(line, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
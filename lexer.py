@@ -1,4 +1,5 @@
 from tokens import Token, Integer, Operation, Float, Declaration, Variable, Boolean, BooleanValue, String, Keyword
+import re
 import string
 
 class Lexer:
@@ -11,149 +12,184 @@ class Lexer:
     declarations = ["let", "print"]
     boolean_ops = ["and", "or", "not"]
     boolean_vals = ["true", "false"]
-    keywords = ["if", "else", "while", "input", "delete"]  # Added "delete" here
-
-
-    def __init__(self, text):
-        self.text = text 
-        self.index = 0 
+    keywords = ["if", "else", "while", "for", "in", "fn", "return", "memo", "input", "delete"]  # Added "delete" here
+
+    # One alternative per token kind; the scanner tries them in order at the
+    # current position, so two-character operators come before single ones.
+    # Trailing blanks are swallowed by the same match as the token before
+    # them, so whitespace rarely costs a scanner step of its own.
+    pattern = re.compile(r"""
+        (?:
+            (?P<word>[A-Za-z_]+)
+          | (?P<op>==|!=|<=|>=|\.[-+*/]|[-+*/()=<>!;{}\[\],.:])
+          | (?P<number>[0-9][0-9.]*)
+          | (?P<newline>\n)
+          | (?P<string>"(?:[^"\\]|\\[\s\S])*")
+          | (?P<comment>\#[^\n]*\n?)
+          | (?P<space>)
+        )[ \t\r]*
+    """, re.VERBOSE)
+
+    escapes = {"n": "\n", "t": "\t", '"': '"'}
+    escape_pattern = re.compile(r"\\([\s\S])")
+
+    # Token class for every reserved word, so a name needs a single dict lookup
+    words = {}
+    for _word in declarations:
+        words[_word] = Declaration
+    for _word in boolean_ops:
+        words[_word] = Boolean
+    for _word in keywords:
+        words[_word] = Keyword
+    del _word
+
+    punctuation = {
+        "{": "brace", "}": "brace",
+        "[": "lbracket", "]": "rbracket",
+        ",": "comma", ":": "colon",
+    }
+
+    def __init__(self, text, chunk_size=65536):
+        self.text = text  # source string, or a file object to read in chunks
+        self.chunk_size = chunk_size
+        self.index = 0
         self.tokens = []
-        self.char = self.text[self.index]
-        self.token = None 
-        
-    def tokenize(self):
-        while self.index < len(self.text):
-            if self.char in Lexer.digits:
-                self.token = self.extract_number()
-
-            elif self.char in Lexer.operations:
-                # Handle multi-character operators
-                if self.char == "=" and self.peek() == "=":
-                    self.token = Operation("==")
-                    self.move()
-                    self.move()
-                elif self.char == "!" and self.peek() == "=":
-                    self.token = Operation("!=")
-                    self.move()
-                    self.move()
-                elif self.char == "<" and self.peek() == "=":
-                    self.token = Operation("<=")
-                    self.move()
-                    self.move()
-                elif self.char == ">" and self.peek() == "=":
-                    self.token = Operation(">=")
-                    self.move()
-                    self.move()
-                elif self.char in "{}":
-                    self.token = Token("brace", self.char)
-                    self.move()
-                elif self.char == "[":
-                    self.token = Token("lbracket", self.char)
-                    self.move()
-                elif self.char == "]":
-                    self.token = Token("rbracket", self.char)
-                    self.move()
-                elif self.char == ",":
-                    self.token = Token("comma", self.char)
-                    self.move()
-                elif self.char == ":":
-                    self.token = Token("colon", self.char)
-                    self.move()
-                else:
-                    self.token = Operation(self.char)
-                    self.move()
+        self.line = 1
+        self.line_start = 0  # index of the first character on the current line
 
-            elif self.char in Lexer.stopwords:
-                self.move()
-                continue
+    def tokenize(self):
+        self.tokens.extend(self.iter_tokens())
+        return self.tokens
 
-            elif self.char == '#':
-                # ✅ Skip comments
-                while self.char != '\n' and self.index < len(self.text):
-                    self.move()
-                self.move()  # also skip the newline
+    def iter_tokens(self):
+        """Yield tokens one at a time.
+
+        A file object is read chunk_size characters at a time, so only the
+        unscanned tail of the source is ever held in memory.
+        """
+        if isinstance(self.text, str):
+            yield from self.scan(self.text, True)
+            return
+
+        read = self.text.read
+        buffer = ""
+        while True:
+            chunk = read(self.chunk_size)
+            final = not chunk
+            # Keep the tail the last scan could not finish, e.g. half a word
+            consumed = self.index
+            buffer = buffer[consumed:] + chunk
+            self.line_start -= consumed
+            yield from self.scan(buffer, final)
+            if final:
+                return
+
+    def scan(self, text, final):
+        """Yield the tokens in text and leave self.index where scanning stopped.
+
+        Unless final is set, a token that runs into the end of text might
+        continue in the next chunk, so scanning stops in front of it.
+        """
+        words = Lexer.words
+        punctuation = Lexer.punctuation
+        match = Lexer.pattern.scanner(text).match
+        limit = len(text)
+        line = self.line
+        line_start = self.line_start
+        end = 0
+
+        while True:
+            m = match()
+            if m is None:
+                break
+            kind = m.lastgroup
+            start = m.start()
+            if not final and m.end() >= limit:
+                end = start
+                break
+            end = m.end()
+
+            if kind == "newline":
+                line += 1
+                line_start = start + 1
                 continue
 
-            elif self.char == '"':
-                self.token = self.extract_string()
+            column = start - line_start + 1
 
-            elif self.char in Lexer.letters:
-                word = self.extract_word()
+            if kind == "word":
+                word = m.group(kind)
+                cls = words.get(word)
+                if cls is not None:
+                    token = cls(word, line, column)
+                elif word == "true" or word == "false":
+                    token = BooleanValue(word == "true", line, column)
+                else:
+                    token = Variable(word, line, column)
 
-                if word in Lexer.declarations:
-                    self.token = Declaration(word)
-                elif word in Lexer.boolean_ops:
-                    self.token = Boolean(word)
-                elif word in Lexer.boolean_vals:
-                    self.token = BooleanValue(word)
-                elif word in Lexer.keywords:
-                    self.token = Keyword(word)
+            elif kind == "op":
+                op = m.group(kind)
+                token_type = punctuation.get(op)
+                if token_type is not None:
+                    token = Token(token_type, op, line, column)
                 else:
-                    self.token = Variable(word)
+                    token = Operation(op, line, column)
+
+            elif kind == "number":
+                token = self.decode_number(m.group(kind), line, column)
+
+            elif kind == "string":
+                token = String(self.decode_string(m.group(kind)[1:-1], line, column), line, column)
+                newlines = text.count("\n", start, end)
+                if newlines:
+                    line += newlines
+                    line_start = text.rfind("\n", start, end) + 1
+
+            elif kind == "comment":
+                # Skip comments, including the newline that ends them
+                comment_end = m.end(kind)
+                if text.endswith("\n", start, comment_end):
+                    line += 1
+                    line_start = comment_end
+                continue
 
             else:
-                raise Exception(f"Unknown character: {self.char}")
-
-            self.tokens.append(self.token)
-
-        return self.tokens
+                # Blanks at the very start of the text; an empty match here
+                # means nothing else applies, so stop and report it.
+                if start == end:
+                    break
+                continue
 
-    def extract_string(self):
-        string_val = ""
-        self.move()  # skip opening quote
-
-        while self.char != '"' and self.index < len(self.text):
-            if self.char == '\\':  # escape sequence start
-                self.move()
-                if self.char == 'n':
-                    string_val += '\n'
-                elif self.char == 't':
-                    string_val += '\t'
-                elif self.char == '"':
-                    string_val += '"'
-                else:
-                    raise Exception(f"Unknown escape sequence \\{self.char}")
-                self.move()
-            else:
-                string_val += self.char
-                self.move()
-
-        if self.char != '"':
-            raise Exception("Unterminated string literal")
-
-        self.move()  # skip closing quote
-
-        return String(string_val)
-
-    
-    def peek(self):
-        # Look at the next character without moving
-        peek_index = self.index + 1
-        if peek_index < len(self.text):
-            return self.text[peek_index]
-        return None
-
-    def extract_number(self):
-        isFloat = False
-        number = ""
-
-        while self.index < len(self.text) and (self.char in Lexer.digits or self.char == "."):
-            if self.char == ".":
-                isFloat = True
-            number += self.char
-            self.move()
-
-        return Integer(number) if not isFloat else Float(number)
-    
-    def extract_word(self):
-        word = ""
-        while self.char in Lexer.letters and self.index < len(self.text):
-            word += self.char 
-            self.move()
-
-        return word 
-
-    def move(self):
-        self.index += 1 
-        if self.index < len(self.text):
-            self.char = self.text[self.index]
\ No newline at end of file
+            yield token
+
+        # The scanner stops at the first character no alternative accepts
+        self.index = end
+        self.line = line
+        self.line_start = line_start
+        if final and end < limit:
+            self.unexpected(text, end)
+
+    def unexpected(self, text, index):
+        line, column = self.line, index - self.line_start + 1
+        if text[index] == '"':
+            raise Exception(f"Unterminated string literal at line {line}, column {column}")
+        raise Exception(f"Unknown character: {text[index]} at line {line}, column {column}")
+
+    def decode_number(self, number, line, column):
+        # Decode once here so the evaluator never re-parses the text
+        try:
+            if "." in number:
+                return Float(float(number), line, column)
+            return Integer(int(number), line, column)
+        except ValueError:
+            raise Exception(f"Invalid number literal '{number}' at line {line}, column {column}")
+
+    def decode_string(self, body, line, column):
+        if "\\" not in body:
+            return body
+
+        def escape(m):
+            try:
+                return Lexer.escapes[m.group(1)]
+            except KeyError:
+                raise Exception(f"Unknown escape sequence \\{m.group(1)} in string at line {line}, column {column}")
+        return Lexer.escape_pattern.sub(escape, body)
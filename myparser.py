@@ -1,126 +1,311 @@
+from tokens import Variable
+import natives
+from nodes import Literal, BinOp, Logical, Unary, If, While, For, Call, FunctionDef, Return, IndexAccess, MethodCall, ListLiteral, DictLiteral, Assign, Delete, Print
+from nodes import Deep, DEEP_LIMIT, depth
+
+LITERAL_TYPES = ("bool_val", "int", "flt", "str")
+
+# Operator -> (prefix, left, right) binding power: the one table that drives
+# Parser.expression, a Pratt parser. An operator waiting for its right
+# operand is applied once the next operator's left power is not above its
+# right power, so + and * group to the left and * binds tighter than +.
+# Indexes, method calls and calls only have a left power, which is below the
+# prefix power of -, ! and not, so -a[0] is (-a)[0]. None marks a role the
+# operator does not have.
+BINDING_POWERS = {
+    "and": (None, 1, 2), "or": (None, 1, 2),
+    "==": (None, 3, 4), "!=": (None, 3, 4), "<": (None, 3, 4), ">": (None, 3, 4),
+    "<=": (None, 3, 4), ">=": (None, 3, 4),
+    "+": (None, 5, 6), "-": (10, 5, 6), ".+": (None, 5, 6), ".-": (None, 5, 6),
+    "*": (None, 7, 8), "/": (None, 7, 8), ".*": (None, 7, 8), "./": (None, 7, 8),
+    "[": (None, 9, None), ".": (None, 9, None), "(": (None, 9, None),
+    "!": (10, None, None), "not": (10, None, None),
+}
+
+# Token types that can hold an operator; a string "+" is a literal
+OPERATOR_TYPES = ("op", "bool_op", "lbracket")
+
+# What Parser.expression expects next
+OPERAND = 0  # prefix operators and an operand
+OPERATOR = 1  # an infix or postfix operator, or the end of the group
+
+
+class Group:
+    """An expression being parsed: the whole one, or a part of it between
+    brackets, such as a list element or a call argument"""
+    __slots__ = ("kind", "line", "target", "operators", "items")
+
+    def __init__(self, kind, line=None, target=None):
+        # "top", "paren", "index", "call", "method", "list", or "key" and
+        # "value" for the two halves of a dictionary entry
+        self.kind = kind
+        self.line = line
+        self.target = target  # indexed node, called name, (object, method) or entry key
+        # (right binding power, operator token, left operand) not yet
+        # applied, with no left operand for a prefix operator
+        self.operators = []
+        self.items = []  # finished elements, arguments or (key, value) pairs
+
+
+def bind(operators, node, power):
+    """Apply the waiting operators that bind tighter than power to node"""
+    while operators and operators[-1][0] > power:
+        _, token, left = operators.pop()
+        if left is None:
+            node = Unary(token.val, node, token.line)
+        elif token.type == "bool_op":
+            node = Logical(left, token.val, node, token.line)
+        else:
+            node = BinOp(left, token.val, node, token.line)
+    return node
+
+
+def make_call(name, args):
+    function = None
+    if name.val in natives.NATIVES:
+        # Resolved here, once, rather than each time the call runs
+        function = natives.lookup(name.val, len(args))
+    return Call(name.val, args, function, name.line)
+
+
 class Parser:
 
     def __init__(self, tokens):
-        self.tokens = tokens 
-        self.index = 0 
-        self.token = self.tokens[self.index] if tokens else None
+        # Any iterable works, including Lexer.iter_tokens(); tokens are
+        # pulled one at a time and never looked at again once consumed.
+        self.tokens = iter(tokens)
+        self.token = next(self.tokens, None)
+        self.in_function = False  # inside a fn body, where return is allowed
     
     def move(self):
-        self.index += 1 
-        if self.index < len(self.tokens):
-            self.token = self.tokens[self.index]
-        else:
-            self.token = None  # No more tokens
+        self.token = next(self.tokens, None)  # None once there are no more tokens
+
+    def expression(self, postfix_only=False):
+        """Parse one expression
+
+        Operators are applied by binding power, see BINDING_POWERS, and
+        nesting is tracked with an explicit stack of Groups rather than by
+        recursion, so brackets, operator chains and prefix operators can go
+        as deep as the input does. With postfix_only, stop after the first
+        operand and the indexes and calls that follow it, as for delete.
+        """
+        group = Group("top")
+        groups = []  # groups enclosing the current one, innermost last
+        size = 0  # operands and prefix operators read, a bound on the depth
+        state = OPERAND
+        node = None
+        tokens = self.tokens  # the hot paths below step through it inline
 
-    def factor(self):
-        # Unary minus
-        if self.token and self.token.val == "-":
-            op = self.token
-            self.move()
-            node = self.factor()  # Allow unary minus on expressions like: - (3 + 2)
-            return [op, node]  # Unary minus node
+        while True:
+            token = self.token
+
+            if state == OPERAND:
+                # Prefix operators, then a literal, a name or an opening bracket
+                if token is None:
+                    raise Exception("Unexpected token in factor: None")
+                kind = token.type
+                size += 1
+
+                if kind in LITERAL_TYPES:
+                    node = Literal(token.val, token.line)
+                    self.token = next(tokens, None)
+                    state = OPERATOR
+                elif kind.startswith("var"):
+                    node = token
+                    self.token = next(tokens, None)
+                    state = OPERATOR
+                elif kind == "op" and token.val == "(":
+                    self.move()
+                    groups.append(group)
+                    group = Group("paren")
+                elif kind == "lbracket":
+                    self.move()
+                    if self.token is None:
+                        raise Exception("Expected ']' at end of list literal")
+                    if self.token.type == "rbracket":
+                        self.move()
+                        node = ListLiteral([], token.line)
+                        state = OPERATOR
+                    else:
+                        groups.append(group)
+                        group = Group("list", token.line)
+                elif kind == "brace" and token.val == "{":
+                    self.move()
+                    if self.token is None:
+                        raise Exception("Expected '}' at end of dictionary literal")
+                    if self.token.type == "brace" and self.token.val == "}":
+                        self.move()
+                        node = DictLiteral([], token.line)
+                        state = OPERATOR
+                    else:
+                        groups.append(group)
+                        group = Group("key", token.line)
+                        self.dictionary_key(group)
+                else:
+                    powers = BINDING_POWERS.get(token.val) if kind in OPERATOR_TYPES else None
+                    if powers is None or powers[0] is None:
+                        raise Exception(f"Unexpected token in factor: {token}")
+                    group.operators.append((powers[0], token, None))
+                    self.move()
+                continue
+
+            # After an operand: an infix or postfix operator, or the end of this group
+            left_power = right_power = None
+            if token is not None and token.type in OPERATOR_TYPES:
+                powers = BINDING_POWERS.get(token.val)
+                if powers is not None:
+                    _, left_power, right_power = powers
+
+            if left_power is not None:
+                if group.operators:
+                    node = bind(group.operators, node, left_power)
+
+                if right_power is not None:
+                    if groups or not postfix_only:
+                        group.operators.append((right_power, token, node))
+                        self.token = next(tokens, None)
+                        state = OPERAND
+                        continue
+
+                elif token.type == "lbracket":
+                    self.move()
+                    groups.append(group)
+                    group = Group("index", token.line, node)
+                    state = OPERAND
+                    continue
 
-        # Unary not: support both 'not' and '!' forms
-        if self.token and self.token.val in ["not", "!"]:
-            op = self.token
-            self.move()
-            node = self.factor()  # Allow expressions like: ! (5 > 3)
-            return [op, node]  # Unary not node
+                elif token.val == ".":
+                    self.move()
+                    if not (self.token and self.token.type.startswith("var")):
+                        raise Exception("Expected method name after '.'")
+                    method_name = self.token.val
+                    self.move()
+                    if not (self.token and self.token.type == "op" and self.token.val == "("):
+                        raise Exception("Expected '(' after method name")
+                    self.move()
+                    if self.is_closing_parenthesis("method call"):
+                        node = MethodCall(node, method_name, [], token.line)
+                    else:
+                        groups.append(group)
+                        group = Group("method", token.line, (node, method_name))
+                        state = OPERAND
+                    continue
+
+                elif isinstance(node, Variable):
+                    # Only a name can be called; after anything else a '('
+                    # ends the expression
+                    self.move()
+                    if self.is_closing_parenthesis(f"{node.val}()"):
+                        node = make_call(node, [])
+                    else:
+                        groups.append(group)
+                        group = Group("call", node.line, node)
+                        state = OPERAND
+                    continue
+
+            if group.operators:
+                node = bind(group.operators, node, 0)
+            kind = group.kind
+
+            if kind == "top":
+                break
 
-        # Parentheses
-        if self.token and self.token.val == "(":
-            self.move()
-            expr = self.boolean_expression()  # Parse a full expression inside parentheses
-            if self.token and self.token.val == ")":
+            elif kind == "paren":
+                if not (token and token.type == "op" and token.val == ")"):
+                    raise Exception("Expected closing parenthesis")
                 self.move()
-                return expr
-            else:
-                raise Exception("Expected closing parenthesis")
-
-        # Boolean value
-        if self.token and self.token.type == "bool_val":
-            node = self.token
-            self.move()
-            return node
+                group = groups.pop()
 
-        # Number
-        if self.token and (self.token.type == "int" or self.token.type == "flt"):
-            node = self.token
-            self.move()
-            return node
-
-        # String literal
-        if self.token and self.token.type == "str":
-            node = self.token
-            self.move()
-            return node
+            elif kind == "index":
+                if not (token and token.type == "rbracket"):
+                    raise Exception("Expected ']' after index expression")
+                self.move()
+                node = IndexAccess(group.target, node, group.line)
+                group = groups.pop()
 
-        # Variable reference
-        if self.token and self.token.type.startswith("var"):
-            node = self.token
-            self.move()
-            return node
-        
-        # List literal
-        if self.token and self.token.type == "lbracket":
-             return self.parse_list_literal()
-        
-        # Dictionary literal
-        if self.token and self.token.type == "brace" and self.token.val == "{":
-            return self.parse_dict_literal()
+            elif kind == "call" or kind == "method":
+                group.items.append(node)
+                if token and token.type == "comma":
+                    self.move()
+                    state = OPERAND
+                    continue
+                if not (token and token.type == "op" and token.val == ")"):
+                    context = f"{group.target.val}()" if kind == "call" else "method call"
+                    raise Exception(f"Expected ')' after {context} arguments")
+                self.move()
+                if kind == "call":
+                    node = make_call(group.target, group.items)
+                else:
+                    obj, method_name = group.target
+                    node = MethodCall(obj, method_name, group.items, group.line)
+                group = groups.pop()
+
+            elif kind == "list":
+                group.items.append(node)
+                if token and token.type == "comma":
+                    self.move()
+                    if self.token is None:
+                        raise Exception("Expected ']' at end of list literal")
+                    if self.token.type != "rbracket":
+                        state = OPERAND
+                        continue
+                elif not (token and token.type == "rbracket"):
+                    raise Exception("Expected ',' or ']' in list literal")
+                self.move()
+                node = ListLiteral(group.items, group.line)
+                group = groups.pop()
 
-        # Unexpected token
-        raise Exception(f"Unexpected token in factor: {self.token}")
+            elif kind == "key":
+                if not (token and token.type == "colon"):
+                    raise Exception("Expected ':' between key and value in dict")
+                self.move()
+                group.kind = "value"
+                group.target = node
+                state = OPERAND
 
+            else:  # a dictionary value
+                group.items.append((group.target, node))
+                if token and token.type == "comma":
+                    self.move()
+                    if self.token is None:
+                        raise Exception("Expected '}' at end of dictionary literal")
+                    if not (self.token.type == "brace" and self.token.val == "}"):
+                        self.dictionary_key(group)
+                        state = OPERAND
+                        continue
+                elif not (token and token.type == "brace" and token.val == "}"):
+                    raise Exception("Expected ',' or '}' in dict literal")
+                self.move()
+                node = DictLiteral(group.items, group.line)
+                group = groups.pop()
 
-    def term(self):
+        if size > DEEP_LIMIT and depth(node) > DEEP_LIMIT:
+            node = Deep(node, getattr(node, "line", None))
+        return node
 
-        left_node = self.postfix_expression()
-        while self.token and (self.token.val == "*" or self.token.val == "/"):
-            operation = self.token
+    def is_closing_parenthesis(self, context):
+        # After the '(' of a call: whether its argument list is empty, in
+        # which case the ')' is consumed
+        if self.token is None:
+            raise Exception(f"Expected ')' after {context} arguments")
+        if self.token.type == "op" and self.token.val == ")":
             self.move()
-            right_node = self.postfix_expression()
-            left_node = [left_node, operation, right_node]
-        return left_node
-
+            return True
+        return False
 
-    def arithmetic_expression(self):
-        left_node = self.term()
-        while self.token and (self.token.val == "+" or self.token.val == "-"):
-            operation = self.token
+    def dictionary_key(self, group):
+        # A bare name as a dictionary key is the string, not the variable
+        token = self.token
+        if token.type.startswith("var"):
             self.move()
-            right_node = self.term()
-            left_node = [left_node, operation, right_node]
-        return left_node
-
-    def comparison_expression(self):
-        left_node = self.arithmetic_expression()
-        
-        # Handle comparison operators: ==, !=, <, >, <=, >=
-        while self.token and self.token.type == "op" and self.token.val in ["==", "!=", "<", ">", "<=", ">="]:
-            operation = self.token
+            if not (self.token and self.token.type == "colon"):
+                raise Exception("Expected ':' between key and value in dict")
             self.move()
-            right_node = self.boolean_expression() 
-            left_node = [left_node, operation, right_node]
-            
-        return left_node
+            group.kind = "value"
+            group.target = Literal(token.val, token.line)
+        else:
+            group.kind = "key"
 
-    def boolean_expression(self):
-        left_node = self.comparison_expression()
-        
-        # Handle boolean operators: and, or
-        while self.token and self.token.type == "bool_op" and self.token.val in ["and", "or"]:
-            operation = self.token
-            self.move()
-            right_node = self.comparison_expression()
-            left_node = [left_node, operation, right_node]
-            
-        return left_node
-    
-    def expression(self):
-        # The highest level expression is now boolean_expression
-        return self.boolean_expression()
-    
     def variable(self):
         if self.token and self.token.type.startswith("var"):
             var = self.token
@@ -130,14 +315,15 @@ class Parser:
     
     def print_statement(self):
         
+        line = self.token.line
         self.move()  # consume 'print'
         expr = self.expression()
-        return ["print", expr]
+        return Print(expr, line)
 
 
     def is_valid_assignment_target(self, node):
         # Valid targets: simple variable or index access
-        if isinstance(node, list) and len(node) == 3 and node[0] == "index_access":
+        if isinstance(node, IndexAccess):
             return True
         if hasattr(node, "type") and node.type.startswith("var"):
             return True
@@ -145,13 +331,14 @@ class Parser:
 
 
     def statement(self):
+        line = self.token.line
         # Delete statement
         if self.token and self.token.type == "kw" and self.token.val == "delete":
             self.move()  # consume 'delete'
-            target = self.postfix_expression()
+            target = self.expression(postfix_only=True)
             if not self.is_valid_assignment_target(target):
                 raise Exception("Can only delete a variable or dictionary/list index")
-            return ["delete", target]
+            return Delete(target, line)
 
         # If statement
         if self.token and self.token.type == "kw" and self.token.val == "if":
@@ -161,6 +348,26 @@ class Parser:
         if self.token and self.token.type == "kw" and self.token.val == "while":
             return self.parse_while_statement()
 
+        # For statement
+        if self.token and self.token.type == "kw" and self.token.val == "for":
+            return self.parse_for_statement()
+
+        # Function definition, optionally memoised
+        if self.token and self.token.type == "kw" and self.token.val in ("fn", "memo"):
+            return self.parse_function_definition()
+
+        # Return statement
+        if self.token and self.token.type == "kw" and self.token.val == "return":
+            if not self.in_function:
+                raise Exception("'return' outside a function")
+            self.move()  # consume 'return'
+            value = None
+            token = self.token
+            if token and not ((token.type == "op" and token.val == ";") or
+                              (token.type == "brace" and token.val == "}")):
+                value = self.expression()
+            return Return(value, line)
+
         # Let declaration
         if self.token and self.token.type == "decl" and self.token.val == "let":
             self.move()
@@ -170,14 +377,13 @@ class Parser:
                 raise Exception("Left operand of '=' must be a variable or dictionary index")
 
             if self.token and self.token.val == "=":
-                operation = self.token
                 self.move()
 
                 if self.token and self.token.val == "=":
                     raise Exception("Chained assignments like 'a = b = 5' are not supported.")
 
                 right_node = self.expression()
-                return [left_node, operation, right_node]
+                return Assign(left_node, right_node, line)
             else:
                 raise Exception("Expected '=' after variable in declaration")
 
@@ -193,34 +399,31 @@ class Parser:
             if not self.is_valid_assignment_target(left_node):
                 raise Exception("Left operand of '=' must be a variable or indexable expression")
                 
-            operation = self.token
             self.move()
 
             if self.token and self.token.val == "=":
                 raise Exception("Chained assignments like 'a = b = 5' are not supported.")
 
             right_node = self.expression()
-            return [left_node, operation, right_node]
+            return Assign(left_node, right_node, line)
         else:
             # It's just an expression
             return left_node
 
             
-    def parse_statements(self):
-        statements = []
+    def iter_statements(self):
+        """Yield top-level statements one at a time as they are parsed"""
         while self.token is not None:
             stmt = self.statement()
-            statements.append(stmt)
-            
+
             # Handle optional semicolon
             if self.token and self.token.val == ";":
                 self.move()  # consume semicolon
-                
-            # Check if we're at the end or need to continue
-            if self.token is None:
-                break
-                
-        return statements
+
+            yield stmt
+
+    def parse_statements(self):
+        return list(self.iter_statements())
 
     def parse(self):
         result = self.parse_statements()
@@ -247,6 +450,7 @@ class Parser:
             raise Exception("Expected '{' to start block")
 
     def parse_if_statement(self):
+        line = self.token.line
         self.move()  # consume 'if'
 
         if self.token.val != "(":
@@ -266,9 +470,10 @@ class Parser:
             self.move()
             else_block = self.parse_block()
 
-        return ["if", condition, then_block, else_block]
+        return If(condition, then_block, else_block, line)
     
     def parse_while_statement(self):
+        line = self.token.line
         self.move()  # consume 'while'
 
         if self.token.val != "(":
@@ -282,116 +487,87 @@ class Parser:
         self.move()
 
         body = self.parse_block()
-        return ["while", condition, body]
-    
-    def parse_list_literal(self):
-        # Current token is '['
-        if self.token.type != "lbracket":
-            raise Exception("Expected '[' to start list literal")
-        self.move()  # consume '['
-
-        elements = []
-        while self.token and self.token.type != "rbracket":
-            element = self.expression()
-            elements.append(element)
-
-            if self.token and self.token.type == "comma":
-                self.move()  # consume comma and continue parsing elements
-            elif self.token and self.token.type == "rbracket":
-                break
-            else:
-                raise Exception("Expected ',' or ']' in list literal")
+        return While(condition, body, line)
 
-        if self.token and self.token.type == "rbracket":
-            self.move()  # consume ']'
-            return ["list_literal", elements]
-        else:
-            raise Exception("Expected ']' at end of list literal")
-
-    
-    def postfix_expression(self):
-        # Start by parsing a factor (number, var, list literal, etc)
-        node = self.factor()
+    def parse_for_statement(self):
+        line = self.token.line
+        self.move()  # consume 'for'
 
-        while True:
-            # Check for list indexing: [ expr ]
-            if self.token and self.token.type == "lbracket":
-                self.move()  # consume '['
-                index_expr = self.expression()
-                if not (self.token and self.token.type == "rbracket"):
-                    raise Exception("Expected ']' after index expression")
-                self.move()  # consume ']'
-                # Wrap node as index access
-                node = ["index_access", node, index_expr]
-
-            # Check for method call: .methodName(args)
-            elif self.token and self.token.val == ".":
-                self.move()  # consume '.'
-                if not (self.token and self.token.type.startswith("var")):
-                    raise Exception("Expected method name after '.'")
-                method_name = self.token
-                self.move()
+        # Both for x in xs { } and for (x in xs) { } are accepted
+        parenthesised = self.token and self.token.val == "("
+        if parenthesised:
+            self.move()
 
-                if not (self.token and self.token.val == "("):
-                    raise Exception("Expected '(' after method name")
-                self.move()  # consume '('
-
-                args = []
-                if self.token and self.token.val != ")":
-                    while True:
-                        arg = self.expression()
-                        args.append(arg)
-                        if self.token and self.token.val == ",":
-                            self.move()  # consume ','
-                            continue
-                        else:
-                            break
+        if not (self.token and self.token.type.startswith("var")):
+            raise Exception("Expected loop variable after 'for'")
+        variable = self.variable()
 
-                if not (self.token and self.token.val == ")"):
-                    raise Exception("Expected ')' after method call arguments")
-                self.move()  # consume ')'
+        if not (self.token and self.token.type == "kw" and self.token.val == "in"):
+            raise Exception("Expected 'in' after for loop variable")
+        self.move()
 
-                # Wrap node as method call
-                node = ["method_call", node, method_name, args]
+        iterable = self.expression()
 
-            else:
-                # No more postfix operators
-                break
+        if parenthesised:
+            if not (self.token and self.token.val == ")"):
+                raise Exception("Expected ')' after for loop header")
+            self.move()
 
-        return node
+        body = self.parse_block()
+        return For(variable, iterable, body, line)
     
-    def parse_dict_literal(self):
-        if self.token.type != "brace" or self.token.val != "{":
-            raise Exception("Expected '{' to start dictionary literal")
-        
-        self.move()  # consume '{'
-        pairs = []
-
-        while self.token and not (self.token.type == "brace" and self.token.val == "}"):
-            # Treat unquoted variable keys as string literals
-            if self.token.type.startswith("var"):
-                key_token = self.token
-                key = ["str", key_token.val]  # Convert to string literal
+    def parse_function_definition(self):
+        line = self.token.line
+        memo = False
+        memo_size = None
+        if self.token.val == "memo":
+            memo = True
+            self.move()  # consume 'memo'
+            # memo(size) fn ... sets how many results are kept
+            if self.token and self.token.val == "(":
                 self.move()
-            else:
-                key = self.expression()  # Fallback to full expression
-
-            if not (self.token and self.token.type == "colon"):
-                raise Exception("Expected ':' between key and value in dict")
-            self.move()  # consume ':'
-
-            value = self.expression()
-            pairs.append([key, value])
+                if not (self.token and self.token.type == "int"):
+                    raise Exception("Expected the memo cache size, a whole number, after 'memo('")
+                memo_size = self.token.val
+                self.move()
+                if not (self.token and self.token.val == ")"):
+                    raise Exception("Expected ')' after memo cache size")
+                self.move()
+            if not (self.token and self.token.type == "kw" and self.token.val == "fn"):
+                raise Exception("Expected 'fn' after 'memo'")
+
+        self.move()  # consume 'fn'
+        if self.in_function:
+            raise Exception("Functions can only be defined outside other functions")
+        if not (self.token and self.token.type.startswith("var")):
+            raise Exception("Expected function name after 'fn'")
+        name = self.token.val
+        if name in natives.NATIVES:
+            raise Exception(f"Cannot redefine built-in function {name}")
+        self.move()
 
+        if not (self.token and self.token.val == "("):
+            raise Exception(f"Expected '(' after function name {name}")
+        self.move()
+        params = []
+        while self.token and self.token.val != ")":
+            if not self.token.type.startswith("var"):
+                raise Exception(f"Expected parameter name in definition of {name}, got {self.token}")
+            if self.token.val in params:
+                raise Exception(f"Duplicate parameter {self.token.val} in definition of {name}")
+            params.append(self.token.val)
+            self.move()
             if self.token and self.token.type == "comma":
-                self.move()  # consume ',' and continue
-            elif self.token and self.token.type == "brace" and self.token.val == "}":
-                break
-            else:
-                raise Exception("Expected ',' or '}' in dict literal")
-
-        if self.token and self.token.type == "brace" and self.token.val == "}":
-            self.move()  # consume '}'
-            return ["dict_literal", pairs]
-        else:
-            raise Exception("Expected '}' at end of dictionary literal")
\ No newline at end of file
+                self.move()
+            elif not (self.token and self.token.val == ")"):
+                raise Exception(f"Expected ',' or ')' in parameters of {name}")
+        if not self.token:
+            raise Exception(f"Expected ')' after parameters of {name}")
+        self.move()  # consume ')'
+
+        self.in_function = True
+        try:
+            body = self.parse_block()
+        finally:
+            self.in_function = False
+        return FunctionDef(name, tuple(params), body, memo, memo_size, line)
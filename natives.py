@@ -0,0 +1,209 @@
+"""Built-in functions callable as name(args).
+
+Each one is a plain Python function over native values, registered in
+NATIVES with the number of arguments it accepts. The parser looks the name up
+once, checks the argument count and stores the function in the Call node, so
+running a call never searches for it by name. Functions whose names clash
+with Python builtins end in an underscore, as in runtime.py.
+"""
+
+from array import array
+
+from numeric import NumericList, make_list, as_list
+import runtime
+
+NUMBER = runtime.NUMBER
+LIST_TYPES = runtime.LIST_TYPES
+type_name = runtime.type_name
+
+
+def len_(value):
+    if isinstance(value, (str, dict, range) + LIST_TYPES):
+        return len(value)
+    raise Exception(f"len() of {type_name(value)}")
+
+
+def sort(list_val):
+    """Sort a list in place and return it"""
+    if not isinstance(list_val, LIST_TYPES):
+        raise Exception(f"sort() needs a list, got {type_name(list_val)}")
+    try:
+        if list_val.__class__ is NumericList:
+            items = list_val.items
+            if list_val.kind is not None:
+                # Rewritten in place so every reference sees the sorted order
+                items[:] = array(items.typecode, sorted(items))
+            else:
+                items.sort()
+        else:
+            list_val.sort()
+    except TypeError:
+        raise Exception("sort() needs elements that can be compared, such as all numbers or all strings")
+    return list_val
+
+
+def sorted_(value):
+    """A new sorted list of the items a for loop would visit"""
+    try:
+        return make_list(sorted(runtime.iterate(value)))
+    except TypeError:
+        raise Exception("sorted() needs elements that can be compared, such as all numbers or all strings")
+
+
+def keys(dict_val):
+    if not isinstance(dict_val, dict):
+        raise Exception(f"keys() needs a dictionary, got {type_name(dict_val)}")
+    return make_list(list(dict_val))
+
+
+def values(dict_val):
+    if not isinstance(dict_val, dict):
+        raise Exception(f"values() needs a dictionary, got {type_name(dict_val)}")
+    return make_list(list(dict_val.values()))
+
+
+def contains(collection, item):
+    """Whether a list holds item, a dictionary has it as a key or a string has it as a substring"""
+    if isinstance(collection, LIST_TYPES):
+        return item in collection.items if collection.__class__ is NumericList else item in collection
+    if isinstance(collection, dict):
+        return isinstance(item, runtime.DICT_KEY) and item in collection
+    if isinstance(collection, str):
+        if not isinstance(item, str):
+            raise Exception(f"contains() on a string needs a string, got {type_name(item)}")
+        return item in collection
+    if isinstance(collection, range):
+        return item in collection
+    raise Exception(f"contains() needs a list, dictionary or string, got {type_name(collection)}")
+
+
+def str_(value):
+    """The text print would show for value"""
+    return str(value)
+
+
+def int_(value):
+    if isinstance(value, NUMBER):
+        try:
+            return int(value)
+        except (ValueError, OverflowError):
+            raise Exception(f"Cannot convert {value} to int")
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            pass
+        try:
+            return int(float(value))
+        except (ValueError, OverflowError):
+            raise Exception(f"Cannot convert {value!r} to int")
+    raise Exception(f"Cannot convert {type_name(value)} to int")
+
+
+def float_(value):
+    if isinstance(value, (NUMBER, str)):
+        try:
+            return float(value)
+        except (ValueError, OverflowError):
+            raise Exception(f"Cannot convert {value!r} to float")
+    raise Exception(f"Cannot convert {type_name(value)} to float")
+
+
+def split(text, separator=None):
+    """Split text on separator, or on runs of whitespace when there is none"""
+    if not isinstance(text, str):
+        raise Exception(f"split() needs a string, got {type_name(text)}")
+    if separator is not None and not isinstance(separator, str):
+        raise Exception(f"split() separator must be a string, got {type_name(separator)}")
+    if separator == "":
+        raise Exception("split() separator cannot be empty")
+    return make_list(text.split(separator))
+
+
+def join(list_val, separator=""):
+    if not isinstance(list_val, LIST_TYPES):
+        raise Exception(f"join() needs a list, got {type_name(list_val)}")
+    if not isinstance(separator, str):
+        raise Exception(f"join() separator must be a string, got {type_name(separator)}")
+    items = as_list(list_val)
+    for item in items:
+        if not isinstance(item, str):
+            raise Exception(f"join() needs a list of strings, found {type_name(item)}")
+    return separator.join(items)
+
+
+def abs_(value):
+    if isinstance(value, NUMBER):
+        return runtime.normalise(abs(value))
+    raise Exception(f"abs() of {type_name(value)}")
+
+
+def extreme(name, pick, args):
+    # min(list) and max(list) look inside the list, as in Python
+    if len(args) == 1:
+        if not isinstance(args[0], LIST_TYPES):
+            raise Exception(f"{name}() of a single {type_name(args[0])}; pass a list or several values")
+        items = args[0].items if args[0].__class__ is NumericList else args[0]
+        if not items:
+            raise Exception(f"{name}() of an empty list")
+    else:
+        items = args
+    try:
+        return pick(items)
+    except TypeError:
+        raise Exception(f"{name}() needs values that can be compared, such as all numbers or all strings")
+
+
+def min_(*args):
+    return extreme("min", min, args)
+
+
+def max_(*args):
+    return extreme("max", max, args)
+
+
+def range_(*args):
+    """range(stop), range(start, stop) or range(start, stop, step); the numbers are never stored"""
+    for arg in args:
+        if arg.__class__ is not int:
+            raise Exception(f"range() arguments must be integers, got {type_name(arg)}")
+    if len(args) == 3 and args[2] == 0:
+        raise Exception("range() step cannot be zero")
+    return range(*args)
+
+
+# name -> (function, fewest arguments, most arguments or None for no limit)
+NATIVES = {
+    "len": (len_, 1, 1),
+    "sort": (sort, 1, 1),
+    "sorted": (sorted_, 1, 1),
+    "keys": (keys, 1, 1),
+    "values": (values, 1, 1),
+    "contains": (contains, 2, 2),
+    "str": (str_, 1, 1),
+    "int": (int_, 1, 1),
+    "float": (float_, 1, 1),
+    "split": (split, 1, 2),
+    "join": (join, 1, 2),
+    "abs": (abs_, 1, 1),
+    "min": (min_, 1, None),
+    "max": (max_, 1, None),
+    "range": (range_, 1, 3),
+}
+
+
+def lookup(name, argc):
+    """The function for a call to name with argc arguments"""
+    entry = NATIVES.get(name)
+    if entry is None:
+        raise Exception(f"Unknown function: {name}")
+    function, fewest, most = entry
+    if argc < fewest or (most is not None and argc > most):
+        if fewest == most:
+            expected = f"{fewest} argument" + ("s" if fewest != 1 else "")
+        elif most is None:
+            expected = f"at least {fewest} argument" + ("s" if fewest != 1 else "")
+        else:
+            expected = f"{fewest} to {most} arguments"
+        raise Exception(f"{name}() takes {expected}, got {argc}")
+    return function
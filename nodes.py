@@ -0,0 +1,280 @@
+"""AST node classes produced by myparser.Parser.
+
+Variable names are left in the tree as lexer tokens; everything else is one
+of the classes below. Each class lists its child attributes in _fields so
+passes can walk the tree without knowing every node type, and records the
+source line it came from for the profiler and the optimiser's report.
+"""
+
+
+class Node:
+    __slots__ = ("line",)  # source line the node starts on, None if unknown
+    _fields = ()
+
+    def __repr__(self):
+        args = ", ".join(repr(getattr(self, name)) for name in self._fields)
+        return f"{type(self).__name__}({args})"
+
+    def __reduce__(self):
+        # Pickle as constructor arguments, which is far smaller and faster
+        # to load than the default per-slot state
+        return (type(self), tuple(getattr(self, name) for name in self._fields) + (self.line,))
+
+
+class Literal(Node):
+    __slots__ = ("value",)
+    _fields = ("value",)
+
+    def __init__(self, value, line=None):
+        self.line = line
+        self.value = value  # native int, float, bool or str
+
+
+class BinOp(Node):
+    __slots__ = ("left", "op", "right")
+    _fields = ("left", "op", "right")
+
+    def __init__(self, left, op, right, line=None):
+        self.line = line
+        self.left = left
+        self.op = op  # operator text, e.g. "+" or "and"
+        self.right = right
+
+
+class Logical(Node):
+    __slots__ = ("left", "op", "right")
+    _fields = ("left", "op", "right")
+
+    def __init__(self, left, op, right, line=None):
+        self.line = line
+        self.left = left
+        self.op = op  # "and" or "or"; right is only evaluated when it decides the result
+        self.right = right
+
+
+class Unary(Node):
+    __slots__ = ("op", "operand")
+    _fields = ("op", "operand")
+
+    def __init__(self, op, operand, line=None):
+        self.line = line
+        self.op = op  # "-", "!" or "not"
+        self.operand = operand
+
+
+class If(Node):
+    __slots__ = ("condition", "then_block", "else_block")
+    _fields = ("condition", "then_block", "else_block")
+
+    def __init__(self, condition, then_block, else_block, line=None):
+        self.line = line
+        self.condition = condition
+        self.then_block = then_block  # list of statements
+        self.else_block = else_block  # list of statements, empty if no else
+
+
+class While(Node):
+    __slots__ = ("condition", "body")
+    _fields = ("condition", "body")
+
+    def __init__(self, condition, body, line=None):
+        self.line = line
+        self.condition = condition
+        self.body = body  # list of statements
+
+
+class For(Node):
+    __slots__ = ("variable", "iterable", "body")
+    _fields = ("variable", "iterable", "body")
+
+    def __init__(self, variable, iterable, body, line=None):
+        self.line = line
+        self.variable = variable  # Variable token the loop assigns each item to
+        self.iterable = iterable
+        self.body = body  # list of statements
+
+
+class Call(Node):
+    __slots__ = ("name", "args", "function")
+    _fields = ("name", "args", "function")
+
+    def __init__(self, name, args, function, line=None):
+        self.line = line
+        self.name = name
+        self.args = args
+        # Python function from natives.NATIVES, looked up by the parser; None
+        # for a call of a user-defined function, found through name when it runs
+        self.function = function
+
+
+class FunctionDef(Node):
+    __slots__ = ("name", "params", "body", "memo", "memo_size", "compiled")
+    _fields = ("name", "params", "body", "memo", "memo_size")
+
+    def __init__(self, name, params, body, memo=False, memo_size=None, line=None):
+        self.line = line
+        self.name = name
+        self.params = params  # tuple of parameter names
+        self.body = body  # list of statements
+        self.memo = memo  # True for memo fn
+        self.memo_size = memo_size  # from memo(size) fn, None for the default
+        # engine -> compiled body, shared by every Function this statement
+        # makes; not a field, so never pickled
+        self.compiled = {}
+
+
+class Return(Node):
+    __slots__ = ("value",)
+    _fields = ("value",)
+
+    def __init__(self, value, line=None):
+        self.line = line
+        self.value = value  # None for a bare return
+
+
+class IndexAccess(Node):
+    __slots__ = ("container", "key")
+    _fields = ("container", "key")
+
+    def __init__(self, container, key, line=None):
+        self.line = line
+        self.container = container
+        self.key = key
+
+
+class MethodCall(Node):
+    __slots__ = ("obj", "method", "args")
+    _fields = ("obj", "method", "args")
+
+    def __init__(self, obj, method, args, line=None):
+        self.line = line
+        self.obj = obj
+        self.method = method  # method name, e.g. "push"
+        self.args = args  # list of argument expressions
+
+
+class ListLiteral(Node):
+    __slots__ = ("elements",)
+    _fields = ("elements",)
+
+    def __init__(self, elements, line=None):
+        self.line = line
+        self.elements = elements
+
+
+class DictLiteral(Node):
+    __slots__ = ("pairs",)
+    _fields = ("pairs",)
+
+    def __init__(self, pairs, line=None):
+        self.line = line
+        self.pairs = pairs  # list of (key_expr, value_expr) tuples
+
+
+class Assign(Node):
+    __slots__ = ("target", "value")
+    _fields = ("target", "value")
+
+    def __init__(self, target, value, line=None):
+        self.line = line
+        self.target = target  # variable token or IndexAccess
+        self.value = value
+
+
+class Delete(Node):
+    __slots__ = ("target",)
+    _fields = ("target",)
+
+    def __init__(self, target, line=None):
+        self.line = line
+        self.target = target  # IndexAccess
+
+
+class Print(Node):
+    __slots__ = ("expr",)
+    _fields = ("expr",)
+
+    def __init__(self, expr, line=None):
+        self.line = line
+        self.expr = expr
+
+
+# Expressions nested more deeply than this are wrapped in a Deep node
+DEEP_LIMIT = 100
+
+
+class Deep(Node):
+    """An expression too deeply nested to walk by recursion, e.g. a sum of
+    thousands of terms; passes that recurse hand it to deep.py instead"""
+    __slots__ = ("expr",)
+    _fields = ("expr",)
+
+    def __init__(self, expr, line=None):
+        self.line = line
+        self.expr = expr
+
+    def __reduce__(self):
+        # pickle would recurse once per level, so store the nodes in postfix order
+        return (restore_deep, (flatten(self.expr), self.line))
+
+
+def restore_deep(program, line):
+    return Deep(unflatten(program), line)
+
+
+def depth(tree):
+    """How many nodes deep tree nests, found without recursion"""
+    deepest = 0
+    stack = [(tree, 1)]
+    while stack:
+        node, level = stack.pop()
+        if isinstance(node, Node):
+            if level > deepest:
+                deepest = level
+            stack.extend((getattr(node, name), level + 1) for name in node._fields)
+        elif isinstance(node, (list, tuple)):
+            stack.extend((child, level) for child in node)
+    return deepest
+
+
+def flatten(tree):
+    """tree as a flat list in postfix order, children before their parent
+
+    Each entry is (node class, line) for a node, (list, length) or
+    (tuple, length) for a container and (None, value) for anything else,
+    such as a token.
+    """
+    program = []
+    stack = [tree]
+    # Visit parents first, children last to first, then reverse the result
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Node):
+            program.append((type(node), node.line))
+            stack.extend(getattr(node, name) for name in node._fields)
+        elif isinstance(node, (list, tuple)):
+            program.append((type(node), len(node)))
+            stack.extend(node)
+        else:
+            program.append((None, node))
+    program.reverse()
+    return program
+
+
+def unflatten(program):
+    """Rebuild the tree flatten() turned into program"""
+    stack = []
+    for kind, item in program:
+        if kind is None:
+            stack.append(item)
+            continue
+        count = len(kind._fields) if issubclass(kind, Node) else item
+        parts = stack[len(stack) - count:]
+        del stack[len(stack) - count:]
+        if kind is list:
+            stack.append(parts)
+        elif kind is tuple:
+            stack.append(tuple(parts))
+        else:
+            stack.append(kind(*parts, item))
+    return stack.pop()
@@ -0,0 +1,141 @@
+"""Compact storage for lists holding only ints or only floats.
+
+A KayLang list whose elements are all ints (bools excluded) is kept in an
+array.array of 64-bit integers, and one whose elements are all floats in an
+array of doubles: 8 bytes per element instead of a pointer plus a boxed
+number. NumericList wraps that storage and behaves like the Python list the
+engines would otherwise use. When a value the array cannot hold is stored,
+such as a string, a float in an int list or an int too big for 64 bits, the
+storage is converted to a plain list in place, so every reference to the
+list sees the change.
+
+Set COMPACT to False to build plain lists instead, e.g. to compare memory use.
+"""
+
+from array import array
+
+COMPACT = True
+
+# Exact element class -> array typecode; bool is deliberately absent
+TYPECODES = {int: "q", float: "d"}
+KINDS = {"q": int, "d": float}
+
+
+def make_list(values):
+    """Turn a Python list of evaluated elements into a KayLang list"""
+    if not COMPACT:
+        return values
+    if not values:
+        # Undecided until the first push
+        return NumericList([])
+    cls = values[0].__class__
+    typecode = TYPECODES.get(cls)
+    if typecode is None:
+        return values
+    for value in values:
+        if value.__class__ is not cls:
+            return values
+    try:
+        return NumericList(array(typecode, values))
+    except OverflowError:
+        return values
+
+
+class NumericList:
+    __slots__ = ("items", "kind")
+
+    def __init__(self, items):
+        self.items = items  # array.array, or a list once promoted
+        # Class every element has while the storage is an array, else None
+        self.kind = KINDS[items.typecode] if items.__class__ is array else None
+
+    def promote(self):
+        """Switch to plain list storage"""
+        if self.kind is not None:
+            self.items = self.items.tolist()
+            self.kind = None
+        return self.items
+
+    def append(self, value):
+        if value.__class__ is self.kind:
+            try:
+                self.items.append(value)
+                return
+            except OverflowError:
+                pass
+        items = self.promote() if self.kind is not None else self.items
+        if not items and COMPACT and value.__class__ in TYPECODES:
+            try:
+                self.__init__(array(TYPECODES[value.__class__], [value]))
+                return
+            except OverflowError:
+                pass
+        items.append(value)
+
+    def pop(self, index=-1):
+        return self.items.pop(index)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __setitem__(self, index, value):
+        items = self.items
+        if self.kind is not None:
+            if value.__class__ is self.kind:
+                try:
+                    items[index] = value
+                    return
+                except OverflowError:
+                    pass
+            # Check the index first so a failed store leaves the storage as it was
+            items[index]
+            items = self.promote()
+        items[index] = value
+
+    def __delitem__(self, index):
+        del self.items[index]
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def tolist(self):
+        items = self.items
+        return items.tolist() if self.kind is not None else list(items)
+
+    def __repr__(self):
+        items = self.items
+        return repr(items.tolist() if self.kind is not None else items)
+
+    __str__ = __repr__
+
+    def __eq__(self, other):
+        if isinstance(other, (list, NumericList)):
+            return self.tolist() == as_list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        if isinstance(other, (list, NumericList)):
+            return self.tolist() != as_list(other)
+        return NotImplemented
+
+    def __lt__(self, other):
+        return self.tolist() < as_list(other)
+
+    def __le__(self, other):
+        return self.tolist() <= as_list(other)
+
+    def __gt__(self, other):
+        return self.tolist() > as_list(other)
+
+    def __ge__(self, other):
+        return self.tolist() >= as_list(other)
+
+    __hash__ = None
+
+
+def as_list(value):
+    """A plain Python list with the elements of a KayLang list"""
+    return value.tolist() if value.__class__ is NumericList else value
@@ -0,0 +1,189 @@
+"""Optimisation pass run over parsed statements before they execute.
+
+Expressions whose operands are all constants are folded into a single
+Literal, and/or with a constant left operand that decides the result is
+replaced by that value, if statements with a constant condition are replaced
+by the branch that would run, and while loops whose condition is constantly
+false are dropped. List and dict literals are never folded, since each
+evaluation must build a fresh container.
+
+The pass never changes the nodes it is given: rewritten parts of the tree are
+new nodes, so the parsed statements can still be cached as written.
+"""
+
+from tokens import Token
+from nodes import Literal, BinOp, Logical, Unary, If, While, Deep, DEEP_LIMIT, depth
+import runtime
+
+
+def describe(node, limit=8):
+    """Source-like text for an expression, used in the rewrite report
+
+    Parts nested more than limit levels down are shown as ...
+    """
+    if limit == 0:
+        return "..."
+    if isinstance(node, Literal):
+        value = node.value
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, str):
+            return '"' + value + '"'
+        return str(value)
+    if isinstance(node, Token):
+        return str(node.val)
+    if isinstance(node, (BinOp, Logical)):
+        return f"({describe(node.left, limit - 1)} {node.op} {describe(node.right, limit - 1)})"
+    if isinstance(node, Unary):
+        separator = " " if node.op == "not" else ""
+        return f"{node.op}{separator}{describe(node.operand, limit - 1)}"
+    return type(node).__name__
+
+
+class Optimizer:
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.rewrites = []  # one line per rewrite made, oldest first
+
+    def optimize(self, tree):
+        """Return an optimised copy of a statement or list of statements"""
+        if not self.enabled:
+            return tree
+        return self.visit(tree)
+
+    def report(self, node, message):
+        line = node.line
+        self.rewrites.append(f"line {line}: {message}" if line else message)
+
+    def visit(self, node):
+        if isinstance(node, list):
+            new = [self.visit(child) for child in node]
+            return node if all(a is b for a, b in zip(new, node)) else new
+
+        if isinstance(node, tuple):
+            new = tuple(self.visit(child) for child in node)
+            return node if all(a is b for a, b in zip(new, node)) else new
+
+        if isinstance(node, Token) or not hasattr(node, "_fields"):
+            return node
+
+        if node.__class__ is Deep:
+            return self.visit_deep(node)
+
+        # Children first, so folding works from the leaves up
+        fields = [getattr(node, name) for name in node._fields]
+        new_fields = [self.visit(field) for field in fields]
+        if any(a is not b for a, b in zip(new_fields, fields)):
+            node = type(node)(*new_fields, node.line)
+
+        rewrite = self.rewriters.get(node.__class__)
+        return rewrite(self, node) if rewrite else node
+
+    def visit_deep(self, node):
+        """visit() for a Deep node's expression, with explicit stacks in place of recursion"""
+        results = []  # visited nodes, waiting for their parent
+        work = [(node.expr, False)]
+        while work:
+            child, ready = work.pop()
+            if not ready:
+                if isinstance(child, (list, tuple)):
+                    work.append((child, True))
+                    work.extend((item, False) for item in reversed(child))
+                elif isinstance(child, Token) or not hasattr(child, "_fields"):
+                    results.append(child)
+                else:
+                    work.append((child, True))
+                    work.extend((getattr(child, name), False) for name in reversed(child._fields))
+                continue
+
+            # Its parts are visited: the last len(parts) results
+            parts = child if isinstance(child, (list, tuple)) else [getattr(child, name) for name in child._fields]
+            new_parts = results[len(results) - len(parts):]
+            del results[len(results) - len(parts):]
+            changed = any(a is not b for a, b in zip(new_parts, parts))
+            if isinstance(child, (list, tuple)):
+                results.append(type(child)(new_parts) if changed else child)
+                continue
+            if changed:
+                child = type(child)(*new_parts, child.line)
+            rewrite = self.rewriters.get(child.__class__)
+            results.append(rewrite(self, child) if rewrite else child)
+
+        expr = results.pop()
+        if expr is node.expr:
+            return node
+        # Folding may leave an expression shallow enough to recurse into
+        return Deep(expr, node.line) if depth(expr) > DEEP_LIMIT else expr
+
+    def fold_binop(self, node):
+        if not (isinstance(node.left, Literal) and isinstance(node.right, Literal)):
+            return node
+        operation = runtime.BINARY_OPS.get(node.op)
+        if operation is None:
+            return node
+        try:
+            value = operation(node.left.value, node.right.value)
+        except Exception:
+            # e.g. 1 / 0: leave it to raise when (and if) it runs
+            return node
+        return self.folded(node, value)
+
+    def fold_unary(self, node):
+        if not isinstance(node.operand, Literal):
+            return node
+        operation = runtime.UNARY_OPS.get(node.op)
+        if operation is None:
+            return node
+        try:
+            value = operation(node.operand.value)
+        except Exception:
+            return node
+        return self.folded(node, value)
+
+    def fold_logical(self, node):
+        if not isinstance(node.left, Literal):
+            return node
+        left_val = node.left.value
+        if node.op == "and":
+            decides = not left_val
+        elif node.op == "or":
+            decides = bool(left_val)
+        else:
+            return node
+        if decides:
+            return self.folded(node, runtime.normalise(left_val))
+        if isinstance(node.right, Literal):
+            return self.folded(node, runtime.normalise(node.right.value))
+        return node
+
+    def folded(self, node, value):
+        result = Literal(value, node.line)
+        self.report(node, f"folded {describe(node)} to {describe(result)}")
+        return result
+
+    def prune_if(self, node):
+        if not isinstance(node.condition, Literal):
+            return node
+        # The kept branch stays a nested block so the statement's result,
+        # which the shell echoes, is unchanged
+        if node.condition.value:
+            self.report(node, f"if {describe(node.condition)}: kept the then branch")
+            return node.then_block
+        self.report(node, f"if {describe(node.condition)}: kept the else branch")
+        return node.else_block or []
+
+    def prune_while(self, node):
+        if isinstance(node.condition, Literal) and not node.condition.value:
+            self.report(node, f"while {describe(node.condition)}: removed the loop")
+            return []
+        return node
+
+
+Optimizer.rewriters = {
+    BinOp: Optimizer.fold_binop,
+    Unary: Optimizer.fold_unary,
+    Logical: Optimizer.fold_logical,
+    If: Optimizer.prune_if,
+    While: Optimizer.prune_while,
+}
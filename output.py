@@ -0,0 +1,62 @@
+"""Buffered destination for what a program prints.
+
+Each engine owns an Output and sends print statements, and the values the
+shell echoes, to it instead of calling print() per value. Text is collected
+until buffer_size characters are waiting and then written in one call, so a
+print-heavy loop costs one write per buffer rather than one per line. The
+runner flushes at the end of every program and when it fails, so nothing
+printed before an error is lost.
+
+A value is written exactly as print() would show it: str(value) and a
+newline.
+"""
+
+import sys
+
+
+class Output:
+
+    def __init__(self, target=None, buffer_size=8192):
+        # target is one of:
+        #   None   the current sys.stdout, looked up at each flush so
+        #          redirect_stdout and the like still work
+        #   str    a file path, opened for writing and closed by close()
+        #   list   each printed value's text is appended as one item
+        #   any object with a write(text) method, e.g. an open file
+        self.owns_target = isinstance(target, str)
+        self.target = open(target, "w") if self.owns_target else target
+        self.buffer_size = buffer_size  # 0 writes every value straight through
+        self.pending = []  # texts waiting to be written, without newlines
+        self.size = 0
+
+    def write(self, value):
+        """Queue value as one printed line"""
+        text = str(value)
+        self.pending.append(text)
+        self.size += len(text) + 1
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write out everything queued"""
+        if not self.pending:
+            return
+        pending = self.pending
+        self.pending = []
+        self.size = 0
+
+        target = self.target
+        if target is None:
+            target = sys.stdout
+        elif isinstance(target, list):
+            target.extend(pending)
+            return
+        target.write("\n".join(pending) + "\n")
+        if hasattr(target, "flush"):
+            target.flush()
+
+    def close(self):
+        """Flush, and close the file if this Output opened it"""
+        self.flush()
+        if self.owns_target:
+            self.target.close()
@@ -0,0 +1,96 @@
+"""Execution profiler for the tree-walking interpreter.
+
+Interpreter.start_profiling replaces the interpreter's evaluate method with
+one that times every node it visits, so nothing is measured, or slowed down,
+while profiling is off. Each node is counted under its source line and kind
+(e.g. line 7, BinOp) with its hit count, cumulative time (including the nodes
+below it) and self time (excluding them).
+"""
+
+import time
+
+
+class Profiler:
+
+    def __init__(self, collapse=False):
+        self.stats = {}  # (line, kind) -> [hits, cumulative seconds, self seconds]
+        self.collapse = collapse  # also record collapsed stacks for flame graphs
+        self.stacks = {}  # "kind:line;kind:line;..." -> self seconds
+        self.frames = []
+
+    def wrap(self, evaluate):
+        """Return a timing version of an interpreter's bound evaluate method"""
+        stats = self.stats
+        stacks = self.stacks
+        frames = self.frames
+        collapse = self.collapse
+        clock = time.perf_counter
+        child_times = [0.0]  # time spent in children of each active node
+
+        def profiled_evaluate(expr):
+            # Blocks are bookkeeping, not code: time only what they contain
+            if expr.__class__ is list or expr is None:
+                return evaluate(expr)
+
+            kind = expr.__class__.__name__
+            key = (getattr(expr, "line", None), kind)
+            if collapse:
+                frames.append(f"{kind}:{key[0]}")
+            child_times.append(0.0)
+            start = clock()
+            try:
+                return evaluate(expr)
+            finally:
+                elapsed = clock() - start
+                own = elapsed - child_times.pop()
+                child_times[-1] += elapsed
+                entry = stats.get(key)
+                if entry is None:
+                    stats[key] = [1, elapsed, own]
+                else:
+                    entry[0] += 1
+                    entry[1] += elapsed
+                    entry[2] += own
+                if collapse:
+                    path = ";".join(frames)
+                    stacks[path] = stacks.get(path, 0.0) + own
+                    frames.pop()
+
+        return profiled_evaluate
+
+    def by_kind(self):
+        """Totals per node kind: kind -> [hits, cumulative seconds, self seconds]"""
+        totals = {}
+        for (line, kind), (hits, cumulative, own) in self.stats.items():
+            entry = totals.setdefault(kind, [0, 0.0, 0.0])
+            entry[0] += hits
+            entry[1] += cumulative
+            entry[2] += own
+        return totals
+
+    def report(self, source_lines=None, limit=20):
+        """Hot-spot tables sorted by self time, as text"""
+        total = sum(own for _, _, own in self.stats.values()) or 1.0
+        lines = [f"{'line':>6}  {'node':<12} {'hits':>9} {'total ms':>10} {'self ms':>10} {'self %':>7}  source"]
+        ranked = sorted(self.stats.items(), key=lambda item: item[1][2], reverse=True)
+        for (line, kind), (hits, cumulative, own) in ranked[:limit]:
+            text = ""
+            if source_lines and line and line <= len(source_lines):
+                text = source_lines[line - 1].strip()[:40]
+            lines.append(
+                f"{line if line else '-':>6}  {kind:<12} {hits:>9} {cumulative * 1000:10.2f} "
+                f"{own * 1000:10.2f} {own / total * 100:6.1f}%  {text}"
+            )
+
+        lines.append("")
+        lines.append(f"{'node':<12} {'hits':>9} {'total ms':>10} {'self ms':>10} {'self %':>7}")
+        ranked = sorted(self.by_kind().items(), key=lambda item: item[1][2], reverse=True)
+        for kind, (hits, cumulative, own) in ranked:
+            lines.append(f"{kind:<12} {hits:>9} {cumulative * 1000:10.2f} {own * 1000:10.2f} {own / total * 100:6.1f}%")
+        return "\n".join(lines)
+
+    def write_stacks(self, path):
+        """Write collapsed stacks (one "frame;frame count" line each) for flamegraph.pl"""
+        with open(path, "w") as f:
+            for stack, own in sorted(self.stacks.items()):
+                f.write(f"{stack} {int(own * 1_000_000)}\n")  # microseconds
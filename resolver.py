@@ -0,0 +1,129 @@
+"""Resolution pass run over a program before it executes.
+
+Every variable name in the program is given its slot in the Data store, so
+the compiled engines can bind slot numbers instead of looking names up at
+run time. Reads that are certain to run, such as top-level statements and
+loop or if conditions, are also checked: if nothing earlier in the program
+or the session could have assigned the name, the resolver reports it as
+undefined before any of the program runs.
+"""
+
+from tokens import Variable
+from nodes import Logical, If, While, For, Call, FunctionDef, Assign, Deep
+from functions import local_layout
+from data import UNSET
+
+
+class Resolver:
+
+    def __init__(self, base):
+        self.data = base
+        self.assigned = set()  # names some earlier code may have written
+        self.local_names = ()  # locals of the function body being visited
+
+    def resolve(self, tree):
+        """Allocate slots for tree and report reads of names nothing assigns"""
+        self.visit(tree, True)
+        return tree
+
+    def is_known(self, name):
+        if name in self.assigned:
+            return True
+        slot = self.data.slots.get(name)
+        return slot is not None and self.data.values[slot] is not UNSET
+
+    def visit(self, node, certain):
+        # certain is False inside if branches, loop bodies and the right of
+        # and/or, where a read might never happen, so an unknown name there
+        # is left to run time
+        if isinstance(node, Variable):
+            if node.val in self.local_names:
+                return
+            self.data.slot(node.val)
+            if certain and not self.is_known(node.val):
+                location = f" at line {node.line}, column {node.column}" if node.line else ""
+                raise Exception(f"Undefined variable: {node.val}{location}")
+
+        elif isinstance(node, Assign):
+            # The value is read before the target is written: x = x + 1
+            self.visit(node.value, certain)
+            target = node.target
+            if isinstance(target, Variable):
+                if target.val in self.local_names:
+                    return
+                self.data.slot(target.val)
+                self.assigned.add(target.val)
+            else:
+                self.visit(target, certain)
+
+        elif isinstance(node, Logical):
+            # The right operand is skipped when the left one decides the result
+            self.visit(node.left, certain)
+            self.visit(node.right, False)
+
+        elif isinstance(node, If):
+            self.visit(node.condition, certain)
+            self.visit(node.then_block, False)
+            self.visit(node.else_block, False)
+
+        elif isinstance(node, While):
+            self.visit(node.condition, certain)
+            self.visit(node.body, False)
+
+        elif isinstance(node, For):
+            self.visit(node.iterable, certain)
+            name = node.variable.val
+            if name not in self.local_names:
+                # Only written if the collection turns out not to be empty
+                self.data.slot(name)
+                self.assigned.add(name)
+            self.visit(node.body, False)
+
+        elif isinstance(node, FunctionDef):
+            self.data.slot(node.name)
+            self.assigned.add(node.name)
+            # The body only runs when the function is called, perhaps after
+            # globals it reads have been assigned; its locals are not globals
+            self.local_names = local_layout(node.params, node.body)
+            try:
+                self.visit(node.body, False)
+            finally:
+                self.local_names = ()
+
+        elif isinstance(node, Call):
+            self.visit_callee(node, certain)
+            self.visit(node.args, certain)
+
+        elif isinstance(node, Deep):
+            # The same visits with a stack of (node, certain) in place of
+            # recursion; an expression holds no assignments or definitions
+            stack = [(node.expr, certain)]
+            while stack:
+                child, certain = stack.pop()
+                if isinstance(child, Logical):
+                    stack.append((child.right, False))
+                    stack.append((child.left, certain))
+                elif isinstance(child, Call):
+                    self.visit_callee(child, certain)
+                    stack.extend((arg, certain) for arg in child.args)
+                elif isinstance(child, (list, tuple)):
+                    stack.extend((item, certain) for item in child)
+                elif hasattr(child, "_fields"):
+                    stack.extend((getattr(child, name), certain) for name in child._fields)
+                else:
+                    self.visit(child, certain)
+
+        elif isinstance(node, (list, tuple)):
+            for child in node:
+                self.visit(child, certain)
+
+        elif hasattr(node, "_fields"):
+            for name in node._fields:
+                self.visit(getattr(node, name), certain)
+
+    def visit_callee(self, node, certain):
+        if node.function is None and node.name not in self.local_names:
+            self.data.slot(node.name)
+            if certain and not self.is_known(node.name):
+                location = f" at line {node.line}" if node.line else ""
+                raise Exception(f"Undefined function: {node.name}{location}")
@@ -0,0 +1,347 @@
+"""Operations shared by the execution engines.
+
+Each KayLang operator is a plain function over native Python values, so the
+compiled engines can bind the right one once instead of re-dispatching on the
+operator string every time a node runs.
+"""
+
+from numeric import NumericList, make_list, as_list
+from functions import Function
+import vector
+
+NUMBER = (int, float)
+DICT_KEY = (str, int, float, bool)
+LIST_TYPES = (list, NumericList)  # a KayLang list is either, see numeric.py
+
+
+def type_name(value):
+    """Name of a value's type for error messages; every list is a list"""
+    if value.__class__ is NumericList:
+        return "list"
+    if value.__class__ is Function:
+        return "function"
+    return type(value).__name__
+
+
+def normalise(result):
+    """Convert float results that are whole numbers to int"""
+    if result.__class__ is float and result.is_integer():
+        return int(result)
+    return result
+
+
+def add(left_val, right_val):
+    if isinstance(left_val, NUMBER) and isinstance(right_val, NUMBER):
+        return normalise(left_val + right_val)
+    elif isinstance(left_val, str) and isinstance(right_val, str):
+        return left_val + right_val
+    elif isinstance(left_val, LIST_TYPES) and isinstance(right_val, LIST_TYPES):
+        if left_val.__class__ is list and right_val.__class__ is list:
+            return left_val + right_val
+        return make_list(as_list(left_val) + as_list(right_val))
+    raise Exception(f"Type error: Cannot add {type_name(left_val)} and {type_name(right_val)}")
+
+
+def sub(left_val, right_val):
+    if isinstance(left_val, NUMBER) and isinstance(right_val, NUMBER):
+        return normalise(left_val - right_val)
+    raise Exception(f"Type error: Cannot subtract {type_name(right_val)} from {type_name(left_val)}")
+
+
+def mul(left_val, right_val):
+    if isinstance(left_val, NUMBER) and isinstance(right_val, NUMBER):
+        return normalise(left_val * right_val)
+    raise Exception(f"Type error: Cannot multiply {type_name(left_val)} with {type_name(right_val)}")
+
+
+def div(left_val, right_val):
+    if isinstance(left_val, NUMBER) and isinstance(right_val, NUMBER):
+        if right_val == 0:
+            raise Exception("Division by zero")
+        return normalise(left_val / right_val)
+    raise Exception(f"Type error: Cannot divide {type_name(left_val)} by {type_name(right_val)}")
+
+
+def eq(left_val, right_val):
+    return left_val == right_val
+
+
+def ne(left_val, right_val):
+    return left_val != right_val
+
+
+def lt(left_val, right_val):
+    return left_val < right_val
+
+
+def gt(left_val, right_val):
+    return left_val > right_val
+
+
+def le(left_val, right_val):
+    return left_val <= right_val
+
+
+def ge(left_val, right_val):
+    return left_val >= right_val
+
+
+def elementwise(symbol):
+    """Make the function for an element-wise operator such as .+"""
+
+    def apply(left_val, right_val):
+        left_list = isinstance(left_val, LIST_TYPES)
+        right_list = isinstance(right_val, LIST_TYPES)
+        if not (
+            (left_list or right_list)
+            and (left_list or isinstance(left_val, NUMBER))
+            and (right_list or isinstance(right_val, NUMBER))
+        ):
+            raise Exception(f"Type error: Cannot apply {symbol} to {type_name(left_val)} and {type_name(right_val)}")
+        left = numbers(left_val, symbol) if left_list else left_val
+        right = numbers(right_val, symbol) if right_list else right_val
+        if left_list and right_list and len(left) != len(right):
+            raise Exception(f"Element-wise {symbol} needs lists of the same length, got {len(left)} and {len(right)}")
+        if symbol == "./" and (0 in right if right_list else right == 0):
+            raise Exception("Division by zero")
+        return vector.elementwise(symbol, left, right)
+
+    return apply
+
+
+def numbers(list_val, operation):
+    """The elements of a list for vector.py, checked to all be numbers"""
+    values = vector.elements(list_val)
+    if values is None:
+        bad = next(value for value in as_list(list_val) if not isinstance(value, NUMBER))
+        raise Exception(f"Type error: {operation} needs a list of numbers, found {type_name(bad)}")
+    return values
+
+
+def and_(left_val, right_val):
+    return normalise(left_val and right_val)
+
+
+def or_(left_val, right_val):
+    return normalise(left_val or right_val)
+
+
+BINARY_OPS = {
+    "+": add,
+    "-": sub,
+    "*": mul,
+    "/": div,
+    "==": eq,
+    "!=": ne,
+    "<": lt,
+    ">": gt,
+    "<=": le,
+    ">=": ge,
+    "and": and_,
+    "or": or_,
+    ".+": elementwise(".+"),
+    ".-": elementwise(".-"),
+    ".*": elementwise(".*"),
+    "./": elementwise("./"),
+}
+
+
+def neg(val):
+    if isinstance(val, NUMBER):
+        return normalise(-val)
+    raise Exception(f"Cannot negate {type_name(val)}")
+
+
+def not_(val):
+    return not val
+
+
+UNARY_OPS = {
+    "-": neg,
+    "not": not_,
+    "!": not_,
+}
+
+
+def binary_op(op):
+    """Look up the function implementing a binary operator"""
+    try:
+        return BINARY_OPS[op]
+    except KeyError:
+        raise Exception(f"Unknown binary operator: {op}")
+
+
+def unary_op(op):
+    """Look up the function implementing a unary operator"""
+    try:
+        return UNARY_OPS[op]
+    except KeyError:
+        raise Exception(f"Unknown unary operator: {op}")
+
+
+def index_get(container_val, index_val):
+    """Read container[index] with KayLang's type checks"""
+    if isinstance(container_val, LIST_TYPES):
+        if not isinstance(index_val, int):
+            raise Exception(f"List index must be integer, got {type_name(index_val)}")
+        if container_val.__class__ is NumericList:
+            container_val = container_val.items  # skip a Python-level __getitem__
+        try:
+            return container_val[index_val]
+        except IndexError:
+            raise Exception(f"List index {index_val} out of bounds")
+
+    elif isinstance(container_val, dict):
+        if not isinstance(index_val, DICT_KEY):
+            raise Exception(f"Invalid dictionary key type: {type_name(index_val)}")
+        try:
+            return container_val[index_val]
+        except KeyError:
+            raise Exception(f"Key {index_val} not found in dictionary")
+
+    raise Exception(f"Type error: cannot index {type_name(container_val)}")
+
+
+def index_set(container_obj, key, value):
+    """Write container[key] = value with KayLang's type checks"""
+    if isinstance(container_obj, dict):
+        if not isinstance(key, DICT_KEY):
+            raise Exception(f"Invalid dictionary key type: {type_name(key)}")
+        container_obj[key] = value
+    elif isinstance(container_obj, LIST_TYPES):
+        if not isinstance(key, int):
+            raise Exception(f"List index must be integer, got {type_name(key)}")
+        try:
+            container_obj[key] = value
+        except IndexError:
+            raise Exception(f"List index {key} out of bounds")
+    else:
+        raise Exception(f"Cannot assign to index of type {type_name(container_obj)}")
+    return value
+
+
+def index_delete(container_obj, key):
+    """Remove container[key] with KayLang's type checks"""
+    if isinstance(container_obj, dict):
+        if key in container_obj:
+            del container_obj[key]
+            return None
+        raise Exception(f"Key {key} not found in dictionary")
+    elif isinstance(container_obj, LIST_TYPES):
+        if not isinstance(key, int):
+            raise Exception(f"List index must be integer, got {type_name(key)}")
+        try:
+            del container_obj[key]
+            return None
+        except IndexError:
+            raise Exception(f"List index {key} out of bounds")
+    raise Exception(f"Cannot delete from {type_name(container_obj)}")
+
+
+def iterate(value):
+    """Iterator over what a for loop visits: list items, dict keys, range numbers or string characters"""
+    cls = value.__class__
+    if cls is NumericList:
+        return iter(value.items)
+    if cls is list or cls is range or cls is str:
+        return iter(value)
+    if cls is dict:
+        # Iterate a snapshot of the keys so the body can add and delete entries
+        return iter(list(value))
+    raise Exception(f"Cannot iterate over {type_name(value)}")
+
+
+def call_method(obj_val, method_name, args):
+    """Run a built-in method such as lst.push(x) or lst.pop()"""
+    if isinstance(obj_val, LIST_TYPES):
+        if method_name == "push":
+            for arg in args:
+                obj_val.append(arg)
+            return obj_val
+
+        elif method_name == "pop":
+            try:
+                if len(args) == 0:
+                    return obj_val.pop()
+                elif len(args) == 1:
+                    idx = args[0]
+                    if not isinstance(idx, int):
+                        raise Exception(f"pop index must be integer, got {type_name(idx)}")
+                    return obj_val.pop(idx)
+                else:
+                    raise Exception("pop() takes at most one argument")
+            except IndexError:
+                raise Exception("pop from empty list")
+
+        method = LIST_METHODS.get(method_name)
+        if method is not None:
+            return method(obj_val, args)
+        raise Exception(f"Unknown method '{method_name}' for list")
+
+    raise Exception(f"Cannot call method on {type_name(obj_val)}")
+
+
+def list_sum(list_val, args):
+    if args:
+        raise Exception("sum() takes no arguments")
+    return normalise(vector.total(numbers(list_val, "sum()")))
+
+
+def list_min(list_val, args):
+    if args:
+        raise Exception("min() takes no arguments")
+    if not len(list_val):
+        raise Exception("min() of an empty list")
+    return vector.smallest(numbers(list_val, "min()"))
+
+
+def list_max(list_val, args):
+    if args:
+        raise Exception("max() takes no arguments")
+    if not len(list_val):
+        raise Exception("max() of an empty list")
+    return vector.largest(numbers(list_val, "max()"))
+
+
+def list_mean(list_val, args):
+    if args:
+        raise Exception("mean() takes no arguments")
+    if not len(list_val):
+        raise Exception("mean() of an empty list")
+    return normalise(vector.total(numbers(list_val, "mean()")) / len(list_val))
+
+
+def list_dot(list_val, args):
+    if len(args) != 1:
+        raise Exception("dot() takes exactly one argument")
+    other = args[0]
+    if not isinstance(other, LIST_TYPES):
+        raise Exception(f"dot() needs a list, got {type_name(other)}")
+    if len(list_val) != len(other):
+        raise Exception(f"dot() needs lists of the same length, got {len(list_val)} and {len(other)}")
+    return normalise(vector.dot(numbers(list_val, "dot()"), numbers(other, "dot()")))
+
+
+def list_map(list_val, args):
+    if len(args) != 1:
+        raise Exception("map() takes exactly one argument")
+    name = args[0]
+    if not isinstance(name, str) or name not in vector.TRANSFORMS:
+        raise Exception(f"Unknown transform {name!r} for map(). Choose from: {', '.join(vector.TRANSFORMS)}")
+    values = numbers(list_val, "map()")
+    if name in ("sqrt", "log") and len(values):
+        lowest = min(values)
+        if lowest < 0 or (name == "log" and lowest == 0):
+            raise Exception(f"Cannot take {name} of {lowest}")
+    return vector.transform(name, values)
+
+
+# Methods on lists besides push and pop, which call_method handles itself
+LIST_METHODS = {
+    "sum": list_sum,
+    "min": list_min,
+    "max": list_max,
+    "mean": list_mean,
+    "dot": list_dot,
+    "map": list_map,
+}
@@ -0,0 +1,477 @@
+"""Serve KayLang evaluation over a local socket from pre-warmed workers.
+
+    python3 server.py --port 7077                 TCP on 127.0.0.1
+    python3 server.py --unix /tmp/kaylang.sock    Unix socket
+
+Starting Python and importing the interpreter costs far more than most
+requests, so the server starts a pool of worker processes once, each with
+the engine, parser and optimiser already imported and exercised, and hands
+requests to them. Connections are handled by asyncio in the server process;
+the code runs in the workers, so a slow program never holds up the others.
+
+Every message, both ways, is a 4-byte big-endian length followed by that
+many bytes of UTF-8 JSON. A request is an object with an "op":
+
+    {"op": "run", "code": "print 1 + 2;"}
+    {"op": "run", "code": "x = 5;", "session": "alice", "timeout": 2}
+    {"op": "close", "session": "alice"}
+    {"op": "stats"}
+    {"op": "ping"}
+
+and an optional "id", echoed in the reply. A run without a session gets
+fresh variables that are thrown away afterwards; a named session keeps its
+variables and functions between requests until it is closed, and always
+runs on the same worker. The reply to a run is
+
+    {"id": ..., "ok": true, "output": ["3"], "error": null, "seconds": 0.001}
+
+with ok false and the error message when the program raised an error, ran
+past its time limit ("timeout": true) or the server was too busy. stats
+reports request counts, queue depth, sessions and latency percentiles.
+
+Options:
+
+    --port N, --host H   listen on TCP (default host 127.0.0.1)
+    --unix PATH          listen on a Unix socket instead
+    --workers N          worker processes (default: one per CPU)
+    --queue N            requests that may wait for a worker before new ones
+                         are turned away (default 64)
+    --timeout S          the longest a request may run, and the default
+                         limit (default 10)
+    --max-sessions N     named sessions kept at once (default 1000)
+    --max-memory MB      address space per worker, as for batch.py
+    --engine NAME, --no-optimize, --memo-size N  as for kaylang.py
+
+Client is a small blocking client for scripts and tests.
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import math
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from kaylang import ENGINES, load_engine, execute_code
+from batch import Deadline, ScriptTimeout, limit_memory
+from data import Data
+from output import Output
+import functions
+
+HEADER = struct.Struct(">I")  # length of the JSON that follows
+MAX_MESSAGE = 16 * 1024 * 1024  # longest request accepted, in bytes
+
+# Extra time a worker gets past a request's limit to report the timeout
+# itself before it is presumed stuck, killed and restarted
+GRACE_SECONDS = 2
+
+LATENCY_SAMPLES = 10000  # most recent run latencies kept for percentiles
+
+WARM_UP = "fn warm(n) { return n * 2; }\nlet items = [1, 2.5];\nprint warm(len(items)) > 1 and true;"
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of already sorted samples"""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def serve_worker(connection, config):
+    """Main loop of a worker process: run requests from connection until it closes"""
+    engine = load_engine(config["engine"])
+    functions.MEMO_SIZE = config["memo_size"]
+    functions.allow_deep_recursion()
+    import signal
+    signal.signal(signal.SIGINT, Deadline.on_interrupt)
+    Optimizer = None
+    if config["optimize"]:
+        from optimizer import Optimizer
+
+    sessions = {}  # name -> (interpreter, its Output)
+
+    def run(code, session, timeout):
+        lines = []
+        if session in sessions:
+            interpreter, output = sessions[session]
+        else:
+            output = Output([])
+            interpreter = engine(None, Data(), output)
+            if session is not None:
+                sessions[session] = (interpreter, output)
+        # The compiled engines keep a reference to the Output they were made
+        # with, so each request gets a fresh target rather than a fresh Output
+        output.target = lines
+        optimizer = Optimizer() if Optimizer is not None else None
+        reply = {"ok": True, "output": lines, "error": None}
+        start = time.perf_counter()
+        try:
+            with Deadline(timeout):
+                execute_code(code, interpreter, optimizer)
+        except ScriptTimeout:
+            reply.update(ok=False, error=f"Stopped after {timeout:g} seconds", timeout=True)
+        except MemoryError:
+            reply.update(ok=False, error="Out of memory")
+        except Exception as e:
+            reply.update(ok=False, error=str(e))
+        reply["seconds"] = round(time.perf_counter() - start, 6)
+        return reply
+
+    # Import and exercise everything a request uses before reporting ready
+    run(WARM_UP, None, 0)
+    limit_memory(config["max_memory"])
+    connection.send("ready")
+
+    while True:
+        try:
+            op, session, code, timeout = connection.recv()
+        except (EOFError, OSError):
+            return
+        if op == "close":
+            sessions.pop(session, None)
+            connection.send({"ok": True})  # None would mean the worker failed
+        else:
+            connection.send(run(code, session, timeout))
+
+
+class Worker:
+    """A worker process and the server's end of its pipe"""
+
+    def __init__(self, config, context):
+        self.config = config
+        self.context = context
+        self.lock = asyncio.Lock()  # one request at a time
+        self.waiting = 0  # requests holding or waiting for the lock
+        self.sessions = set()  # names of the sessions living in this process
+        self.process = None
+        self.connection = None
+
+    def start(self):
+        """Start the process and wait until it is warm; blocks"""
+        ours, theirs = self.context.Pipe()
+        self.process = self.context.Process(target=serve_worker, args=(theirs, self.config), daemon=True)
+        self.process.start()
+        theirs.close()
+        self.connection = ours
+        if ours.recv() != "ready":
+            raise Exception("KayLang worker failed to start")
+
+    def call(self, message, limit):
+        """Send a request and wait up to limit seconds for the reply; blocks
+
+        Returns None if the worker hung or died, after which it must be
+        restarted.
+        """
+        try:
+            self.connection.send(message)
+            if self.connection.poll(limit):
+                return self.connection.recv()
+        except (EOFError, OSError):
+            pass
+        return None
+
+    def restart(self):
+        """Replace a hung or dead process; its sessions are lost; blocks"""
+        self.stop()
+        self.sessions.clear()
+        self.start()
+
+    def stop(self):
+        if self.connection is not None:
+            self.connection.close()
+        if self.process is not None:
+            self.process.kill()
+            self.process.join()
+
+
+class Server:
+
+    def __init__(self, workers=None, queue_limit=64, timeout=10, max_sessions=1000,
+                 engine="tree", optimize=True, memo_size=functions.MEMO_SIZE, max_memory=0):
+        self.config = {"engine": engine, "optimize": optimize, "memo_size": memo_size,
+                       "max_memory": max_memory}
+        self.worker_count = workers or os.cpu_count() or 1
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+        self.workers = []
+        self.sessions = {}  # session name -> Worker
+        self.pending = 0  # run requests accepted and not yet answered
+        self.threads = ThreadPoolExecutor(max_workers=self.worker_count)
+        self.server = None
+        self.started = time.time()
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.counts = collections.Counter()
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """Warm up the workers and listen; returns the asyncio server"""
+        loop = asyncio.get_running_loop()
+        # Spawned rather than forked: the server process has threads
+        context = multiprocessing.get_context("spawn")
+        self.workers = [Worker(self.config, context) for _ in range(self.worker_count)]
+        await asyncio.gather(*[loop.run_in_executor(self.threads, worker.start) for worker in self.workers])
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port)
+        self.started = time.time()
+        return self.server
+
+    def address(self):
+        """The (host, port) or path being listened on"""
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for worker in self.workers:
+            worker.stop()
+        self.threads.shutdown(wait=False)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                except asyncio.IncompleteReadError:
+                    return  # the client hung up
+                size, = HEADER.unpack(header)
+                if size > MAX_MESSAGE:
+                    await send(writer, {"ok": False, "error": f"Request of {size} bytes is over the {MAX_MESSAGE} byte limit"})
+                    return
+                body = await reader.readexactly(size)
+                try:
+                    request = json.loads(body)
+                    if not isinstance(request, dict):
+                        raise ValueError("a request must be a JSON object")
+                except ValueError as e:
+                    reply = {"ok": False, "error": f"Bad request: {e}"}
+                else:
+                    reply = await self.handle(request)
+                    if "id" in request:
+                        reply["id"] = request["id"]
+                await send(writer, reply)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle(self, request):
+        op = request.get("op", "run")
+        self.counts[op] += 1
+        if op == "run":
+            return await self.run(request)
+        if op == "close":
+            return await self.close_session(request.get("session"))
+        if op == "stats":
+            return {"ok": True, "stats": self.stats()}
+        if op == "ping":
+            return {"ok": True}
+        return {"ok": False, "error": f"Unknown op: {op}"}
+
+    async def run(self, request):
+        started = time.perf_counter()
+        code = request.get("code")
+        session = request.get("session")
+        timeout = request.get("timeout", self.timeout)
+        if not isinstance(code, str):
+            return {"ok": False, "error": "Bad request: run needs code"}
+        if session is not None and not isinstance(session, str):
+            return {"ok": False, "error": "Bad request: session must be a string"}
+        if not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or timeout <= 0:
+            return {"ok": False, "error": "Bad request: timeout must be a positive number of seconds"}
+        timeout = min(timeout, self.timeout)
+
+        if self.pending >= self.worker_count + self.queue_limit:
+            self.counts["rejected"] += 1
+            return {"ok": False, "error": "Server busy: too many requests waiting", "busy": True}
+
+        worker = self.sessions.get(session)
+        if worker is None:
+            if session is not None and len(self.sessions) >= self.max_sessions:
+                return {"ok": False, "error": f"Too many sessions (limit {self.max_sessions})"}
+            # The least busy worker; new sessions also spread by count
+            worker = min(self.workers, key=lambda w: (w.waiting, len(w.sessions)))
+            if session is not None:
+                self.sessions[session] = worker
+                worker.sessions.add(session)
+
+        self.pending += 1
+        worker.waiting += 1
+        try:
+            async with worker.lock:
+                if session is not None and session not in worker.sessions:
+                    # The worker was restarted while this request waited
+                    self.sessions[session] = worker
+                    worker.sessions.add(session)
+                reply = await self.call(worker, ("run", session, code, timeout), timeout + GRACE_SECONDS)
+        finally:
+            worker.waiting -= 1
+            self.pending -= 1
+
+        if not reply["ok"] and reply.get("restarted") and session is not None:
+            reply["error"] += "; the session's variables were lost"
+        if reply.get("timeout"):
+            self.counts["timeouts"] += 1
+        elif not reply["ok"]:
+            self.counts["errors"] += 1
+        self.latencies.append(time.perf_counter() - started)
+        return reply
+
+    async def call(self, worker, message, limit):
+        """Run message on worker, restarting it if it hangs or dies"""
+        loop = asyncio.get_running_loop()
+        reply = await loop.run_in_executor(self.threads, worker.call, message, limit)
+        if reply is not None:
+            return reply
+
+        hung = worker.process.is_alive()
+        for name in worker.sessions:
+            self.sessions.pop(name, None)
+        self.counts["restarts"] += 1
+        await loop.run_in_executor(self.threads, worker.restart)
+        if hung:
+            error = f"No reply within {limit:g} seconds, so the worker was restarted"
+        else:
+            error = "The worker process exited and was restarted"
+        return {"ok": False, "output": [], "error": error, "timeout": hung, "restarted": True}
+
+    async def close_session(self, session):
+        worker = self.sessions.pop(session, None)
+        if worker is None:
+            return {"ok": False, "error": f"No session named {session}"}
+        worker.sessions.discard(session)
+        async with worker.lock:
+            await self.call(worker, ("close", session, None, None), GRACE_SECONDS)
+        return {"ok": True}
+
+    def stats(self):
+        latency = None
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            latency = {"samples": len(ordered)}
+            for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+                latency[name] = round(percentile(ordered, fraction) * 1000, 3)
+            latency["max"] = round(ordered[-1] * 1000, 3)
+        return {
+            "uptime": round(time.time() - self.started, 3),
+            "workers": self.worker_count,
+            "engine": self.config["engine"],
+            "requests": dict(self.counts),
+            "running": sum(1 for worker in self.workers if worker.lock.locked()),
+            "queued": max(0, self.pending - sum(1 for worker in self.workers if worker.lock.locked())),
+            "queue_limit": self.queue_limit,
+            "sessions": len(self.sessions),
+            "latency_ms": latency,
+        }
+
+
+async def send(writer, message):
+    body = json.dumps(message).encode("utf-8")
+    writer.write(HEADER.pack(len(body)) + body)
+    await writer.drain()
+
+
+class Client:
+    """Blocking client: Client(port=7077) or Client(path="/tmp/kaylang.sock")"""
+
+    def __init__(self, port=None, host="127.0.0.1", path=None, timeout=None):
+        if path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(path)
+        else:
+            self.socket = socket.create_connection((host, port))
+        self.socket.settimeout(timeout)
+
+    def request(self, message):
+        """Send one request object and return the reply object"""
+        body = json.dumps(message).encode("utf-8")
+        self.socket.sendall(HEADER.pack(len(body)) + body)
+        size, = HEADER.unpack(self.receive(HEADER.size))
+        return json.loads(self.receive(size))
+
+    def receive(self, size):
+        chunks = []
+        while size:
+            chunk = self.socket.recv(size)
+            if not chunk:
+                raise ConnectionError("KayLang server closed the connection")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def run(self, code, session=None, timeout=None):
+        message = {"op": "run", "code": code}
+        if session is not None:
+            message["session"] = session
+        if timeout is not None:
+            message["timeout"] = timeout
+        return self.request(message)
+
+    def stats(self):
+        return self.request({"op": "stats"})["stats"]
+
+    def close_session(self, session):
+        return self.request({"op": "close", "session": session})
+
+    def close(self):
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+async def serve(options):
+    server = Server(options.workers, options.queue, options.timeout, options.max_sessions,
+                    options.engine, not options.no_optimize, options.memo_size, options.max_memory)
+    listener = await server.start(options.host, options.port, options.unix)
+    print(f"kaylang server: {server.worker_count} workers listening on {server.address()}", file=sys.stderr)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="server.py", description="Serve KayLang evaluation over a local socket.")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--port", type=int, help="listen on this TCP port (0: any free one)")
+    where.add_argument("--unix", metavar="PATH", help="listen on a Unix socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--queue", type=int, default=64, help="requests that may wait for a worker")
+    parser.add_argument("--timeout", type=float, default=10, help="longest time a request may run, in seconds")
+    parser.add_argument("--max-sessions", type=int, default=1000, metavar="N")
+    parser.add_argument("--max-memory", type=int, default=0, metavar="MB",
+                        help="address space per worker, 0 for no limit")
+    parser.add_argument("--engine", default="tree", choices=list(ENGINES))
+    parser.add_argument("--no-optimize", action="store_true")
+    parser.add_argument("--memo-size", type=int, default=functions.MEMO_SIZE, metavar="N")
+    options = parser.parse_args(argv)
+
+    if options.workers is not None and options.workers < 1:
+        parser.error("--workers must be at least 1")
+    if options.timeout <= 0:
+        parser.error("--timeout must be more than 0")
+    if options.queue < 0 or options.max_sessions < 0 or options.max_memory < 0 or options.memo_size < 0:
+        parser.error("--queue, --max-sessions, --max-memory and --memo-size cannot be negative")
+
+    try:
+        asyncio.run(serve(options))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,56 +1,161 @@
 from lexer import Lexer
 from myparser import Parser
 from interpreter import Interpreter
+from compiler import ClosureInterpreter
+from vm import VMInterpreter
+from bytecode import compile_program, disassemble
 from data import Data
+from cache import ProgramCache
+from optimizer import Optimizer
+from profiler import Profiler
+from kaylang import execute_code, run_file
+import functions
+import snapshot
 
 import os
+import shlex
+import time
 
-def execute_code(code, interpreter):
-    tokenizer = Lexer(code)
-    tokens = tokenizer.tokenize()
+# Execution engines selectable with: engine <name>
+engines = {
+    "tree": Interpreter,
+    "closure": ClosureInterpreter,
+    "vm": VMInterpreter,
+}
 
-    parser = Parser(tokens)
-    statements = parser.parse()  # parse_statements returns list of statements
 
-    for stmt in statements:
-        interpreter.tree = stmt
-        result = interpreter.interpret()
+def snapshot_path(argument):
+    """The file a save or load command names, or None if the line is KayLang code"""
+    argument = argument.strip()
+    if len(argument) >= 2 and argument[0] == argument[-1] and argument[0] in "\"'":
+        return argument[1:-1]
+    if argument and all(char.isalnum() or char in "._-/\\:~" for char in argument):
+        return argument
+    return None
 
-        # Skip printing for assignments (e.g. [var, '=', expr])
-        if isinstance(stmt, list) and len(stmt) == 3 and hasattr(stmt[1], "val") and stmt[1].val == "=":
-            continue
 
-        # Skip printing if result is None (e.g. print statements)
-        if result is None:
-            continue
+def main():
+    functions.allow_deep_recursion()
+    # Global variable storage and interpreter setup
+    base = Data()
+    interpreter = Interpreter(None, base)
+    program_cache = ProgramCache()  # parsed programs for run, see cache.py
+    optimizer = Optimizer()  # constant folding and branch pruning, see optimizer.py
 
-        if hasattr(result, "val"):
-            print(result.val)
-        else:
-            print(result)
+    while True:
+        try:
+            text = input("KayLang: ").strip()
 
-# Global variable storage and interpreter setup
-base = Data()
-interpreter = Interpreter(None, base)
+            # Switch engine: e.g., engine closure
+            if text == "engine" or text.startswith("engine "):
+                name = text[6:].strip()
+                if not name:
+                    print(f"Engine: {next(k for k, v in engines.items() if isinstance(interpreter, v))}")
+                elif name not in engines:
+                    print(f"Unknown engine '{name}'. Choose from: {', '.join(engines)}")
+                else:
+                    interpreter = engines[name](None, base)
+                continue
+
+            # Show bytecode: e.g., dis x = x + 1  or  dis "examples.kay"
+            if text.startswith("dis "):
+                source = text[4:].strip()
+                filename = source.strip('"').strip("'")
+                if os.path.isfile(filename):
+                    with open(filename, "r") as f:
+                        source = f.read()
+                statements = optimizer.optimize(Parser(Lexer(source).tokenize()).parse())
+                print(disassemble(compile_program(statements, base), base))
+                continue
+
+            # Run a file: e.g., run examples.kay
+            if text.startswith("run "):
+                filename = text[4:].strip().strip('"').strip("'")
+                if not os.path.isfile(filename):
+                    print(f"File '{filename}' not found.")
+                    continue
+                optimizer.rewrites.clear()
+                run_file(filename, interpreter, program_cache, optimizer)
+                continue
+
+            # Snapshot every variable: save "state.kays", and later, perhaps in
+            # another session, load "state.kays" to get them back
+            command, _, argument = text.partition(" ")
+            if command in ("save", "load") and snapshot_path(argument) is not None:
+                filename = snapshot_path(argument)
+                if command == "save":
+                    count = snapshot.save(base, filename)
+                    print(f"Saved {count} variable{'s' if count != 1 else ''} to {filename}")
+                elif not os.path.isfile(filename):
+                    print(f"File '{filename}' not found.")
+                else:
+                    start = time.perf_counter()
+                    snapshot.load(filename, base)
+                    print(f"Loaded {filename} in {(time.perf_counter() - start) * 1000:.1f} ms")
+                continue
 
-while True:
-    try:
-        text = input("KayLang: ").strip()
+            # Profile a file on the tree engine: e.g., profile "slow.kay"
+            # or profile "slow.kay" stacks.txt to also write collapsed stacks
+            if text.startswith("profile "):
+                args = [arg.strip('"').strip("'") for arg in shlex.split(text[8:], posix=False)]
+                filename = args[0] if args else ""
+                if not os.path.isfile(filename):
+                    print(f"File '{filename}' not found.")
+                    continue
+                profiled = Interpreter(None, base)
+                profiler = profiled.start_profiling(Profiler(collapse=len(args) > 1))
+                try:
+                    run_file(filename, profiled, program_cache, optimizer)
+                finally:
+                    with open(filename, "r") as f:
+                        print(profiler.report(f.read().splitlines()))
+                    if len(args) > 1:
+                        profiler.write_stacks(args[1])
+                        print(f"Collapsed stacks written to {args[1]}")
+                continue
 
-        # Run a file: e.g., run examples.kay
-        if text.startswith("run "):
-            filename = text[4:].strip().strip('"').strip("'")
-            if not os.path.isfile(filename):
-                print(f"File '{filename}' not found.")
+            # Toggle the parsed-program cache used by run: cache on / cache off
+            if text in ("cache on", "cache off"):
+                program_cache = ProgramCache() if text == "cache on" else None
                 continue
-            with open(filename, "r") as f:
-                code = f.read()
-                execute_code(code, interpreter)
-            continue
 
+            # Optimiser: optimize on / optimize off, or optimize report to list
+            # what it rewrote in the last program
+            if text in ("optimize on", "optimize off"):
+                optimizer.enabled = text == "optimize on"
+                continue
+            if text == "optimize report":
+                for rewrite in optimizer.rewrites:
+                    print(rewrite)
+                if not optimizer.rewrites:
+                    print("No rewrites")
+                continue
+
+            # Memoised functions: memo for their hit rates, or memo size 100 to
+            # set how many results each keeps when its definition gives no size
+            if text == "memo":
+                for line in functions.memo_report(base) or ["No memoised functions"]:
+                    print(line)
+                continue
+            if text.startswith("memo size "):
+                size = text[10:].strip()
+                if size.isdigit():
+                    functions.MEMO_SIZE = int(size)
+                else:
+                    print("Usage: memo size N, where 0 keeps every result")
+                continue
+
+            # Interactive mode
+            optimizer.rewrites.clear()
+            execute_code(text, interpreter, optimizer)
+
+        except EOFError:
+            # End of input, e.g. Ctrl-D or a piped script running out
+            print()
+            break
+        except Exception as e:
+            print(f"Error: {e}")
 
-        # Interactive mode
-        execute_code(text, interpreter)
 
-    except Exception as e:
-        print(f"Error: {e}")
+if __name__ == "__main__":
+    main()
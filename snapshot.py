@@ -0,0 +1,201 @@
+"""Save every variable in a Data store to a file, and load it back.
+
+A session or batch job that spends a long time building lists and
+dictionaries can save them once and later start from the snapshot instead
+of recomputing them:
+
+    snapshot.save(data, "state.kays")      # or a dict of variables
+    data = snapshot.load("state.kays")     # or load(path, data) to merge
+
+The file is a 24-byte header, the variables pickled with the highest
+protocol, and a section of raw machine numbers. Pickling keeps shared
+references: two variables holding the same list still hold one list after
+loading, and a list containing itself still does. The arrays of compact
+int and float lists (see numeric.py) are not pickled but written, 8-byte
+aligned, to the raw section. Loading maps the file into memory and copies
+each array straight out of the mapping, with no per-element decoding, so
+a snapshot of millions of numbers loads in milliseconds.
+
+Functions are saved with their memo caches but not with the code the
+engines compiled for them, which is rebuilt on the first call. Loading only
+creates KayLang values: anything else named in the file is refused, so a
+snapshot cannot run code.
+"""
+
+import gc
+import io
+import mmap
+import os
+import pickle
+import struct
+import sys
+from array import array
+
+from data import Data
+from numeric import KINDS
+
+MAGIC = b"KAYS"
+VERSION = 1
+# Magic, version, byte order of the raw numbers ("<" or ">"), pickle size,
+# offset of the raw section
+HEADER = struct.Struct("<4sBc2xQQ")
+ALIGNMENT = 8
+
+BYTE_ORDER = b"<" if sys.byteorder == "little" else b">"
+
+# Where the classes and functions a snapshot may name live
+SAFE_MODULES = ("nodes", "tokens", "numeric", "functions", "natives")
+SAFE_BUILTINS = {
+    ("builtins", "int"), ("builtins", "float"), ("builtins", "bool"), ("builtins", "str"),
+    ("builtins", "range"), ("builtins", "type"), ("collections", "OrderedDict"),
+}
+
+
+def aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def stored_array(typecode, offset, count):
+    """Placeholder the pickle names for an array kept in the raw section
+
+    SnapshotUnpickler replaces it with a reader of the file being loaded.
+    """
+    raise Exception("Stored arrays can only be read by snapshot.load")
+
+
+class SnapshotPickler(pickle.Pickler):
+
+    def __init__(self, file):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.arrays = []  # written after the pickle, in this order
+        self.size = 0  # bytes of the raw section so far
+
+    def reducer_override(self, obj):
+        # Called for everything but plain ints, strs, lists, dicts and the
+        # like, so the many small values of a large list cost nothing here
+        if obj.__class__ is not array:
+            return NotImplemented
+        offset = aligned(self.size)
+        self.arrays.append((offset, obj))
+        self.size = offset + len(obj) * obj.itemsize
+        return stored_array, (obj.typecode, offset, len(obj))
+
+
+class SnapshotUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, raw, swap):
+        super().__init__(file)
+        self.raw = raw  # memoryview of the raw section
+        self.swap = swap  # the file was written on a machine of the other byte order
+
+    def find_class(self, module, name):
+        if module == __name__ and name == "stored_array":
+            return self.stored_array
+        if (module, name) in SAFE_BUILTINS:
+            return super().find_class(module, name)
+        if module in SAFE_MODULES and "." not in name:
+            found = super().find_class(module, name)
+            # Only what the module defines, not what it imported
+            if getattr(found, "__module__", None) == module:
+                return found
+        raise pickle.UnpicklingError(f"{module}.{name} is not allowed in a snapshot")
+
+    def stored_array(self, typecode, offset, count):
+        if typecode not in KINDS:
+            raise pickle.UnpicklingError(f"unknown array type {typecode!r}")
+        items = array(typecode)
+        end = offset + count * items.itemsize
+        if offset < 0 or end > len(self.raw):
+            raise pickle.UnpicklingError("array outside the file")
+        items.frombytes(self.raw[offset:end])
+        if self.swap:
+            items.byteswap()
+        return items
+
+
+def save(variables, path):
+    """Write a Data store's variables, or a dict of them, to path; returns how many
+
+    The file is replaced in one step, so a failed save leaves any earlier
+    snapshot intact.
+    """
+    if isinstance(variables, Data):
+        variables = variables.read_all()
+    else:
+        variables = dict(variables)
+
+    body = io.BytesIO()
+    pickler = SnapshotPickler(body)
+    try:
+        pickler.dump(variables)
+    except (pickle.PicklingError, TypeError, AttributeError) as e:
+        raise Exception(f"Cannot save snapshot: {e}")
+    except RecursionError:
+        raise Exception("Cannot save snapshot: values are nested too deeply")
+    body = body.getbuffer()
+    raw_start = aligned(HEADER.size + len(body))
+
+    import tempfile  # only needed when saving
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDER, len(body), raw_start))
+            f.write(body)
+            # Padded out to raw_start even when there are no arrays, as load
+            # checks the raw section is all there
+            f.write(bytes(raw_start - HEADER.size - len(body)))
+            position = 0  # within the raw section
+            for offset, items in pickler.arrays:
+                f.write(bytes(offset - position))
+                f.write(items)
+                position = offset + len(items) * items.itemsize
+        os.chmod(temp_path, 0o644)  # mkstemp creates files private to the owner
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return len(variables)
+
+
+def load(path, data=None):
+    """Read the variables in the snapshot at path into data; returns the store
+
+    With no data, a new Data store is made. Variables already in data with
+    other names are kept; those the snapshot also has are replaced.
+    """
+    if data is None:
+        data = Data()
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+            raise Exception(f"'{path}' is not a KayLang snapshot")
+        _, version, byte_order, body_size, raw_start = HEADER.unpack(header)
+        if version != VERSION:
+            raise Exception(f"'{path}' is a version {version} snapshot; this interpreter reads version {VERSION}")
+        if raw_start < HEADER.size + body_size or raw_start > os.fstat(f.fileno()).st_size:
+            raise Exception(f"Snapshot '{path}' is damaged: truncated")
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                raw = view[raw_start:]
+                mapped.seek(HEADER.size)
+                # The values are all built in one burst, so collector
+                # passes triggered by the allocations would only cost time
+                gc_was_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    variables = SnapshotUnpickler(mapped, raw, byte_order != BYTE_ORDER).load()
+                except Exception as e:
+                    raise Exception(f"Snapshot '{path}' is damaged: {e}")
+                finally:
+                    raw.release()
+                    if gc_was_enabled:
+                        gc.enable()
+
+    if not isinstance(variables, dict):
+        raise Exception(f"Snapshot '{path}' is damaged: no variables")
+    for name, value in variables.items():
+        data.write(name, value)
+    return data
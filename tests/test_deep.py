@@ -0,0 +1,79 @@
+"""Expressions of 100,000 operands, on every engine, with and without the optimiser.
+
+    python3 -m unittest discover tests      (or python3 -m pytest tests)
+
+These take a few minutes: each program is lexed, parsed and run six times.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kaylang
+from numeric import NumericList
+
+N = 100000
+ENGINES = ("tree", "closure", "vm")
+
+
+def evaluate(expression, engine, optimize):
+    """The value of expression, assigned rather than echoed so it is never printed"""
+    program = kaylang.compile(f"let x = {expression};", engine, optimize)
+    return program.run().globals["x"]
+
+
+class DeepExpressionTests(unittest.TestCase):
+
+    def check(self, expression, expected):
+        for engine in ENGINES:
+            for optimize in (True, False):
+                with self.subTest(engine=engine, optimize=optimize):
+                    self.assertEqual(evaluate(expression, engine, optimize), expected)
+
+    def test_long_sum(self):
+        self.check(" + ".join(["1"] * N), N)
+
+    def test_long_mixed_arithmetic(self):
+        self.check(" - ".join(["2 * 3"] * N), 6 - 6 * (N - 1))
+
+    def test_nested_parentheses(self):
+        self.check("(" * N + "7" + ")" * N, 7)
+
+    def test_nested_lists(self):
+        expression = "[" * N + "1" + "]" * N
+        for engine in ENGINES:
+            for optimize in (True, False):
+                with self.subTest(engine=engine, optimize=optimize):
+                    value = evaluate(expression, engine, optimize)
+                    depth = 0
+                    while not isinstance(value, int):
+                        # The innermost list holds only an int, so it is compact
+                        items = value.items if isinstance(value, NumericList) else value
+                        self.assertEqual(len(items), 1)
+                        value = items[0]
+                        depth += 1
+                    self.assertEqual((depth, value), (N, 1))
+
+    def test_long_negation_chain(self):
+        self.check("- " * N + "5", 5)
+        self.check("- " * (N + 1) + "5", -5)
+
+    def test_long_not_chain(self):
+        self.check("! " * N + "true", True)
+        self.check("not " * (N + 1) + "true", False)
+
+    def test_long_and_chain(self):
+        self.check(" and ".join(["true"] * N), True)
+        self.check(" and ".join(["true"] * N) + " and false", False)
+
+    def test_long_or_chain(self):
+        self.check(" or ".join(["false"] * N) + " or true", True)
+
+    def test_long_call_chain(self):
+        self.check("abs(" * N + "-3" + ")" * N, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
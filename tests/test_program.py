@@ -0,0 +1,95 @@
+"""kaylang.compile and Program.run, the embedding API.
+
+    python3 -m unittest discover tests      (or python3 -m pytest tests)
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kaylang
+from compiler import Compiler
+from data import Data
+from vm import VM
+
+RULE = "memo fn f(a) { return a * 2; }\nlet y = f(x);"
+
+# Engine -> (class, method) compiling a function body
+BODY_COMPILERS = {"closure": (Compiler, "compile_function"), "vm": (VM, "compile_function")}
+
+
+class ProgramTests(unittest.TestCase):
+
+    def count_body_compiles(self, engine, runs):
+        """Run RULE runs times, returning how many function bodies were compiled"""
+        cls, name = BODY_COMPILERS[engine]
+        original = getattr(cls, name)
+        calls = []
+
+        def counting(compiler, function):
+            calls.append(function.name)
+            return original(compiler, function)
+
+        with mock.patch.object(cls, name, counting):
+            runs()
+        return len(calls)
+
+    def test_function_bodies_compile_once_across_runs(self):
+        for engine in BODY_COMPILERS:
+            with self.subTest(engine=engine):
+                program = kaylang.compile(RULE, engine)
+
+                def runs():
+                    for x in range(5):
+                        self.assertEqual(program.run({"x": x}).globals["y"], x * 2)
+                self.assertEqual(self.count_body_compiles(engine, runs), 1)
+
+    def test_function_bodies_compile_once_against_a_store(self):
+        for engine in BODY_COMPILERS:
+            with self.subTest(engine=engine):
+                program = kaylang.compile(RULE, engine)
+                store = Data()
+
+                def runs():
+                    for x in range(5):
+                        store.write("x", x)
+                        self.assertEqual(program.run(store).globals["y"], x * 2)
+                self.assertEqual(self.count_body_compiles(engine, runs), 1)
+
+    def test_store_runs_reuse_compiled_steps(self):
+        for engine in BODY_COMPILERS:
+            with self.subTest(engine=engine):
+                program = kaylang.compile("let total = total + 1;", engine)
+                store = Data()
+                store.write("total", 0)
+                program.run(store)
+                steps = program.store[2]
+                program.run(store)
+                self.assertIs(program.store[2], steps)
+                self.assertEqual(store.read("total"), 2)
+                # Another store gets its own compiled steps
+                other = Data()
+                other.write("total", 10)
+                self.assertEqual(program.run(other).globals["total"], 11)
+                self.assertEqual(store.read("total"), 2)
+
+    def test_memo_caches_start_empty_each_run(self):
+        for engine in ("tree", "closure", "vm"):
+            with self.subTest(engine=engine):
+                program = kaylang.compile(RULE, engine)
+                for _ in range(3):
+                    memo = program.run({"x": 4}).globals["f"].memo
+                    self.assertEqual((memo.hits, memo.misses), (0, 1))
+
+    def test_result(self):
+        result = kaylang.compile("print x; x * 3").run({"x": 2})
+        self.assertEqual(result.output, ["2", "6"])
+        self.assertEqual(result.value, 6)
+        self.assertEqual(result.globals, {"x": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""The socket server, on localhost, with a single worker.
+
+    python3 -m unittest discover tests      (or python3 -m pytest tests)
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server import Client, Server
+
+
+class ServerTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # The server runs on its own event loop in a thread, as it would in
+        # its own process, and the tests talk to it with the blocking Client
+        cls.loop = asyncio.new_event_loop()
+        cls.server = Server(workers=1, timeout=5)
+        cls.thread = threading.Thread(target=cls.loop.run_forever, daemon=True)
+        cls.thread.start()
+        asyncio.run_coroutine_threadsafe(cls.server.start(), cls.loop).result(timeout=60)
+        cls.port = cls.server.address()[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        asyncio.run_coroutine_threadsafe(cls.server.close(), cls.loop).result(timeout=30)
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        cls.loop.close()
+
+    def setUp(self):
+        self.client = Client(port=self.port, timeout=30)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_run(self):
+        reply = self.client.run("print 1 + 2;")
+        self.assertTrue(reply["ok"])
+        self.assertEqual(reply["output"], ["3"])
+
+    def test_bad_timeouts_are_rejected(self):
+        for timeout in (True, False, 0, -1, "1"):
+            with self.subTest(timeout=timeout):
+                reply = self.client.run("print 1;", timeout=timeout)
+                self.assertFalse(reply["ok"])
+                self.assertIn("timeout must be", reply["error"])
+
+    def test_closing_one_session_keeps_the_others(self):
+        self.assertTrue(self.client.run("let x = 1;", session="a")["ok"])
+        self.assertTrue(self.client.run("let y = 2;", session="b")["ok"])
+        restarts = self.client.stats()["requests"].get("restarts", 0)
+
+        self.assertEqual(self.client.close_session("a"), {"ok": True})
+
+        reply = self.client.run("print y;", session="b")
+        self.assertTrue(reply["ok"], reply["error"])
+        self.assertEqual(reply["output"], ["2"])
+        self.assertEqual(self.client.stats()["requests"].get("restarts", 0), restarts)
+        # The closed session starts again from nothing
+        self.assertFalse(self.client.run("print x;", session="a")["ok"])
+        self.client.close_session("a")
+        self.client.close_session("b")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Saving and loading snapshots of the variable store.
+
+    python3 -m unittest discover tests      (or python3 -m pytest tests)
+"""
+
+import os
+import pickle
+import sys
+import tempfile
+import unittest
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import kaylang
+import snapshot
+from numeric import NumericList
+
+
+class SnapshotTests(unittest.TestCase):
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.path = os.path.join(folder.name, "state.kays")
+
+    def round_trip(self, variables):
+        snapshot.save(variables, self.path)
+        return snapshot.load(self.path).read_all()
+
+    def test_scalars_only(self):
+        variables = {"x": 1, "y": 2.5, "name": "kay", "flag": True, "nothing": None}
+        self.assertEqual(self.round_trip(variables), variables)
+
+    def test_empty(self):
+        self.assertEqual(self.round_trip({}), {})
+
+    def test_numeric_lists(self):
+        ints = NumericList(array("q", range(-1000, 1000)))
+        floats = NumericList(array("d", [0.5, -1.25, 1e300]))
+        loaded = self.round_trip({"ints": ints, "floats": floats, "after": 3})
+        self.assertEqual(list(loaded["ints"].items), list(range(-1000, 1000)))
+        self.assertEqual(loaded["ints"].kind, int)
+        self.assertEqual(list(loaded["floats"].items), [0.5, -1.25, 1e300])
+        self.assertEqual(loaded["after"], 3)
+
+    def test_shared_references(self):
+        shared = [1, "a"]
+        shared.append(shared)
+        loaded = self.round_trip({"a": shared, "b": shared})
+        self.assertIs(loaded["a"], loaded["b"])
+        self.assertIs(loaded["a"][2], loaded["a"])
+
+    def test_into_program(self):
+        program = kaylang.compile("memo fn sq(n) { return n * n; } let xs = [1, 2, 3]; let total = sq(4);")
+        snapshot.save(program.run().globals, self.path)
+        for engine in ("tree", "closure", "vm"):
+            with self.subTest(engine=engine):
+                result = kaylang.compile("xs.push(sq(total));", engine).run(globals=snapshot.load(self.path))
+                self.assertEqual(list(result.globals["xs"].items), [1, 2, 3, 256])
+
+    def test_refuses_other_classes(self):
+        snapshot.save({"x": 1}, self.path)
+        with open(self.path, "rb") as f:
+            header = snapshot.HEADER.unpack(f.read(snapshot.HEADER.size))
+        body = pickle.dumps({"x": os.system}, protocol=pickle.HIGHEST_PROTOCOL)
+        raw_start = snapshot.aligned(snapshot.HEADER.size + len(body))
+        with open(self.path, "wb") as f:
+            f.write(snapshot.HEADER.pack(header[0], header[1], header[2], len(body), raw_start))
+            f.write(body)
+            f.write(bytes(raw_start - snapshot.HEADER.size - len(body)))
+        with self.assertRaisesRegex(Exception, "not allowed"):
+            snapshot.load(self.path)
+
+    def test_truncated(self):
+        snapshot.save({"xs": NumericList(array("q", range(100)))}, self.path)
+        with open(self.path, "rb") as f:
+            contents = f.read()
+        for size in (10, len(contents) // 2, len(contents) - 8):
+            with self.subTest(size=size):
+                with open(self.path, "wb") as f:
+                    f.write(contents[:size])
+                with self.assertRaises(Exception):
+                    snapshot.load(self.path)
+
+    def test_not_a_snapshot(self):
+        with open(self.path, "w") as f:
+            f.write("print 1;")
+        with self.assertRaisesRegex(Exception, "not a KayLang snapshot"):
+            snapshot.load(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,44 +1,100 @@
 class Token:
-    def __init__(self, type, val):
-        self.type = type 
-        self.val = val 
+    # Subclasses assign their fields directly instead of calling
+    # super().__init__, since the lexer creates one object per token.
+    __slots__ = ("type", "val", "line", "column")
+
+    def __init__(self, type, val, line=None, column=None):
+        self.type = type
+        self.val = val
+        self.line = line  # 1-based source position, when the lexer knows it
+        self.column = column
 
     def __repr__(self):
         return str(self.val)
- 
+
+    def __reduce__(self):
+        # Pickle as constructor arguments (see nodes.Node.__reduce__)
+        if type(self) is Token:
+            return (Token, (self.type, self.val, self.line, self.column))
+        return (type(self), (self.val, self.line, self.column))
+
 class Integer(Token):
-    def __init__(self, val):
-        super().__init__("int", val)
+    __slots__ = ()
+
+    def __init__(self, val, line=None, column=None):
+        self.type = "int"
+        self.val = val
+        self.line = line
+        self.column = column
 
 class Float(Token):
-    def __init__(self, val):
-        super().__init__("flt", val)
+    __slots__ = ()
+
+    def __init__(self, val, line=None, column=None):
+        self.type = "flt"
+        self.val = val
+        self.line = line
+        self.column = column
 
 class Operation(Token):
-    def __init__(self, val):
-        super().__init__("op", val)
+    __slots__ = ()
+
+    def __init__(self, val, line=None, column=None):
+        self.type = "op"
+        self.val = val
+        self.line = line
+        self.column = column
 
 class Declaration(Token):
-    def __init__(self, val):
-        super().__init__("decl", val)
+    __slots__ = ()
+
+    def __init__(self, val, line=None, column=None):
+        self.type = "decl"
+        self.val = val
+        self.line = line
+        self.column = column
 
 class Variable(Token):
-    def __init__(self, val):
-        super().__init__("var(?)", val)
+    __slots__ = ()
+
+    def __init__(self, val, line=None, column=None):
+        self.type = "var(?)"
+        self.val = val
+        self.line = line
+        self.column = column
 
 class Boolean(Token):
-    def __init__(self, val):
-        super().__init__("bool_op", val)  # Changed to bool_op to distinguish from bool values
+    __slots__ = ()
+
+    def __init__(self, val, line=None, column=None):
+        self.type = "bool_op"  # Changed to bool_op to distinguish from bool values
+        self.val = val
+        self.line = line
+        self.column = column
 
 class BooleanValue(Token):
-    def __init__(self, val):
-        super().__init__("bool_val", val)
+    __slots__ = ()
+
+    def __init__(self, val, line=None, column=None):
+        self.type = "bool_val"
+        self.val = val
+        self.line = line
+        self.column = column
 
 class String(Token):
-    def __init__(self, val):
-        super().__init__("str", val)
-        
+    __slots__ = ()
+
+    def __init__(self, val, line=None, column=None):
+        self.type = "str"
+        self.val = val
+        self.line = line
+        self.column = column
+
 class Keyword(Token):
-    def __init__(self, val):
-        super().__init__("kw", val)
+    __slots__ = ()
 
+    def __init__(self, val, line=None, column=None):
+        self.type = "kw"
+        self.val = val
+        self.line = line
+        self.column = column
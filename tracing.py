@@ -0,0 +1,251 @@
+"""Event hooks for instrumenting the tree-walking interpreter.
+
+A Tracer attached to an Interpreter records five kinds of event:
+
+    "statement"  a statement is about to run      detail: node kind
+    "loop"       a loop starts an iteration       detail: iteration number
+    "write"      Data.write stores a variable     detail: name, value: new value
+    "mutate"     a list or dict is changed        detail: push, pop, sort, delete or index_assign,
+                                                  value: key, index or pushed values
+    "print"      a print statement runs           value: printed value
+
+Each event is one record, a tuple (sequence, event, line, detail, value),
+appended to a fixed-size ring buffer if some callback wants it. Callbacks
+registered with on() are not called per event: they get a list of records at
+a time when the buffer is drained, either by drain() or every interval
+seconds by a background thread.
+If the buffer fills before it is drained the oldest records are overwritten,
+and dropped counts how many were lost.
+
+Like the profiler, the tracer swaps in its own evaluate method and Data.write
+while attached, so an interpreter with no hooks runs exactly as before.
+"""
+
+import collections
+import itertools
+import threading
+
+from nodes import If, While, For, Call, IndexAccess, MethodCall, Assign, Delete, Print
+import natives
+import runtime
+
+EVENTS = ("statement", "loop", "write", "mutate", "print")
+MUTATING_METHODS = ("push", "pop")  # sum(), map() and the like only read the list
+
+
+class Tracer:
+
+    def __init__(self, capacity=65536, interval=None):
+        self.buffer = collections.deque(maxlen=capacity)
+        self.callbacks = {}  # event -> list of callbacks
+        self.interval = interval  # seconds between background drains, None for on demand only
+        self.sequence = itertools.count()
+        self.next_expected = 0  # sequence number of the next record not yet drained
+        self.dropped = 0
+        self.line = None  # line of the statement running now, for write events
+        self.interpreter = None
+        self.saved_evaluate = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def on(self, event, callback):
+        """Call callback(records) with each batch of records for event"""
+        if event not in EVENTS:
+            raise Exception(f"Unknown trace event '{event}'. Choose from: {', '.join(EVENTS)}")
+        self.callbacks.setdefault(event, []).append(callback)
+
+    def off(self, event, callback):
+        """Unregister callback once it has had the records already buffered"""
+        self.drain()
+        callbacks = self.callbacks.get(event, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            self.callbacks.pop(event, None)
+
+    def record(self, event, line, detail=None, value=None):
+        # Events nobody listens for would only push useful ones out
+        if event in self.callbacks:
+            self.buffer.append((next(self.sequence), event, line, detail, value))
+
+    def drain(self):
+        """Hand every buffered record to the callbacks for its event"""
+        with self.lock:
+            buffer = self.buffer
+            records = [buffer.popleft() for _ in range(len(buffer))]
+            if not records:
+                return
+            # Sequence numbers missing from the batch were overwritten
+            last = records[-1][0]
+            self.dropped += last + 1 - self.next_expected - len(records)
+            self.next_expected = last + 1
+
+            batches = {}
+            for record in records:
+                batches.setdefault(record[1], []).append(record)
+            for event, batch in batches.items():
+                for callback in self.callbacks.get(event, ()):
+                    callback(batch)
+
+    def attach(self, interpreter):
+        """Start recording events from interpreter"""
+        if self.interpreter is not None:
+            raise Exception("Tracer is already attached to an interpreter")
+        self.interpreter = interpreter
+        # Wrap whatever evaluate is in place, e.g. a profiler's
+        self.saved_evaluate = interpreter.__dict__.get("evaluate")
+        interpreter.evaluate = self.wrap(interpreter.evaluate)
+        interpret = interpreter.interpret
+
+        def traced_interpret(tree=None):
+            # A statement run on its own, e.g. each one the shell executes
+            if tree is None:
+                tree = interpreter.tree
+            if not isinstance(tree, list):
+                self.line = getattr(tree, "line", None)
+                self.record("statement", self.line, type(tree).__name__)
+            return interpret(tree)
+        interpreter.interpret = traced_interpret
+
+        data = interpreter.data
+        write = data.write
+
+        def traced_write(variable, expression):
+            write(variable, expression)
+            self.record("write", self.line, variable, expression)
+        data.write = traced_write
+
+        if self.interval is not None:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.drain_periodically, daemon=True)
+            self.thread.start()
+
+    def detach(self):
+        """Stop recording, restore the interpreter and drain what is left"""
+        interpreter = self.interpreter
+        if interpreter is None:
+            return
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+        if self.saved_evaluate is None:
+            interpreter.__dict__.pop("evaluate", None)
+        else:
+            interpreter.evaluate = self.saved_evaluate
+        interpreter.__dict__.pop("interpret", None)
+        interpreter.data.__dict__.pop("write", None)
+        self.interpreter = None
+        self.drain()
+
+    def drain_periodically(self):
+        # Callbacks run on this thread
+        while not self.stopped.wait(self.interval):
+            self.drain()
+
+    def wrap(self, evaluate):
+        """Return an evaluate that records events around the node kinds that produce them"""
+        interpreter = self.interpreter
+        handlers = {
+            list: self.trace_block,
+            If: self.trace_if,
+            While: self.trace_while,
+            For: self.trace_for,
+            Assign: self.trace_assign,
+            MethodCall: self.trace_method_call,
+            Call: self.trace_call,
+            Delete: self.trace_delete,
+            Print: self.trace_print,
+        }
+
+        def traced_evaluate(expr):
+            handler = handlers.get(expr.__class__)
+            if handler is not None:
+                return handler(interpreter, expr)
+            return evaluate(expr)
+
+        return traced_evaluate
+
+    def trace_block(self, interpreter, statements):
+        result = None
+        for stmt in statements:
+            if not isinstance(stmt, list):
+                self.line = getattr(stmt, "line", None)
+                self.record("statement", self.line, type(stmt).__name__)
+            result = interpreter.evaluate(stmt)
+        return result
+
+    def trace_if(self, interpreter, node):
+        if interpreter.evaluate(node.condition):
+            return self.trace_block(interpreter, node.then_block)
+        return self.trace_block(interpreter, node.else_block or [])
+
+    def trace_while(self, interpreter, node):
+        iteration = 0
+        while interpreter.evaluate(node.condition):
+            iteration += 1
+            self.record("loop", node.line, iteration)
+            self.trace_block(interpreter, node.body)
+        return None
+
+    def trace_for(self, interpreter, node):
+        write = interpreter.data.write  # the traced write, so each item is a write event
+        name = node.variable.val
+        scope = interpreter.scope
+        if scope is not None and name in scope:
+            # A local of the running function, which is not a Data write
+            frame, slot = interpreter.frame, scope[name]
+
+            def write(name, item):
+                frame[slot] = item
+        iteration = 0
+        for item in runtime.iterate(interpreter.evaluate(node.iterable)):
+            iteration += 1
+            self.record("loop", node.line, iteration)
+            self.line = node.line
+            write(name, item)
+            self.trace_block(interpreter, node.body)
+        return None
+
+    def trace_assign(self, interpreter, node):
+        target = node.target
+        if not isinstance(target, IndexAccess):
+            # Variable writes are recorded by Data.write
+            return type(interpreter).eval_assign(interpreter, node)
+        right_val = interpreter.evaluate(node.value)
+        container_obj = interpreter.evaluate(target.container)
+        key = interpreter.evaluate(target.key)
+        runtime.index_set(container_obj, key, right_val)
+        self.record("mutate", node.line, "index_assign", key)
+        return right_val
+
+    def trace_method_call(self, interpreter, node):
+        obj_val = interpreter.evaluate(node.obj)
+        args = [interpreter.evaluate(arg) for arg in node.args]
+        result = runtime.call_method(obj_val, node.method, args)
+        if node.method in MUTATING_METHODS:
+            self.record("mutate", node.line, node.method, tuple(args))
+        return result
+
+    def trace_call(self, interpreter, node):
+        result = type(interpreter).eval_call(interpreter, node)
+        if node.function is natives.sort:
+            self.record("mutate", node.line, "sort", None)
+        return result
+
+    def trace_delete(self, interpreter, node):
+        target = node.target
+        if not isinstance(target, IndexAccess):
+            return type(interpreter).eval_delete(interpreter, node)
+        container_obj = interpreter.evaluate(target.container)
+        key = interpreter.evaluate(target.key)
+        runtime.index_delete(container_obj, key)
+        self.record("mutate", node.line, "delete", key)
+        return None
+
+    def trace_print(self, interpreter, node):
+        value = interpreter.evaluate(node.expr)
+        interpreter.output.write(value)
+        self.record("print", node.line, None, value)
+        return None
@@ -0,0 +1,219 @@
+"""Whole-list arithmetic behind the element-wise operators and list reductions.
+
+runtime.py checks the operands of .+ .- .* ./ and of the sum, min, max, mean,
+dot and map list methods, then calls in here to do the work. Every function
+runs its loop in native code: map() over a function from the operator or math
+module, or a builtin such as sum() or min(), both of which step through an
+array.array or a list in C. When NumPy is installed, float lists of at least
+NUMPY_THRESHOLD elements are handed to it instead.
+
+Results follow the scalar rules element by element, so [1.5, 2.5] .+ 0.5
+gives [2, 3]. With NumPy, sum, mean and dot of floats add pairwise and can
+differ from the pure-Python result in the last digit; every other result is
+the same either way.
+"""
+
+import math
+import operator
+from array import array
+from itertools import repeat
+
+import numeric
+from numeric import NumericList, KINDS, make_list
+
+NUMBER = (int, float)
+
+# Shorter lists are not worth the conversion to and from NumPy
+NUMPY_THRESHOLD = 1024
+
+OPERATORS = {
+    ".+": operator.add,
+    ".-": operator.sub,
+    ".*": operator.mul,
+    "./": operator.truediv,
+}
+
+# Transform name -> (function, class of every result for ints, for floats);
+# None means it depends on the element
+TRANSFORMS = {
+    "abs": (abs, int, float),
+    "neg": (operator.neg, int, float),
+    "square": (None, int, float),  # map(operator.mul, values, values)
+    "sqrt": (math.sqrt, float, float),
+    "exp": (math.exp, float, float),
+    "log": (math.log, float, float),
+    "floor": (math.floor, int, int),
+    "ceil": (math.ceil, int, int),
+    "round": (round, int, int),
+}
+
+# Transforms whose NumPy ufunc gives exactly what the math function would
+NUMPY_TRANSFORMS = {"abs": "absolute", "neg": "negative", "square": "square", "sqrt": "sqrt"}
+
+_numpy = False  # not looked for yet
+
+
+def load_numpy():
+    """The numpy module, or None if it is not installed"""
+    global _numpy
+    if _numpy is False:
+        # Imported on first use so programs without list arithmetic start fast
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
+def elements(list_val):
+    """The numbers in a KayLang list as an array or list, or None if one is not a number"""
+    if list_val.__class__ is NumericList:
+        if list_val.kind is not None:
+            return list_val.items
+        list_val = list_val.items
+    if all(map(isinstance, list_val, repeat(NUMBER))):
+        return list_val
+    return None
+
+
+def kind(operand):
+    """int or float if every number in operand has that class, else None"""
+    if operand.__class__ is array:
+        return KINDS[operand.typecode]
+    if operand.__class__ is float:
+        return float
+    if isinstance(operand, int):
+        return int
+    return None
+
+
+def is_float_array(values):
+    return values.__class__ is array and values.typecode == "d"
+
+
+def numpy_for(*operands):
+    """numpy if it should handle operands: float arrays, at least one of them long, and float scalars"""
+    if not any(is_float_array(operand) and len(operand) >= NUMPY_THRESHOLD for operand in operands):
+        return None
+    if not all(is_float_array(operand) or operand.__class__ is float for operand in operands):
+        return None
+    return load_numpy()
+
+
+def elementwise(symbol, left, right):
+    """left <symbol> right, element by element; each side is an array, list or number"""
+    numpy = numpy_for(left, right)
+    if numpy is not None:
+        ufunc = {".+": numpy.add, ".-": numpy.subtract, ".*": numpy.multiply, "./": numpy.divide}[symbol]
+        # inf - inf and the like give nan quietly, as they do in Python
+        with numpy.errstate(all="ignore"):
+            return pack_ndarray(numpy, ufunc(as_ndarray(numpy, left), as_ndarray(numpy, right)))
+
+    operation = OPERATORS[symbol]
+    if left.__class__ is array or left.__class__ is list:
+        right_values = right if right.__class__ is array or right.__class__ is list else repeat(right)
+        results = map(operation, left, right_values)
+    else:
+        results = map(operation, repeat(left), right)
+
+    kinds = (kind(left), kind(right))
+    if symbol == "./" or float in kinds:
+        return pack_floats(results)
+    if kinds == (int, int):
+        return pack_ints(results)
+    return pack(results)
+
+
+def transform(name, values):
+    """Apply the named transform to every number in values"""
+    numpy = numpy_for(values) if name in NUMPY_TRANSFORMS else None
+    if numpy is not None:
+        with numpy.errstate(all="ignore"):
+            return pack_ndarray(numpy, getattr(numpy, NUMPY_TRANSFORMS[name])(as_ndarray(numpy, values)))
+
+    function, int_result, float_result = TRANSFORMS[name]
+    if function is None:
+        results = map(operator.mul, values, values)
+    else:
+        results = map(function, values)
+    result_kind = {int: int_result, float: float_result}.get(kind(values))
+    if result_kind is int:
+        return pack_ints(results)
+    if result_kind is float:
+        return pack_floats(results)
+    return pack(results)
+
+
+def total(values):
+    numpy = numpy_for(values)
+    if numpy is not None:
+        return numpy.sum(as_ndarray(numpy, values)).item()
+    return sum(values)
+
+
+def smallest(values):
+    numpy = numpy_for(values)
+    if numpy is not None:
+        return numpy.min(as_ndarray(numpy, values)).item()
+    return min(values)
+
+
+def largest(values):
+    numpy = numpy_for(values)
+    if numpy is not None:
+        return numpy.max(as_ndarray(numpy, values)).item()
+    return max(values)
+
+
+def dot(left, right):
+    numpy = numpy_for(left, right)
+    if numpy is not None:
+        return numpy.dot(as_ndarray(numpy, left), as_ndarray(numpy, right)).item()
+    return sum(map(operator.mul, left, right))
+
+
+def as_ndarray(numpy, operand):
+    # Shares the array's memory rather than copying it
+    return numpy.frombuffer(operand, dtype=numpy.float64) if operand.__class__ is array else operand
+
+
+def pack(results):
+    """KayLang list of results of any class, whole floats made ints"""
+    return make_list([int(value) if value.__class__ is float and value.is_integer() else value for value in results])
+
+
+def pack_ints(results):
+    """KayLang list of results that are all ints"""
+    results = list(results)
+    if numeric.COMPACT and results:
+        try:
+            return NumericList(array("q", results))
+        except OverflowError:
+            return results  # too big for 64 bits
+    return make_list(results)
+
+
+def pack_floats(results):
+    """KayLang list of results that are all floats"""
+    results = list(results)
+    whole = list(map(float.is_integer, results))
+    if not any(whole):
+        if numeric.COMPACT and results:
+            return NumericList(array("d", results))
+        return make_list(results)
+    if all(whole):
+        return pack_ints(map(int, results))
+    return make_list([int(value) if is_whole else value for value, is_whole in zip(results, whole)])
+
+
+def pack_ndarray(numpy, results):
+    """KayLang list of the float64 ndarray results"""
+    whole = numpy.isfinite(results) & (numpy.floor(results) == results)
+    if not whole.any():
+        if numeric.COMPACT and len(results):
+            return NumericList(array("d", results.tobytes()))
+        return results.tolist()
+    if whole.all() and numpy.abs(results).max() < 2.0 ** 63:
+        return pack_ints(results.astype(numpy.int64).tolist())
+    return pack_floats(results.tolist())
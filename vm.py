@@ -0,0 +1,308 @@
+"""Stack-based virtual machine that runs bytecode.CodeObject programs."""
+
+from bytecode import (
+    compile_program, disassemble, BINARY_OP_NAMES, UNARY_OP_NAMES,
+    LOAD_GLOBAL, LOAD_CONST, BINARY_OP, STORE_GLOBAL, POP_JUMP_IF_TRUE, JUMP_IF_FALSE, JUMP,
+    INDEX_GET, INDEX_SET, UNARY_OP, CALL_METHOD, PRINT, POP_TOP, DUP_TOP,
+    BUILD_LIST, BUILD_DICT, INDEX_DELETE, RAISE,
+    JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP, NORMALISE, GET_ITER, FOR_ITER, CALL_NATIVE,
+    LOAD_LOCAL, STORE_LOCAL, CALL_FUNCTION, RETURN_VALUE, MAKE_FUNCTION, BytecodeCompiler,
+)
+from data import UNSET
+from resolver import Resolver
+from output import Output
+from numeric import NumericList
+from functions import Function, make_function, MISSING
+import runtime
+
+BINARY_FUNCTIONS = [runtime.BINARY_OPS[name] for name in BINARY_OP_NAMES]
+UNARY_FUNCTIONS = [runtime.UNARY_OPS[name] for name in UNARY_OP_NAMES]
+ADD = BINARY_OP_NAMES.index("+")
+SUB = BINARY_OP_NAMES.index("-")
+MUL = BINARY_OP_NAMES.index("*")
+LT = BINARY_OP_NAMES.index("<")
+
+# Calls deeper than this are taken to be runaway recursion
+MAX_CALL_DEPTH = 100000
+
+
+class VM:
+
+    def __init__(self, base, output=None):
+        self.data = base  # Data store whose slots the bytecode addresses
+        self.output = output if output is not None else Output()
+
+    def compile_function(self, function):
+        """Compile a function's body against its locals, once per VM"""
+        body = BytecodeCompiler(self.data, function.locals).compile_function(function)
+        function.compiled[self] = body
+        return body
+
+    def run(self, code):
+        """Execute a CodeObject and return the value left on the stack, if any"""
+        instructions = code.instructions
+        consts = code.consts
+        values = self.data.values
+        write = self.output.write
+        make_list = runtime.make_list
+        binary_functions = BINARY_FUNCTIONS
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        end = len(instructions)
+        pc = 0
+        # Calls run in this same loop: the caller's state is saved in calls
+        # and the callee's code, stack and frame take its place
+        frame = None  # locals of the running function
+        calls = []
+
+        while pc < end:
+            opcode, arg = instructions[pc]
+            pc += 1
+
+            if opcode == LOAD_GLOBAL:
+                value = values[arg]
+                if value is UNSET:
+                    raise Exception(f"Undefined variable: {self.data.names[arg]}")
+                push(value)
+
+            elif opcode == LOAD_CONST:
+                push(consts[arg])
+
+            elif opcode == BINARY_OP:
+                b = pop()
+                a = stack[-1]
+                # int op int never needs the type checks or float normalisation
+                if a.__class__ is int and b.__class__ is int:
+                    if arg == ADD:
+                        stack[-1] = a + b
+                        continue
+                    if arg == LT:
+                        stack[-1] = a < b
+                        continue
+                    if arg == SUB:
+                        stack[-1] = a - b
+                        continue
+                    if arg == MUL:
+                        stack[-1] = a * b
+                        continue
+                stack[-1] = binary_functions[arg](a, b)
+
+            elif opcode == STORE_GLOBAL:
+                values[arg] = pop()
+
+            elif opcode == LOAD_LOCAL:
+                value = frame[arg]
+                if value is UNSET:
+                    raise Exception(f"Undefined variable: {code.local_names[arg]}")
+                push(value)
+
+            elif opcode == STORE_LOCAL:
+                frame[arg] = pop()
+
+            elif opcode == POP_JUMP_IF_TRUE:
+                if pop():
+                    pc = arg
+
+            elif opcode == JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+
+            elif opcode == JUMP:
+                pc = arg
+
+            elif opcode == FOR_ITER:
+                item = next(stack[-1], UNSET)
+                if item is UNSET:
+                    pop()
+                    pc = arg
+                else:
+                    push(item)
+
+            elif opcode == JUMP_IF_FALSE_OR_POP:
+                if stack[-1]:
+                    pop()
+                else:
+                    pc = arg
+
+            elif opcode == JUMP_IF_TRUE_OR_POP:
+                if stack[-1]:
+                    pc = arg
+                else:
+                    pop()
+
+            elif opcode == NORMALISE:
+                value = stack[-1]
+                if value.__class__ is float and value.is_integer():
+                    stack[-1] = int(value)
+
+            elif opcode == INDEX_GET:
+                key = pop()
+                container = stack[-1]
+                if key.__class__ is int:
+                    cls = container.__class__
+                    try:
+                        if cls is list:
+                            stack[-1] = container[key]
+                            continue
+                        if cls is NumericList:
+                            stack[-1] = container.items[key]
+                            continue
+                    except IndexError:
+                        pass
+                stack[-1] = runtime.index_get(container, key)
+
+            elif opcode == INDEX_SET:
+                key = pop()
+                container = pop()
+                value = pop()
+                # In-range store that keeps a compact list compact
+                if container.__class__ is NumericList and key.__class__ is int \
+                        and value.__class__ is container.kind:
+                    try:
+                        container.items[key] = value
+                        continue
+                    except (IndexError, OverflowError):
+                        pass
+                runtime.index_set(container, key, value)
+
+            elif opcode == UNARY_OP:
+                stack[-1] = UNARY_FUNCTIONS[arg](stack[-1])
+
+            elif opcode == CALL_METHOD:
+                name_index, argc = arg
+                if argc == 1 and consts[name_index] == "push":
+                    # Pushing a number onto a compact list that can take it
+                    container = stack[-2]
+                    value = stack[-1]
+                    if container.__class__ is NumericList and value.__class__ is container.kind:
+                        try:
+                            container.items.append(value)
+                            pop()
+                            continue
+                        except OverflowError:
+                            pass
+                args = stack[len(stack) - argc:]
+                del stack[len(stack) - argc:]
+                stack[-1] = runtime.call_method(stack[-1], consts[name_index], args)
+
+            elif opcode == CALL_FUNCTION:
+                function = stack[-arg - 1]
+                args = stack[len(stack) - arg:]
+                del stack[len(stack) - arg - 1:]
+                if function.__class__ is not Function:
+                    raise Exception(f"Cannot call {runtime.type_name(function)}")
+                memo = function.memo
+                key = None
+                if memo is not None:
+                    key, result = memo.lookup(args)
+                    if result is not MISSING:
+                        push(result)
+                        continue
+                new_frame = function.new_frame(args)
+                if len(calls) >= MAX_CALL_DEPTH:
+                    raise Exception(f"Maximum call depth exceeded in {function.name}()")
+                body = function.compiled.get(self)
+                if body is None:
+                    body = self.compile_function(function)
+
+                calls.append((code, pc, stack, frame, memo, key))
+                code = body
+                instructions = code.instructions
+                consts = code.consts
+                end = len(instructions)
+                pc = 0
+                stack = []
+                push = stack.append
+                pop = stack.pop
+                frame = new_frame
+
+            elif opcode == RETURN_VALUE:
+                result = pop()
+                code, pc, stack, frame, memo, key = calls.pop()
+                instructions = code.instructions
+                consts = code.consts
+                end = len(instructions)
+                push = stack.append
+                pop = stack.pop
+                if memo is not None:
+                    memo.store(key, result)
+                push(result)
+
+            elif opcode == MAKE_FUNCTION:
+                push(make_function(consts[arg]))
+
+            elif opcode == PRINT:
+                write(pop())
+
+            elif opcode == POP_TOP:
+                pop()
+
+            elif opcode == DUP_TOP:
+                push(stack[-1])
+
+            elif opcode == BUILD_LIST:
+                items = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                push(make_list(items))
+
+            elif opcode == BUILD_DICT:
+                items = stack[len(stack) - 2 * arg:]
+                del stack[len(stack) - 2 * arg:]
+                evaluated_dict = {}
+                for i in range(0, len(items), 2):
+                    key = items[i]
+                    if not isinstance(key, runtime.DICT_KEY):
+                        raise Exception(f"Invalid dictionary key type: {runtime.type_name(key)}")
+                    evaluated_dict[key] = items[i + 1]
+                push(evaluated_dict)
+
+            elif opcode == INDEX_DELETE:
+                key = pop()
+                runtime.index_delete(pop(), key)
+
+            elif opcode == GET_ITER:
+                stack[-1] = runtime.iterate(stack[-1])
+
+            elif opcode == CALL_NATIVE:
+                function_index, argc = arg
+                args = stack[len(stack) - argc:]
+                del stack[len(stack) - argc:]
+                push(consts[function_index](*args))
+
+            elif opcode == RAISE:
+                raise Exception(consts[arg])
+
+            else:
+                raise Exception(f"Unknown opcode: {opcode}")
+
+        return stack[-1] if stack else None
+
+
+class VMInterpreter:
+    """Drop-in replacement for Interpreter that compiles to bytecode and runs it on the VM"""
+
+    def __init__(self, tree, base, output=None):
+        self.tree = tree
+        self.data = base
+        self.output = output if output is not None else Output()
+        self.vm = VM(base, self.output)
+
+    def compile(self, tree=None):
+        if tree is None:
+            tree = self.tree
+        Resolver(self.data).resolve(tree)
+        return compile_program(tree, self.data)
+
+    def disassemble(self, tree=None):
+        return disassemble(self.compile(tree), self.data)
+
+    def prepare(self, tree):
+        """A callable that runs tree, already resolved, each time it is called"""
+        code = compile_program(tree, self.data)
+        run = self.vm.run
+        return lambda: run(code)
+
+    def interpret(self, tree=None):
+        """Main interpretation entry point"""
+        return self.vm.run(self.compile(tree))